@@ -0,0 +1,269 @@
+"""Lanceur du bot en cluster: N processus, chacun avec une partie des shards
+    
+    python cluster.py [--processes 4] [--shards 16] [--state-dir cluster]
+                      [--health-interval 10] [--status-file cluster/health.json]
+
+Chaque processus exécute main.py avec SHARD_IDS, SHARD_COUNT et CLUSTER_ID.
+Les processus partagent la base SQLite (WAL, busy_timeout, BEGIN IMMEDIATE),
+un fichier de verrous par joueur (un joueur peut écrire depuis des guildes
+de shards différents) et suivent les écritures des autres pour leurs
+classements (table player_changes). Le backend JSON n'est pas utilisable.
+
+Ce suivi a un coût: en cluster, des triggers ajoutent une ligne à
+player_changes à chaque création, suppression ou écriture de village,
+level, exp ou ryo. Un bot lancé seul (sans SHARD_IDS) les supprime au
+démarrage.
+
+Les processus démarrent l'un après l'autre (Discord limite les identify),
+sont relancés s'ils s'arrêtent ou si leur fichier de santé n'est plus mis
+à jour, et leur état est regroupé dans --status-file.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+
+
+def recommended_shards(token):
+    """(nombre de shards recommandé, identify simultanés autorisés) selon Discord"""
+    request = urllib.request.Request(GATEWAY_URL, headers={
+        "Authorization": f"Bot {token}",
+        "User-Agent": "DiscordBot (cluster.py, 1.0)",
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        data = json.load(response)
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+
+def shard_groups(shard_count, processes):
+    """Répartir les shards en groupes contigus de tailles égales à un près"""
+    processes = min(processes, shard_count)
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+def cluster_path(path, cluster_id):
+    """ninjabot.prom → ninjabot.cluster0.prom (un fichier par processus)"""
+    root, ext = os.path.splitext(path)
+    if ext == '.gz':
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return f"{root}.cluster{cluster_id}{ext}"
+
+
+class Worker:
+    """Un processus main.py et ses shards"""
+    
+    def __init__(self, cluster_id, shard_ids, shard_count, args):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.args = args
+        self.health_file = os.path.join(args.state_dir, f"cluster{cluster_id}.json")
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.next_start = 0.0
+    
+    def env(self):
+        env = dict(
+            os.environ,
+            SHARD_IDS=",".join(map(str, self.shard_ids)),
+            SHARD_COUNT=str(self.shard_count),
+            CLUSTER_ID=str(self.cluster_id),
+            HEALTH_FILE=self.health_file,
+            HEALTH_INTERVAL=str(self.args.health_interval),
+            PLAYER_LOCK_FILE=os.path.join(self.args.state_dir, "players.locks"),
+            # Inscriptions en cours: propres aux salons des shards du processus
+            ONBOARDING_FILE=os.path.join(self.args.state_dir, f"onboarding{self.cluster_id}.json"),
+        )
+        for name in ('METRICS_TEXTFILE', 'TRACE_FILE'):
+            if env.get(name):
+                env[name] = cluster_path(env[name], self.cluster_id)
+        return env
+    
+    def start(self):
+        # Un ancien fichier de santé ferait croire à un processus déjà prêt
+        if os.path.exists(self.health_file):
+            os.remove(self.health_file)
+        # Nouvelle session: un Ctrl+C n'atteint que le lanceur, qui arrête les processus dans l'ordre
+        self.process = subprocess.Popen([sys.executable, "main.py"], env=self.env(), start_new_session=True)
+        self.started_at = time.time()
+        print(f"▶️ Cluster {self.cluster_id} (shards {self.shard_ids[0]}-{self.shard_ids[-1]}), pid {self.process.pid}")
+    
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+    
+    def health(self):
+        try:
+            with open(self.health_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def stale(self, health):
+        """Plus de nouvelles du processus: boucle bloquée ou démarrage qui n'aboutit pas"""
+        now = time.time()
+        if health is None:
+            return now - self.started_at > self.args.ready_timeout
+        return now - health['updated_at'] > 3 * self.args.health_interval
+    
+    def stop(self, sig=signal.SIGINT):
+        # SIGINT: discord.py ferme le bot proprement (écritures en attente validées)
+        if self.alive():
+            self.process.send_signal(sig)
+    
+    def schedule_restart(self):
+        # Un processus resté en vie 10 minutes repart avec un délai court
+        if time.time() - self.started_at > 600:
+            self.restarts = 0
+        self.next_start = time.time() + min(2 ** self.restarts, 60)
+        self.restarts += 1
+
+
+def summary(worker, health):
+    if not worker.alive():
+        return f"cluster {worker.cluster_id}: arrêté (relance dans {max(0, worker.next_start - time.time()):.0f}s)"
+    if health is None:
+        return f"cluster {worker.cluster_id}: démarrage..."
+    shards = health['shards'].values()
+    connected = sum(1 for shard in shards if shard['status'] in ('ready', 'resumed', 'connect'))
+    latencies = [shard['latency_ms'] for shard in shards if shard['latency_ms'] is not None]
+    latency = f"{max(latencies):.0f} ms" if latencies else "—"
+    return (f"cluster {worker.cluster_id}: {'prêt' if health['ready'] else 'connexion'}, "
+            f"{connected}/{len(worker.shard_ids)} shards connectés, latence max {latency}, "
+            f"{sum(shard['guilds'] for shard in shards)} guildes, "
+            f"boucle max {health['loop_max_lag_ms']:.0f} ms, {worker.restarts} relance(s)")
+
+
+def write_status(path, workers, healths):
+    status = {
+        'updated_at': time.time(),
+        'clusters': [
+            {
+                'cluster_id': worker.cluster_id,
+                'shard_ids': worker.shard_ids,
+                'pid': worker.process.pid if worker.process is not None else None,
+                'alive': worker.alive(),
+                'restarts': worker.restarts,
+                'health': healths.get(worker.cluster_id),
+            }
+            for worker in workers
+        ],
+    }
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_file, path)
+
+
+def wait_ready(worker, timeout):
+    """Attendre que les shards du processus soient connectés avant de lancer le suivant"""
+    deadline = time.time() + timeout
+    while time.time() < deadline and worker.alive():
+        health = worker.health()
+        if health is not None and health['ready']:
+            return True
+        time.sleep(1)
+    return False
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Lancer le bot sur plusieurs processus")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shards', type=int, help="Nombre total de shards (défaut: recommandé par Discord)")
+    parser.add_argument('--state-dir', default='cluster', help="Fichiers de santé et de verrous")
+    parser.add_argument('--health-interval', type=float, default=10.0)
+    parser.add_argument('--ready-timeout', type=float, default=300.0,
+                        help="Délai maximal de connexion d'un processus")
+    parser.add_argument('--status-file', help="État du cluster (défaut: <state-dir>/health.json)")
+    args = parser.parse_args()
+    
+    if os.getenv('STORAGE_BACKEND', 'sqlite') != 'sqlite':
+        parser.error("le mode cluster demande STORAGE_BACKEND=sqlite")
+    os.makedirs(args.state_dir, exist_ok=True)
+    status_file = args.status_file or os.path.join(args.state_dir, 'health.json')
+    
+    shard_count = args.shards
+    if shard_count is None:
+        token = os.getenv('DISCORD_BOT_TOKEN')
+        if not token:
+            parser.error("--shards est obligatoire sans DISCORD_BOT_TOKEN")
+        shard_count, max_concurrency = recommended_shards(token)
+        print(f"ℹ️ Discord recommande {shard_count} shards (identify simultanés: {max_concurrency})")
+    
+    workers = [Worker(i, group, shard_count, args)
+               for i, group in enumerate(shard_groups(shard_count, args.processes))]
+    
+    stopping = False
+    
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    # Démarrage échelonné: un processus identifie ses shards pendant que les autres attendent
+    for worker in workers:
+        if stopping:
+            break
+        worker.start()
+        if not wait_ready(worker, args.ready_timeout):
+            print(f"⚠️ Cluster {worker.cluster_id} pas prêt après {args.ready_timeout:.0f}s, on continue")
+    
+    rounds = 0
+    while not stopping:
+        healths = {}
+        for worker in workers:
+            health = worker.health()
+            healths[worker.cluster_id] = health
+            if worker.alive() and worker.stale(health):
+                print(f"⚠️ Cluster {worker.cluster_id} ne répond plus, arrêt forcé")
+                worker.stop(signal.SIGKILL)
+                worker.process.wait()
+            if not worker.alive():
+                if worker.next_start == 0.0:
+                    code = worker.process.returncode if worker.process is not None else None
+                    print(f"❌ Cluster {worker.cluster_id} arrêté (code {code})")
+                    worker.schedule_restart()
+                elif time.time() >= worker.next_start:
+                    worker.next_start = 0.0
+                    worker.start()
+            # Résumé environ une fois par minute
+            if rounds % max(1, round(60 / args.health_interval)) == 0:
+                print(summary(worker, health))
+        write_status(status_file, workers, healths)
+        rounds += 1
+        time.sleep(args.health_interval)
+    
+    print("⏹️ Arrêt du cluster...")
+    for worker in workers:
+        worker.stop()
+    deadline = time.time() + 30
+    for worker in workers:
+        if worker.process is None:
+            continue
+        try:
+            worker.process.wait(timeout=max(0.1, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+
+
+if __name__ == "__main__":
+    main()
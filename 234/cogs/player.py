@@ -1,28 +1,33 @@
 import discord
 from discord.ext import commands
-import json
-from datetime import datetime, timedelta
+import asyncio
+import time
+from datetime import datetime
+from database.player_locks import player_locks, player_lock
+from database.session_store import SessionStore
+from game.onboarding import OnboardingSessions, TIMER_KIND, VILLAGE_CLANS, VILLAGE_EMOJIS
+from game.progression import grant_xp, xp_to_next
+
+# Délai entre deux récompenses quotidiennes
+DAILY_COOLDOWN = 24 * 60 * 60
 
 class PlayerCog(commands.Cog):
     def __init__(self, bot, db):
         self.bot = bot
         self.db = db
-        
-        self.villages = {
-            "🍃": "Konoha",
-            "💨": "Suna",
-            "💧": "Kiri", 
-            "⚡": "Kumo",
-            "🗻": "Iwa"
-        }
-        
-        self.clans = {
-            "Konoha": ["Uchiha", "Hyuga", "Nara", "Akimichi", "Inuzuka"],
-            "Suna": ["Sabaku", "Pakura", "Chikamatsu"],
-            "Kiri": ["Hozuki", "Yuki", "Kaguya"],
-            "Kumo": ["Yotsuki", "Darui"],
-            "Iwa": ["Kamizuru", "Explosion Corps"]
-        }
+        # Inscriptions !start en cours, reprises après un redémarrage
+        self.onboarding = OnboardingSessions(SessionStore(bot.onboarding_file), bot.timers)
+
+        bot.timers.register('daily', self.notify_daily_ready)
+        bot.timers.register(TIMER_KIND, self.expire_onboarding)
+
+    async def cog_load(self):
+        # Avant bot.timers.start() (setup_hook): les expirations passées partent au démarrage
+        self.onboarding.load()
+        self.onboarding.store.start()
+
+    async def cog_unload(self):
+        await self.onboarding.store.stop()
 
     @commands.command(name='start')
     async def start_game(self, ctx):
@@ -38,64 +43,84 @@ class PlayerCog(commands.Cog):
             color=0xFF6B35
         )
         
-        for emoji, village in self.villages.items():
+        for emoji, village in VILLAGE_EMOJIS.items():
             embed.add_field(name=f"{emoji} {village}", value="​", inline=True)
         
-        message = await ctx.send(embed=embed)
+        # Attendu: la session est liée au message des villages
+        message = await ctx.send_now(embed=embed)
+        # Un nouveau !start dans le même salon remplace la session précédente
+        self.onboarding.begin(ctx.channel.id, ctx.author.id, message.id)
         
-        for emoji in self.villages.keys():
-            await message.add_reaction(emoji)
+        # Réactions envoyées ensemble par la file sortante, sans les attendre
+        await self.bot.outbound.react(message, VILLAGE_EMOJIS.keys())
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        # Évènement brut: le message du village n'est plus en cache après un redémarrage
+        session = self.onboarding.get(payload.channel_id, payload.user_id)
+        if session is None or session.step != 'village' or payload.message_id != session.message_id:
+            return
+        village = VILLAGE_EMOJIS.get(str(payload.emoji))
+        if village is None:
+            return
+        self.onboarding.advance(session, 'clan', village=village)
+
+        # Choix du clan
+        clan_embed = discord.Embed(
+            title=f"Village: {village}",
+            description="Choisissez votre clan:",
+            color=0xFF6B35
+        )
         
-        def check(reaction, user):
-            return user == ctx.author and str(reaction.emoji) in self.villages.keys()
+        for i, clan in enumerate(VILLAGE_CLANS.get(village, []), 1):
+            clan_embed.add_field(name=f"{i}. {clan}", value="​", inline=False)
         
-        try:
-            reaction, user = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
-            village = self.villages[str(reaction.emoji)]
-            
-            # Choix du clan
-            clan_embed = discord.Embed(
-                title=f"Village: {village}",
-                description="Choisissez votre clan:",
-                color=0xFF6B35
-            )
-            
-            clan_options = self.clans.get(village, [])
-            for i, clan in enumerate(clan_options, 1):
-                clan_embed.add_field(name=f"{i}. {clan}", value="​", inline=False)
-            
-            await ctx.send(embed=clan_embed)
-            
-            def clan_check(msg):
-                return msg.author == ctx.author and msg.content.isdigit()
+        await self.bot.outbound.send(self.bot.get_partial_messageable(payload.channel_id), embed=clan_embed)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        session = self.onboarding.get(message.channel.id, message.author.id)
+        if session is None or message.content.startswith(self.bot.command_prefix):
+            return
+
+        if session.step == 'clan':
+            if not message.content.isdigit():
+                return
+            clan_options = VILLAGE_CLANS.get(session.village, [])
+            clan_choice = int(message.content) - 1
+            if not 0 <= clan_choice < len(clan_options):
+                await self.bot.outbound.send(message.channel, f"Choisissez un numéro entre 1 et {len(clan_options)}.")
+                return
+            self.onboarding.advance(session, 'name', clan=clan_options[clan_choice])
             
-            clan_msg = await self.bot.wait_for('message', timeout=60.0, check=clan_check)
-            clan_choice = int(clan_msg.content) - 1
+            # Demande du nom
+            await self.bot.outbound.send(message.channel, "Choisissez votre nom de ninja:")
+
+        elif session.step == 'name':
+            if len(message.content) > 20:
+                return
+            name = message.content
+            self.onboarding.end(session)
             
-            if 0 <= clan_choice < len(clan_options):
-                clan = clan_options[clan_choice]
-                
-                # Demande du nom
-                await ctx.send("Choisissez votre nom de ninja:")
-                
-                def name_check(msg):
-                    return msg.author == ctx.author and len(msg.content) <= 20
-                
-                name_msg = await self.bot.wait_for('message', timeout=60.0, check=name_check)
-                name = name_msg.content
-                
-                # Création du joueur
-                await self.db.create_player(ctx.author.id, name, village, clan)
-                
-                success_embed = discord.Embed(
-                    title="🎉 Ninja créé avec succès!",
-                    description=f"**Nom:** {name}\n**Village:** {village}\n**Clan:** {clan}",
-                    color=0x00FF00
-                )
-                await ctx.send(embed=success_embed)
+            # Création du joueur (revérifiée sous verrou: deux !start simultanés)
+            async with player_locks.hold(message.author.id):
+                if await self.db.get_player(message.author.id):
+                    await self.bot.outbound.send(message.channel, "Vous avez déjà commencé votre aventure ninja!")
+                    return
+                await self.db.create_player(message.author.id, name, session.village, session.clan)
             
-        except asyncio.TimeoutError:
-            await ctx.send("Temps écoulé! Utilisez `!start` pour recommencer.")
+            success_embed = discord.Embed(
+                title="🎉 Ninja créé avec succès!",
+                description=f"**Nom:** {name}\n**Village:** {session.village}\n**Clan:** {session.clan}",
+                color=0x00FF00
+            )
+            await self.bot.outbound.send(message.channel, embed=success_embed)
+
+    async def expire_onboarding(self, keys):
+        """Minuteurs échus: abandonner les inscriptions restées sans réponse"""
+        for session in self.onboarding.pop_expired(keys):
+            await self.bot.outbound.send(self.bot.get_partial_messageable(session.channel_id),
+                                         "Temps écoulé! Utilisez `!start` pour recommencer.")
 
     @commands.command(name='profil')
     async def profile(self, ctx, member: discord.Member = None):
@@ -108,7 +133,7 @@ class PlayerCog(commands.Cog):
             await ctx.send("Ce ninja n'a pas encore commencé son aventure!")
             return
         
-        stats = json.loads(player['stats'])
+        stats = player['stats'] or {}
         
         embed = discord.Embed(
             title=f"🥷 Profil de {player['name']}",
@@ -119,12 +144,12 @@ class PlayerCog(commands.Cog):
         embed.add_field(name="Clan", value=player['clan'] or "Aucun", inline=True)
         embed.add_field(name="Niveau", value=player['level'], inline=True)
         
-        embed.add_field(name="💚 Santé", value=f"{player['health']}/100", inline=True)
-        embed.add_field(name="💙 Chakra", value=f"{player['chakra']}/100", inline=True)
+        embed.add_field(name="💚 Santé", value=f"{player['health']}/{player['max_health']}", inline=True)
+        embed.add_field(name="💙 Chakra", value=f"{player['chakra']}/{player['max_chakra']}", inline=True)
         embed.add_field(name="💛 Stamina", value=f"{player['stamina']}/100", inline=True)
         
         embed.add_field(name="💰 Ryo", value=player['ryo'], inline=True)
-        embed.add_field(name="⭐ EXP", value=f"{player['exp']}/{player['level'] * 100}", inline=True)
+        embed.add_field(name="⭐ EXP", value=f"{player['exp']}/{xp_to_next(player['level'])}", inline=True)
         embed.add_field(name="​", value="​", inline=True)
         
         stats_text = "\n".join([f"**{stat.title()}:** {value}" for stat, value in stats.items()])
@@ -133,6 +158,7 @@ class PlayerCog(commands.Cog):
         await ctx.send(embed=embed)
 
     @commands.command(name='daily')
+    @player_lock
     async def daily_reward(self, ctx):
         """Récupère la récompense quotidienne"""
         player = await self.db.get_player(ctx.author.id)
@@ -140,11 +166,14 @@ class PlayerCog(commands.Cog):
             await ctx.send("Vous devez d'abord commencer votre aventure avec `!start`")
             return
         
-        now = datetime.now()
-        last_daily = datetime.fromisoformat(player['last_daily']) if player['last_daily'] else None
+        now = time.time()
+        ready_at = player['daily_ready_at']
+        if ready_at is None and player['last_daily']:
+            # Récompense prise avant l'ajout de daily_ready_at
+            ready_at = datetime.fromisoformat(player['last_daily']).timestamp() + DAILY_COOLDOWN
         
-        if last_daily and now - last_daily < timedelta(days=1):
-            next_daily = last_daily + timedelta(days=1)
+        if ready_at and now < ready_at:
+            next_daily = datetime.fromtimestamp(ready_at)
             await ctx.send(f"Vous avez déjà récupéré votre récompense! Prochaine: {next_daily.strftime('%H:%M:%S')}")
             return
         
@@ -152,22 +181,42 @@ class PlayerCog(commands.Cog):
         reward_exp = 50 + (player['level'] * 5)
         
         new_ryo = player['ryo'] + reward_ryo
-        new_exp = player['exp'] + reward_exp
+        gain = grant_xp(player, reward_exp)
         
+        ready_at = now + DAILY_COOLDOWN
         await self.db.update_player(
             ctx.author.id,
             ryo=new_ryo,
-            exp=new_exp,
-            last_daily=now.isoformat()
+            last_daily=datetime.fromtimestamp(now).isoformat(),
+            daily_ready_at=ready_at,
+            **gain.fields()
         )
+        self.bot.timers.schedule('daily', ctx.author.id, ready_at)
         
         embed = discord.Embed(
             title="🎁 Récompense quotidienne!",
             description=f"**+{reward_ryo} Ryo**\n**+{reward_exp} EXP**",
             color=0xFFD700
         )
+        if gain.leveled_up:
+            embed.add_field(name="🆙 Niveau supérieur!", value=f"Vous êtes maintenant niveau {gain.level}!", inline=False)
         
         await ctx.send(embed=embed)
 
+    async def notify_daily_ready(self, user_ids):
+        """Minuteurs échus: prévenir les joueurs dont la récompense est de nouveau disponible"""
+        await asyncio.gather(*(self._notify_daily_ready(user_id) for user_id in user_ids))
+
+    async def _notify_daily_ready(self, user_id):
+        async with player_locks.hold(user_id):
+            player = await self.db.get_player(user_id)
+            ready_at = player['daily_ready_at'] if player else None
+            if not ready_at or ready_at > time.time():
+                # Déjà prévenu, ou récompense reprise entre-temps
+                return
+            # 0: disponible, plus rien à envoyer (y compris après un redémarrage)
+            await self.db.update_player(user_id, daily_ready_at=0)
+        await self.bot.notify(user_id, content="🎁 Votre récompense quotidienne est de nouveau disponible! Utilisez `!daily`.")
+
 async def setup(bot):
-    await bot.add_cog(PlayerCog(bot))
\ No newline at end of file
+    await bot.add_cog(PlayerCog(bot, bot.db))
\ No newline at end of file
@@ -0,0 +1,380 @@
+"""Sauvegardes à chaud des joueurs et restauration d'un snapshot
+
+Une sauvegarde est prise pendant que le bot tourne: API de backup en ligne
+de SQLite (DatabaseManager.backup_files) ou snapshot + journal pour le
+stockage JSON (PlayerStore.backup_files). Les fichiers sont découpés en
+blocs compressés rangés par empreinte: un bloc déjà sauvegardé n'est pas
+réécrit, chaque sauvegarde ne stocke que ce qui a changé depuis les
+précédentes, tout en restant restaurable seule.
+
+Le stockage JSON garde des modifications en mémoire: ses sauvegardes sont
+prises par le bot (BACKUP_DIR). La base SQLite peut aussi être sauvegardée
+depuis la ligne de commande, bot démarré ou non; la restauration se fait
+bot arrêté:
+    python -m database.backup create [naruto_game.db] [backups]
+    python -m database.backup list [backups]
+    python -m database.backup restore [backups] [snapshot|latest] [--before 2026-10-18T12:00]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.metrics import STORAGE_BYTES, STORAGE_LATENCY
+
+BACKUP_VERSION = 1
+
+# Taille des blocs: multiple des pages SQLite, petite pour que des
+# écritures dispersées ne touchent qu'une partie des blocs
+CHUNK_SIZE = 64 * 1024
+
+# Débit de lecture par défaut (octets/s): laisse le disque et le CPU aux commandes
+DEFAULT_MAX_RATE = 16 * 1024 * 1024
+
+# Un bloc sans snapshot n'est supprimé qu'après ce délai: il peut appartenir
+# à une sauvegarde en cours dans un autre processus
+PRUNE_GRACE = 3600.0
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class _Throttle:
+    """Limiter le débit moyen à `rate` octets par seconde (sleep entre les blocs)"""
+    
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.consumed = 0
+    
+    def consume(self, size: int):
+        self.consumed += size
+        if self.rate:
+            delay = self.consumed / self.rate - (time.monotonic() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+
+
+class BackupStore:
+    """Répertoire de sauvegardes: blocs compressés partagés et un manifeste par snapshot
+        
+        chunks/ab/abcdef…   bloc compressé (zlib), nommé par son empreinte
+        snapshots/…json     manifeste: fichiers, blocs dans l'ordre, empreinte de chaque fichier
+    
+    Les méthodes sont bloquantes: le bot les appelle dans un thread.
+    """
+    
+    def __init__(self, root: str, max_rate: Optional[float] = DEFAULT_MAX_RATE, level: int = 6):
+        self.root = root
+        self.max_rate = max_rate
+        self.level = level
+        self.chunks_dir = os.path.join(root, 'chunks')
+        self.snapshots_dir = os.path.join(root, 'snapshots')
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+    
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+    
+    def _store_file(self, path: str, throttle: _Throttle) -> Tuple[Dict[str, Any], int]:
+        """Ranger les blocs d'un fichier, renvoie (entrée du manifeste, octets compressés ajoutés)"""
+        chunks = []
+        whole = hashlib.blake2b(digest_size=20)
+        size = stored = 0
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                digest = _digest(data)
+                whole.update(data)
+                size += len(data)
+                chunks.append(digest)
+                chunk_path = self._chunk_path(digest)
+                if os.path.exists(chunk_path):
+                    # Rajeuni: prune ne le prend pas pour un bloc abandonné
+                    os.utime(chunk_path)
+                else:
+                    compressed = zlib.compress(data, self.level)
+                    os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                    tmp_file = f'{chunk_path}.{os.getpid()}.tmp'
+                    with open(tmp_file, 'wb') as out:
+                        out.write(compressed)
+                    os.replace(tmp_file, chunk_path)
+                    stored += len(compressed)
+                throttle.consume(len(data))
+        return {'size': size, 'digest': whole.hexdigest(), 'chunks': chunks}, stored
+    
+    def save(self, backend: str, files: Dict[str, Tuple[str, str]], started: Optional[float] = None) -> Dict[str, Any]:
+        """Sauvegarder des copies cohérentes: nom → (copie à lire, chemin d'origine)"""
+        started = time.time() if started is None else started
+        throttle = _Throttle(self.max_rate)
+        entries = []
+        stored = 0
+        for name, (path, source) in files.items():
+            entry, added = self._store_file(path, throttle)
+            entries.append({'name': name, 'path': source, **entry})
+            stored += added
+        
+        snapshot_id = secrets.token_hex(4)
+        created = time.time()
+        manifest = {
+            'version': BACKUP_VERSION,
+            'id': snapshot_id,
+            'backend': backend,
+            'created': created,
+            'elapsed': created - started,
+            'size': sum(entry['size'] for entry in entries),
+            'stored': stored,
+            'files': entries,
+        }
+        stamp = datetime.fromtimestamp(created).strftime('%Y%m%dT%H%M%S')
+        manifest_file = os.path.join(self.snapshots_dir, f'{stamp}-{snapshot_id}.json')
+        # Écrit en dernier: un snapshot listé a tous ses blocs
+        with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(manifest_file + '.tmp', manifest_file)
+        manifest['file'] = manifest_file
+        return manifest
+    
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Manifestes du plus ancien au plus récent"""
+        manifests = []
+        for name in sorted(os.listdir(self.snapshots_dir)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.snapshots_dir, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Manifeste illisible ignoré: {name} ({e})")
+                continue
+            manifest['file'] = path
+            manifests.append(manifest)
+        manifests.sort(key=lambda manifest: manifest['created'])
+        return manifests
+    
+    def find(self, selector: str = 'latest', before: Optional[float] = None) -> Dict[str, Any]:
+        """Snapshot par identifiant, ou le plus récent (éventuellement antérieur à `before`)"""
+        manifests = self.snapshots()
+        if before is not None:
+            manifests = [manifest for manifest in manifests if manifest['created'] <= before]
+        if selector != 'latest':
+            manifests = [manifest for manifest in manifests if manifest['id'] == selector]
+        if not manifests:
+            raise LookupError(f"Aucun snapshot ne correspond à {selector!r} dans {self.root}")
+        return manifests[-1]
+    
+    def restore(self, manifest: Dict[str, Any], target_dir: Optional[str] = None) -> List[str]:
+        """Réécrire les fichiers d'un snapshot (à leur place d'origine ou dans target_dir)
+        
+        Chaque fichier est reconstitué à côté de sa destination, vérifié, puis
+        remplacé de façon atomique. Le bot doit être arrêté.
+        """
+        restored = []
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        for entry in manifest['files']:
+            target = os.path.join(target_dir, entry['name']) if target_dir else entry['path']
+            tmp_file = target + '.restore'
+            try:
+                self._rebuild(entry, tmp_file)
+            except BaseException:
+                # Bloc manquant ou corrompu: ne pas laisser de fichier à moitié reconstitué
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                raise
+            if manifest['backend'] == 'sqlite':
+                # Le WAL de l'ancienne base serait rejoué sur la base restaurée
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(target + suffix):
+                        os.remove(target + suffix)
+            os.replace(tmp_file, target)
+            restored.append(target)
+        return restored
+    
+    def _rebuild(self, entry: Dict[str, Any], tmp_file: str):
+        """Reconstituer un fichier dans tmp_file depuis ses blocs, en vérifiant chaque empreinte"""
+        whole = hashlib.blake2b(digest_size=20)
+        with open(tmp_file, 'wb') as out:
+            for digest in entry['chunks']:
+                with open(self._chunk_path(digest), 'rb') as f:
+                    data = zlib.decompress(f.read())
+                if _digest(data) != digest:
+                    raise ValueError(f"Bloc corrompu: {digest}")
+                whole.update(data)
+                out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+        if whole.hexdigest() != entry['digest']:
+            raise ValueError(f"Empreinte de {entry['name']} différente après reconstitution")
+    
+    def prune(self, keep: int) -> Tuple[int, int]:
+        """Garder les `keep` derniers snapshots et supprimer les blocs qu'ils n'utilisent plus
+        
+        Renvoie (snapshots supprimés, blocs supprimés).
+        """
+        manifests = self.snapshots()
+        removed = manifests[:-keep] if keep > 0 else []
+        for manifest in removed:
+            os.remove(manifest['file'])
+        if not removed:
+            return 0, 0
+        
+        used = {digest for manifest in manifests[len(removed):]
+                for entry in manifest['files'] for digest in entry['chunks']}
+        expired = time.time() - PRUNE_GRACE
+        chunks = 0
+        for prefix in os.listdir(self.chunks_dir):
+            directory = os.path.join(self.chunks_dir, prefix)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name not in used and os.path.getmtime(path) < expired:
+                    os.remove(path)
+                    chunks += 1
+        return len(removed), chunks
+
+
+class HotBackup:
+    """Sauvegardes du stockage du bot, toutes les `interval` secondes ou à la demande
+    
+    Le stockage fournit une copie cohérente (backup_files) sans arrêter les
+    commandes; découpage, compression et écriture des blocs se font dans un
+    thread, au débit `max_rate`. Une seule sauvegarde à la fois.
+    """
+    
+    def __init__(self, db, backend: str, root: str, interval: Optional[float] = 3600.0, keep: int = 24,
+                 max_rate: Optional[float] = DEFAULT_MAX_RATE):
+        self.db = db
+        self.backend = backend
+        self.store = BackupStore(root, max_rate)
+        self.interval = interval
+        self.keep = keep
+        self.last: Optional[Dict[str, Any]] = None
+        self.failed = 0
+        self._current: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None and self.interval:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Arrêter les sauvegardes périodiques; une sauvegarde en cours va jusqu'au bout"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._current is not None:
+            await asyncio.wait([self._current])
+    
+    async def backup(self) -> Dict[str, Any]:
+        """Prendre une sauvegarde maintenant (ou attendre celle en cours)"""
+        if self._current is None or self._current.done():
+            self._current = asyncio.ensure_future(self._backup())
+        # shield: annuler l'appelant n'interrompt pas la copie en cours
+        return await asyncio.shield(self._current)
+    
+    async def _backup(self) -> Dict[str, Any]:
+        started = time.time()
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.store.root)
+        try:
+            files = await self.db.backup_files(staging, max_rate=self.store.max_rate)
+            manifest = await asyncio.to_thread(self.store.save, self.backend, files, started)
+            await asyncio.to_thread(self.store.prune, self.keep)
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            await asyncio.to_thread(shutil.rmtree, staging, True)
+        STORAGE_LATENCY.observe(manifest['elapsed'], self.backend, 'backup')
+        STORAGE_BYTES.observe(manifest['stored'], self.backend, 'backup')
+        self.last = manifest
+        return manifest
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.backup()
+            except Exception as e:
+                print(f"❌ Sauvegarde des joueurs échouée: {e}")
+    
+    def summary(self) -> str:
+        if self.last is None:
+            return f"Aucune sauvegarde ({self.failed} échecs)" if self.failed else "Aucune sauvegarde"
+        last = self.last
+        return (f"Dernière: `{last['id']}` le {datetime.fromtimestamp(last['created']):%d/%m %H:%M}, "
+                f"{last['size'] / 1e6:.1f} Mo en {last['elapsed']:.1f}s, "
+                f"{last['stored'] / 1e6:.2f} Mo nouveaux (compressés), {self.failed} échecs")
+
+
+def _format_manifest(manifest: Dict[str, Any]) -> str:
+    created = datetime.fromtimestamp(manifest['created']).isoformat(timespec='seconds')
+    return (f"{manifest['id']}  {created}  {manifest['backend']:6}  {manifest['size'] / 1e6:9.1f} Mo  "
+            f"+{manifest['stored'] / 1e6:.2f} Mo  {manifest['elapsed']:.1f}s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Sauvegardes des joueurs")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    create = subparsers.add_parser('create', help="Sauvegarder la base SQLite (bot démarré ou non)")
+    create.add_argument('db_path', nargs='?', default='naruto_game.db')
+    create.add_argument('root', nargs='?', default='backups')
+    create.add_argument('--keep', type=int, default=24, help="Snapshots conservés")
+    create.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE / 1e6, help="Débit de lecture (Mo/s)")
+    listing = subparsers.add_parser('list', help="Lister les snapshots")
+    listing.add_argument('root', nargs='?', default='backups')
+    restore = subparsers.add_parser('restore', help="Restaurer un snapshot (bot arrêté)")
+    restore.add_argument('root', nargs='?', default='backups')
+    restore.add_argument('snapshot', nargs='?', default='latest')
+    restore.add_argument('--before', help="Dernier snapshot pris avant cette date (ISO 8601)")
+    restore.add_argument('--target-dir', help="Restaurer dans ce répertoire plutôt qu'à l'emplacement d'origine")
+    args = parser.parse_args()
+    
+    if args.action == 'create':
+        from database.db_manager import DatabaseManager
+        
+        db = DatabaseManager(args.db_path)
+        backup = HotBackup(db, 'sqlite', args.root, interval=None, keep=args.keep, max_rate=args.max_rate * 1e6)
+        try:
+            manifest = await backup.backup()
+        except sqlite3.Error as e:
+            raise SystemExit(f"❌ Sauvegarde de {args.db_path} impossible: {e}")
+        finally:
+            await db.close()
+        print(f"✅ Snapshot {_format_manifest(manifest)}")
+    elif args.action == 'list':
+        for manifest in BackupStore(args.root).snapshots():
+            print(_format_manifest(manifest))
+    else:
+        store = BackupStore(args.root, max_rate=None)
+        before = datetime.fromisoformat(args.before).timestamp() if args.before else None
+        try:
+            manifest = store.find(args.snapshot, before)
+        except LookupError as e:
+            raise SystemExit(f"❌ {e}")
+        try:
+            restored = store.restore(manifest, args.target_dir)
+        except (OSError, ValueError, zlib.error) as e:
+            raise SystemExit(f"❌ Restauration de {manifest['id']} impossible: {e}")
+        for path in restored:
+            print(f"✅ {path} restauré depuis {manifest['id']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
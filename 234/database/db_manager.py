@@ -1,86 +1,783 @@
 import aiosqlite
+import asyncio
 import json
-from typing import Optional, Dict, Any
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Callable, AsyncIterator
+from urllib.request import pathname2url
+
+from database.records import (
+    Player, PLAYER_FIELDS, JSON_FIELDS, TABLE_FIELDS, TIMER_FIELDS, new_player_record, mission_id
+)
+from game.items import stacks_from_list
+from utils.metrics import STORAGE_BYTES, STORAGE_LATENCY
+
+
+async def _missions_to_ids(db):
+    """Remplacer les missions copiées en JSON par leur identifiant"""
+    async with db.execute(
+        "SELECT user_id, current_mission FROM players WHERE current_mission LIKE '{%'"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    await db.executemany(
+        'UPDATE players SET current_mission = ? WHERE user_id = ?',
+        [(mission_id(json.loads(mission)), user_id) for user_id, mission in rows]
+    )
+
+
+async def _inventory_to_stacks(db):
+    """Remplacer les listes d'objets par des piles {identifiant: nombre}"""
+    async with db.execute(
+        "SELECT user_id, inventory FROM players WHERE inventory LIKE '[%'"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    await db.executemany(
+        'UPDATE players SET inventory = ? WHERE user_id = ?',
+        [(json.dumps(stacks_from_list(json.loads(inventory))), user_id) for user_id, inventory in rows]
+    )
+
+
+async def _split_stats_and_jutsu(db):
+    """Copier les stats et jutsu JSON de chaque joueur dans player_stats et player_jutsu"""
+    async with db.execute('SELECT user_id, stats, jutsu_list FROM players') as cursor:
+        while True:
+            rows = await cursor.fetchmany(10000)
+            if not rows:
+                break
+            stat_rows, jutsu_rows = [], []
+            for user_id, stats, jutsu_list in rows:
+                stat_rows += _stat_rows(user_id, json.loads(stats) if stats else None)
+                jutsu_rows += _jutsu_rows(user_id, json.loads(jutsu_list) if jutsu_list else None)
+            await db.executemany(INSERT_STATS, stat_rows)
+            await db.executemany(INSERT_JUTSU, jutsu_rows)
+
+
+# Migrations du schéma, appliquées dans l'ordre selon PRAGMA user_version.
+# Une étape est une requête SQL ou une coroutine qui reçoit la connexion.
+MIGRATIONS = [
+    # 1: champs joués par main.py (PV/chakra max, rang, rerolls, mission, inventaire)
+    [
+        "ALTER TABLE players ADD COLUMN max_health INTEGER DEFAULT 100",
+        "ALTER TABLE players ADD COLUMN max_chakra INTEGER DEFAULT 100",
+        "ALTER TABLE players ADD COLUMN rank TEXT",
+        "ALTER TABLE players ADD COLUMN clan_rerolls INTEGER DEFAULT 3",
+        "ALTER TABLE players ADD COLUMN current_mission TEXT",
+        "ALTER TABLE players ADD COLUMN inventory TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_players_village ON players(village)",
+        "CREATE INDEX IF NOT EXISTS idx_players_level ON players(level)",
+    ],
+    # 2: current_mission contient l'identifiant de la mission (game.missions)
+    [
+        _missions_to_ids,
+    ],
+    # 3: inventaire en piles d'objets
+    [
+        _inventory_to_stacks,
+    ],
+    # 4: journal des changements de champs classés, relu par les autres processus
+    # (rempli par CHANGE_TRIGGERS, seulement en cluster)
+    [
+        """CREATE TABLE IF NOT EXISTS player_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            changed_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_player_changes_time ON player_changes(changed_at)",
+    ],
+    # 5: échéances des minuteurs (records.TIMER_FIELDS); les index partiels ne
+    # contiennent que les minuteurs en attente, relus au démarrage
+    [
+        "ALTER TABLE players ADD COLUMN mission_ends_at REAL",
+        "ALTER TABLE players ADD COLUMN daily_ready_at REAL",
+        "CREATE INDEX IF NOT EXISTS idx_players_mission_ends ON players(mission_ends_at) WHERE mission_ends_at > 0",
+        "CREATE INDEX IF NOT EXISTS idx_players_daily_ready ON players(daily_ready_at) WHERE daily_ready_at > 0",
+    ],
+    # 6: stats et jutsu dans leurs tables (records.TABLE_FIELDS) au lieu de
+    # colonnes JSON; position garde l'ordre de la fiche
+    [
+        """CREATE TABLE IF NOT EXISTS player_stats (
+            user_id INTEGER NOT NULL,
+            stat TEXT NOT NULL,
+            value INTEGER,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (user_id, stat)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_player_stats_stat ON player_stats(stat, value)",
+        """CREATE TABLE IF NOT EXISTS player_jutsu (
+            user_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            jutsu TEXT NOT NULL,
+            PRIMARY KEY (user_id, position)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_player_jutsu_name ON player_jutsu(jutsu, user_id)",
+        _split_stats_and_jutsu,
+        "ALTER TABLE players DROP COLUMN stats",
+        "ALTER TABLE players DROP COLUMN jutsu_list",
+    ],
+]
+
+# Triggers qui remplissent player_changes: une ligne de plus à chaque création,
+# suppression ou écriture de village, level, exp ou ryo. Seul un cluster en a
+# besoin; ils sont créés ou supprimés par init_db selon track_changes.
+CHANGE_TRIGGERS = {
+    'players_changes_insert': """CREATE TRIGGER IF NOT EXISTS players_changes_insert AFTER INSERT ON players
+        BEGIN INSERT INTO player_changes (user_id) VALUES (NEW.user_id); END""",
+    'players_changes_update': """CREATE TRIGGER IF NOT EXISTS players_changes_update
+        AFTER UPDATE OF village, level, exp, ryo ON players
+        BEGIN INSERT INTO player_changes (user_id) VALUES (NEW.user_id); END""",
+    'players_changes_delete': """CREATE TRIGGER IF NOT EXISTS players_changes_delete AFTER DELETE ON players
+        BEGIN INSERT INTO player_changes (user_id) VALUES (OLD.user_id); END""",
+}
+
+# Réglages appliqués à chaque connexion du pool
+PRAGMAS = (
+    "PRAGMA busy_timeout = 5000",  # En premier: les processus voisins peuvent tenir un verrou
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # Sûr en WAL: seul le dernier commit peut être perdu en cas de coupure
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # ~16 Mo de cache de pages par connexion
+    "PRAGMA mmap_size = 268435456",
+)
+
+# L'écrivain attend le fsync de chaque commit: avec le regroupement des
+# écritures, un seul fsync couvre tout un lot.
+WRITER_PRAGMAS = (
+    "PRAGMA synchronous = FULL",
+)
+
+
+# Colonnes de la table players (sans les champs rangés dans leur table)
+PLAYER_COLUMNS = tuple(name for name in PLAYER_FIELDS if name not in TABLE_FIELDS)
+
+_SELECT_PLAYER = f"SELECT {', '.join(PLAYER_COLUMNS)} FROM players WHERE user_id = ?"
+
+INSERT_STATS = 'INSERT INTO player_stats (user_id, stat, value, position) VALUES (?, ?, ?, ?)'
+INSERT_JUTSU = 'INSERT INTO player_jutsu (user_id, position, jutsu) VALUES (?, ?, ?)'
+
+
+@lru_cache(maxsize=128)
+def _update_sql(keys: Tuple[str, ...]) -> str:
+    set_clause = ', '.join([f"{key} = ?" for key in keys])
+    return f'UPDATE players SET {set_clause} WHERE user_id = ?'
+
+
+def _encode(key: str, value):
+    if key in JSON_FIELDS and value is not None:
+        return json.dumps(value)
+    return value
+
+
+def _payload_size(values) -> int:
+    """Taille approximative (octets) des valeurs envoyées à SQLite"""
+    return sum(len(value.encode('utf-8')) if isinstance(value, str) else 8
+               for value in values if value is not None)
+
+
+def _decode_row(columns, row) -> Dict[str, Any]:
+    player = dict(zip(columns, row))
+    for key in JSON_FIELDS:
+        if player.get(key) is not None:
+            player[key] = json.loads(player[key])
+    return player
+
+
+def _stat_rows(user_id: int, stats: Optional[Dict[str, int]]) -> List[Tuple[int, str, int, int]]:
+    return [(user_id, stat, value, position) for position, (stat, value) in enumerate((stats or {}).items())]
+
+
+def _jutsu_rows(user_id: int, jutsu_list: Optional[List[str]]) -> List[Tuple[int, int, str]]:
+    return [(user_id, position, jutsu) for position, jutsu in enumerate(jutsu_list or ())]
+
+
+async def _write_tables(db, user_id: int, payload: Dict[str, Any]) -> int:
+    """Remplacer les stats et jutsu présents dans `payload`, renvoie la taille des valeurs"""
+    size = 0
+    if 'stats' in payload:
+        await db.execute('DELETE FROM player_stats WHERE user_id = ?', (user_id,))
+        rows = _stat_rows(user_id, payload['stats'])
+        await db.executemany(INSERT_STATS, rows)
+        size += sum(_payload_size(row) for row in rows)
+    if 'jutsu_list' in payload:
+        await db.execute('DELETE FROM player_jutsu WHERE user_id = ?', (user_id,))
+        rows = _jutsu_rows(user_id, payload['jutsu_list'])
+        await db.executemany(INSERT_JUTSU, rows)
+        size += sum(_payload_size(row) for row in rows)
+    return size
+
+
+async def _read_tables(db, first: int, last: int) -> Tuple[Dict[int, Dict[str, int]], Dict[int, List[str]]]:
+    """Stats et jutsu des joueurs first..last, par joueur, dans l'ordre de la fiche
+    
+    Une seule requête (et un seul aller-retour vers le thread de aiosqlite)
+    pour les deux tables.
+    """
+    stats: Dict[int, Dict[str, int]] = {}
+    jutsu: Dict[int, List[str]] = {}
+    rows = await db.execute_fetchall(
+        '''SELECT user_id, 0 AS kind, position, stat, value FROM player_stats WHERE user_id BETWEEN ? AND ?
+           UNION ALL
+           SELECT user_id, 1, position, jutsu, NULL FROM player_jutsu WHERE user_id BETWEEN ? AND ?
+           ORDER BY user_id, kind, position''',
+        (first, last, first, last)
+    )
+    for user_id, kind, _, name, value in rows:
+        if kind:
+            jutsu.setdefault(user_id, []).append(name)
+        else:
+            stats.setdefault(user_id, {})[name] = value
+    return stats, jutsu
+
+
+def _online_backup(source: str, target: str, pages: int, max_rate: Optional[float]):
+    """Copier la base avec l'API de backup en ligne, `pages` pages par pas
+    
+    La copie garde une transaction de lecture ouverte sur la source: en WAL
+    les écritures continuent pendant la copie, qui reste celle du début.
+    Sans elle, chaque écriture d'une autre connexion ferait recommencer la
+    copie depuis la première page.
+    
+    La source est ouverte en lecture seule: un chemin erroné échoue au lieu
+    de créer (et sauvegarder) une base vide.
+    """
+    src = sqlite3.connect(f'file:{pathname2url(os.path.abspath(source))}?mode=ro', uri=True, isolation_level=None)
+    dst = sqlite3.connect(target)
+    try:
+        src.execute('PRAGMA busy_timeout = 5000')
+        page_size = src.execute('PRAGMA page_size').fetchone()[0]
+        # Pause entre deux pas pour rester sous max_rate octets/s
+        pause = pages * page_size / max_rate if max_rate else 0.0
+        src.execute('BEGIN')
+        src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        src.execute('COMMIT')
+    finally:
+        dst.close()
+        src.close()
+
+
+@dataclass
+class _PendingWrite:
+    kind: str  # 'create', 'update' ou 'delete'
+    user_id: int
+    payload: Dict[str, Any]
+    futures: List[asyncio.Future] = field(default_factory=list)
+
+
+@dataclass
+class WriteBatchStats:
+    """Compteurs du regroupement des écritures"""
+    batches: int = 0
+    writes: int = 0
+    merged: int = 0  # Mises à jour fusionnées avec une autre du même joueur
+    failed: int = 0
+    max_batch_size: int = 0
+    flush_time_total: float = 0.0
+    flush_time_max: float = 0.0
+    last_flush_time: float = 0.0
+    
+    @property
+    def avg_batch_size(self) -> float:
+        return self.writes / self.batches if self.batches else 0.0
+    
+    @property
+    def avg_flush_time(self) -> float:
+        return self.flush_time_total / self.batches if self.batches else 0.0
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "naruto_game.db"):
+    """Accès SQLite via un pool persistant: une connexion d'écriture et N de lecture
+    
+    Les connexions sont ouvertes par init_db et fermées par close. En mode
+    WAL les lecteurs ne bloquent pas l'écrivain; les écritures passent toutes
+    par la même connexion, sérialisées par un verrou.
+    
+    create_player, update_player et delete_player sont mis en file puis
+    validés par lots (group commit): un lot part dès qu'il atteint batch_size
+    écritures ou après batch_delay secondes. Chaque appel ne rend la main
+    qu'une fois son lot validé sur disque.
+    
+    Les écouteurs (add_listener) reçoivent (user_id, champs écrits) après
+    chaque écriture validée, None pour une suppression. Les écritures des
+    autres processus qui partagent la base se lisent avec ranking_changes,
+    à condition que tous les processus soient lancés avec track_changes=True
+    (triggers CHANGE_TRIGGERS). False les supprime: un bot seul n'écrit pas
+    de ligne player_changes par écriture classée. None (outils en ligne de
+    commande) laisse la base telle quelle.
+    """
+    
+    def __init__(self, db_path: str = "naruto_game.db", readers: int = 4,
+                 batch_size: int = 128, batch_delay: float = 0.005, change_retention: float = 3600.0,
+                 track_changes: Optional[bool] = None):
         self.db_path = db_path
+        self.track_changes = track_changes
+        self.reader_count = readers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        # Durée (secondes) pendant laquelle player_changes garde un changement
+        self.change_retention = change_retention
+        self._next_prune = 0.0
+        self.write_stats = WriteBatchStats()
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[int, Optional[Dict[str, Any]]], None]] = []
+    
+    def add_listener(self, callback: Callable[[int, Optional[Dict[str, Any]]], None]):
+        self._listeners.append(callback)
+    
+    def _notify(self, user_id: int, fields: Optional[Dict[str, Any]]):
+        for callback in self._listeners:
+            callback(user_id, fields)
+    
+    async def _connect(self, pragmas=()) -> aiosqlite.Connection:
+        # cached_statements: cache des requêtes préparées de sqlite3, par connexion
+        conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        for pragma in PRAGMAS + tuple(pragmas):
+            await conn.execute(pragma)
+        return conn
     
     async def init_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            # Table des joueurs
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS players (
-                    user_id INTEGER PRIMARY KEY,
-                    name TEXT,
-                    village TEXT,
-                    clan TEXT,
-                    level INTEGER DEFAULT 1,
-                    exp INTEGER DEFAULT 0,
-                    chakra INTEGER DEFAULT 100,
-                    health INTEGER DEFAULT 100,
-                    stamina INTEGER DEFAULT 100,
-                    stats TEXT,
-                    jutsu_list TEXT,
-                    ryo INTEGER DEFAULT 500,
-                    last_daily TIMESTAMP
-                )
-            ''')
-            
-            # Table des combats
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS battles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player1_id INTEGER,
-                    player2_id INTEGER,
-                    status TEXT,
-                    turn INTEGER DEFAULT 1,
-                    battle_data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            await db.commit()
-    
-    async def create_player(self, user_id: int, name: str, village: str, clan: str = None):
-        async with aiosqlite.connect(self.db_path) as db:
-            stats = json.dumps({
-                "ninjutsu": 10,
-                "genjutsu": 10,
-                "taijutsu": 10,
-                "speed": 10,
-                "strength": 10,
-                "intelligence": 10
-            })
+        self._writer = await self._connect(WRITER_PRAGMAS)
+        db = self._writer
+        
+        # Plusieurs processus peuvent démarrer ensemble: un seul crée le schéma
+        # et applique les migrations, les autres attendent (busy_timeout)
+        await db.execute('BEGIN IMMEDIATE')
+        
+        # Table des joueurs
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS players (
+                user_id INTEGER PRIMARY KEY,
+                name TEXT,
+                village TEXT,
+                clan TEXT,
+                level INTEGER DEFAULT 1,
+                exp INTEGER DEFAULT 0,
+                chakra INTEGER DEFAULT 100,
+                health INTEGER DEFAULT 100,
+                stamina INTEGER DEFAULT 100,
+                stats TEXT,
+                jutsu_list TEXT,
+                ryo INTEGER DEFAULT 500,
+                last_daily TIMESTAMP
+            )
+        ''')
+        
+        # Table des combats
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS battles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player1_id INTEGER,
+                player2_id INTEGER,
+                status TEXT,
+                turn INTEGER DEFAULT 1,
+                battle_data TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        await self._migrate(db)
+        if self.track_changes is not None:
+            for name, statement in CHANGE_TRIGGERS.items():
+                await db.execute(statement if self.track_changes else f'DROP TRIGGER IF EXISTS {name}')
+        await db.commit()
+        
+        # Les lecteurs sont ouverts après les migrations pour voir le schéma final
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.reader_count):
+            conn = await self._connect()
+            await conn.execute("PRAGMA query_only = 1")
+            self._readers.append(conn)
+            self._idle_readers.put_nowait(conn)
+        
+        self._write_queue = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        self._batch_task = asyncio.create_task(self._batch_loop())
+    
+    async def _migrate(self, db):
+        async with db.execute('PRAGMA user_version') as cursor:
+            version = (await cursor.fetchone())[0]
+        
+        for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                if callable(statement):
+                    await statement(db)
+                else:
+                    await db.execute(statement)
+            await db.execute(f'PRAGMA user_version = {target}')
+    
+    async def close(self):
+        """Valider les écritures en attente puis fermer toutes les connexions du pool"""
+        if self._batch_task is not None:
+            self._write_queue.put_nowait(None)
+            self._batch_full.set()
+            await self._batch_task
+            self._batch_task = None
+        
+        for conn in self._readers:
+            await conn.close()
+        self._readers.clear()
+        self._idle_readers = None
+        
+        if self._writer is not None:
+            async with self._write_lock:
+                await self._writer.close()
+            self._writer = None
+    
+    @asynccontextmanager
+    async def _reader(self):
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def _snapshot(self):
+        """Lecteur dans une transaction de lecture explicite
+        
+        En autocommit, chaque SELECT voit le dernier état validé: une fiche et
+        ses stats lues par deux requêtes pourraient encadrer un commit. Entre
+        BEGIN et COMMIT, toutes les requêtes lisent le même instantané du WAL.
+        """
+        async with self._reader() as db:
+            await db.execute('BEGIN')
+            try:
+                yield db
+            finally:
+                await db.execute('COMMIT')
+    
+    @asynccontextmanager
+    async def _transaction(self):
+        """Transaction sur la connexion d'écriture (commit ou rollback)"""
+        async with self._write_lock:
+            # Verrou d'écriture pris dès le début: avec plusieurs processus,
+            # l'attente passe par busy_timeout au lieu d'un échec au commit
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+    
+    async def _submit(self, kind: str, user_id: int, payload: Dict[str, Any]):
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait(_PendingWrite(kind, user_id, payload, [future]))
+        if self._write_queue.qsize() >= self.batch_size:
+            self._batch_full.set()
+        # Attente vue par la commande: file + regroupement + commit du lot
+        with STORAGE_LATENCY.time('sqlite', kind):
+            await future
+    
+    async def _batch_loop(self):
+        while True:
+            first = await self._write_queue.get()
+            pending = [first]
+            stop = first is None
             
-            jutsu_list = json.dumps(["Clone no Jutsu", "Kawarimi no Jutsu"])
+            # Laisser le lot se remplir jusqu'à batch_size ou batch_delay
+            if not stop and self._write_queue.qsize() < self.batch_size - 1:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.batch_delay)
+                except asyncio.TimeoutError:
+                    pass
             
-            await db.execute('''
-                INSERT INTO players 
-                (user_id, name, village, clan, stats, jutsu_list)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, name, village, clan, stats, jutsu_list))
+            while len(pending) < self.batch_size and not self._write_queue.empty():
+                pending.append(self._write_queue.get_nowait())
+            if None in pending:
+                stop = True
+                pending = [write for write in pending if write is not None]
             
-            await db.commit()
+            if pending:
+                await self._commit_batch(pending)
+            if stop and self._write_queue.empty():
+                return
+    
+    def _merge(self, pending: List[_PendingWrite]) -> List[_PendingWrite]:
+        """Fusionner les mises à jour successives d'un même joueur"""
+        batch: List[_PendingWrite] = []
+        last_by_user: Dict[int, _PendingWrite] = {}
+        for write in pending:
+            previous = last_by_user.get(write.user_id)
+            if write.kind == 'update' and previous is not None and previous.kind == 'update':
+                previous.payload = {**previous.payload, **write.payload}
+                previous.futures.extend(write.futures)
+                self.write_stats.merged += 1
+                continue
+            batch.append(write)
+            last_by_user[write.user_id] = write
+        return batch
+    
+    async def _commit_batch(self, pending: List[_PendingWrite]):
+        started = time.perf_counter()
+        batch = self._merge(pending)
+        results = []
+        written = 0
+        
+        try:
+            async with self._transaction() as db:
+                if time.monotonic() >= self._next_prune:
+                    await self._prune_changes(db)
+                for write in batch:
+                    # Un savepoint par écriture: une erreur n'annule pas tout le lot
+                    await db.execute('SAVEPOINT write')
+                    try:
+                        size = await self._execute_write(db, write)
+                    except Exception as e:
+                        await db.execute('ROLLBACK TO write')
+                        results.append(e)
+                    else:
+                        results.append(None)
+                        written += size
+                    await db.execute('RELEASE write')
+        except Exception as e:
+            results = [e] * len(batch)
+        
+        for write, error in zip(batch, results):
+            for future in write.futures:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            if error is not None:
+                self.write_stats.failed += 1
+        
+        elapsed = time.perf_counter() - started
+        STORAGE_LATENCY.observe(elapsed, 'sqlite', 'commit')
+        STORAGE_BYTES.observe(written, 'sqlite', 'commit')
+        stats = self.write_stats
+        stats.batches += 1
+        stats.writes += len(pending)
+        stats.max_batch_size = max(stats.max_batch_size, len(pending))
+        stats.flush_time_total += elapsed
+        stats.flush_time_max = max(stats.flush_time_max, elapsed)
+        stats.last_flush_time = elapsed
+    
+    async def _prune_changes(self, db):
+        """Purger les changements plus vieux que change_retention (au plus 4 fois par période)"""
+        self._next_prune = time.monotonic() + self.change_retention / 4
+        await db.execute(
+            "DELETE FROM player_changes WHERE changed_at < (julianday('now') - 2440587.5) * 86400.0 - ?",
+            (self.change_retention,)
+        )
+    
+    async def _execute_write(self, db, write: _PendingWrite) -> int:
+        """Exécuter une écriture, renvoie la taille des valeurs envoyées"""
+        columns = {key: value for key, value in write.payload.items() if key not in TABLE_FIELDS}
+        if write.kind == 'create':
+            placeholders = ', '.join('?' for _ in columns)
+            values = [_encode(key, value) for key, value in columns.items()]
+            await db.execute(f'INSERT INTO players ({", ".join(columns)}) VALUES ({placeholders})', values)
+            return _payload_size(values) + await _write_tables(db, write.user_id, write.payload)
+        elif write.kind == 'update':
+            size = 0
+            if columns:
+                values = [_encode(key, value) for key, value in columns.items()] + [write.user_id]
+                cursor = await db.execute(_update_sql(tuple(columns)), values)
+                found = cursor.rowcount > 0
+                size = _payload_size(values)
+            else:
+                async with db.execute('SELECT 1 FROM players WHERE user_id = ?', (write.user_id,)) as cursor:
+                    found = await cursor.fetchone() is not None
+            # Comme un UPDATE: rien n'est écrit pour un joueur absent
+            if found:
+                size += await _write_tables(db, write.user_id, write.payload)
+            return size
+        elif write.kind == 'delete':
+            for table in ('players', 'player_stats', 'player_jutsu'):
+                await db.execute(f'DELETE FROM {table} WHERE user_id = ?', (write.user_id,))
+        return 0
+    
+    async def create_player(self, user_id: int, name: str, village: str, clan: str = None, **fields):
+        record = new_player_record(user_id, name, village, clan, **fields)
+        await self._submit('create', record['user_id'], record)
+        self._notify(record['user_id'], record)
     
     async def get_player(self, user_id: int) -> Optional[Dict[str, Any]]:
-        async with aiosqlite.connect(self.db_path) as db:
+        with STORAGE_LATENCY.time('sqlite', 'get_player'):
+            async with self._snapshot() as db:
+                rows = await db.execute_fetchall(_SELECT_PLAYER, (user_id,))
+                if not rows:
+                    return None
+                player = _decode_row(PLAYER_COLUMNS, rows[0])
+                stats, jutsu = await _read_tables(db, user_id, user_id)
+                player['stats'] = stats.get(user_id, {})
+                player['jutsu_list'] = jutsu.get(user_id, [])
+                return player
+    
+    async def update_player(self, user_id: int, **kwargs):
+        if kwargs:
+            await self._submit('update', user_id, kwargs)
+            self._notify(user_id, kwargs)
+    
+    async def delete_player(self, user_id: int):
+        await self._submit('delete', user_id, {})
+        self._notify(user_id, None)
+    
+    async def ranking_rows(self) -> List[Tuple[int, str, int, int, int]]:
+        """(user_id, village, level, exp, ryo) de tous les joueurs, pour les classements"""
+        with STORAGE_LATENCY.time('sqlite', 'ranking_rows'):
+            async with self._reader() as db:
+                async with db.execute('SELECT user_id, village, level, exp, ryo FROM players') as cursor:
+                    return await cursor.fetchall()
+    
+    async def player_names(self, user_ids: List[int]) -> Dict[int, str]:
+        """Noms d'un lot de joueurs (classements) en une seule requête; les absents sont omis"""
+        if not user_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in user_ids)
+        with STORAGE_LATENCY.time('sqlite', 'player_names'):
+            async with self._reader() as db:
+                rows = await db.execute_fetchall(
+                    f'SELECT user_id, name FROM players WHERE user_id IN ({placeholders})', list(user_ids))
+        return dict(rows)
+    
+    async def pending_timers(self, kind: str) -> List[Tuple[int, float]]:
+        """(user_id, échéance) des minuteurs en attente d'un type (index partiel)"""
+        column = TIMER_FIELDS[kind]
+        async with self._reader() as db:
+            async with db.execute(f'SELECT user_id, {column} FROM players WHERE {column} > 0') as cursor:
+                return await cursor.fetchall()
+    
+    async def iter_players(self, batch_size: int = 1000) -> AsyncIterator[Player]:
+        """Parcourir tous les joueurs par ordre d'identifiant (copies, exports)
+        
+        Tout le parcours se fait dans une seule transaction de lecture: les
+        fiches et leurs stats viennent du même instantané, même si des
+        écritures sont validées entre deux lots.
+        """
+        columns = ', '.join(PLAYER_COLUMNS)
+        async with self._snapshot() as db:
+            async with db.execute(f'SELECT {columns} FROM players ORDER BY user_id') as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    # user_id est la première colonne
+                    stats, jutsu = await _read_tables(db, rows[0][0], rows[-1][0])
+                    for row in rows:
+                        yield Player(**_decode_row(PLAYER_COLUMNS, row),
+                                     stats=stats.get(row[0], {}), jutsu_list=jutsu.get(row[0], []))
+    
+    async def latest_change(self) -> int:
+        """Numéro du dernier changement de champ classé (0 si aucun)"""
+        async with self._reader() as db:
+            # sqlite_sequence garde le dernier numéro même quand la table a été purgée
+            async with db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'player_changes'") as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else 0
+    
+    async def ranking_changes(self, since: int) -> Tuple[int, Optional[List[Tuple[int, Optional[Dict[str, Any]]]]]]:
+        """Joueurs dont un champ classé a changé après `since`, quel que soit le processus
+        
+        Renvoie (dernier numéro lu, [(user_id, champs classés ou None si supprimé)]),
+        au format des écouteurs. La liste vaut None si une partie des changements
+        a déjà été purgée: il faut alors tout relire avec ranking_rows().
+        """
+        async with self._reader() as db:
+            async with db.execute('SELECT MIN(seq), MAX(seq) FROM player_changes') as cursor:
+                first, last = await cursor.fetchone()
+            if last is None or last <= since:
+                return since, []
+            # Les numéros se suivent sans trou: un trou après `since` vient d'une purge
+            if first > since + 1:
+                return last, None
             async with db.execute(
-                'SELECT * FROM players WHERE user_id = ?', (user_id,)
+                '''SELECT c.user_id, p.user_id, p.village, p.level, p.exp, p.ryo
+                   FROM (SELECT DISTINCT user_id FROM player_changes WHERE seq > ? AND seq <= ?) AS c
+                   LEFT JOIN players AS p ON p.user_id = c.user_id''',
+                (since, last)
             ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    columns = [description[0] for description in cursor.description]
-                    return dict(zip(columns, row))
-                return None
+                rows = await cursor.fetchall()
+        changes = [
+            (user_id, None if found is None else {'village': village, 'level': level, 'exp': exp, 'ryo': ryo})
+            for user_id, found, village, level, exp, ryo in rows
+        ]
+        return last, changes
     
-    async def update_player(self, user_id: int, **kwargs):
-        async with aiosqlite.connect(self.db_path) as db:
-            set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
-            values = list(kwargs.values()) + [user_id]
-            
-            await db.execute(
-                f'UPDATE players SET {set_clause} WHERE user_id = ?',
-                values
+    async def upsert_players(self, players: List[Player]):
+        """Insérer ou remplacer un lot de joueurs dans une seule transaction"""
+        columns = ', '.join(PLAYER_COLUMNS)
+        placeholders = ', '.join('?' for _ in PLAYER_COLUMNS)
+        rows = [[_encode(key, getattr(player, key)) for key in PLAYER_COLUMNS] for player in players]
+        user_ids = [(player.user_id,) for player in players]
+        stat_rows = [row for player in players for row in _stat_rows(player.user_id, player.stats)]
+        jutsu_rows = [row for player in players for row in _jutsu_rows(player.user_id, player.jutsu_list)]
+        
+        async with self._transaction() as db:
+            await db.executemany(
+                f'INSERT OR REPLACE INTO players ({columns}) VALUES ({placeholders})',
+                rows
             )
-            await db.commit()
\ No newline at end of file
+            await db.executemany('DELETE FROM player_stats WHERE user_id = ?', user_ids)
+            await db.executemany('DELETE FROM player_jutsu WHERE user_id = ?', user_ids)
+            await db.executemany(INSERT_STATS, stat_rows)
+            await db.executemany(INSERT_JUTSU, jutsu_rows)
+    
+    async def backup_files(self, staging: str, pages: int = 256,
+                           max_rate: Optional[float] = None) -> Dict[str, Tuple[str, str]]:
+        """Copie cohérente de la base dans `staging` pour database.backup, sans bloquer les écritures
+        
+        Connexion dédiée (ni l'écrivain ni les lecteurs du pool): fonctionne
+        aussi avant init_db, depuis la ligne de commande.
+        """
+        name = os.path.basename(self.db_path)
+        target = os.path.join(staging, name)
+        await asyncio.to_thread(_online_backup, self.db_path, target, pages, max_rate)
+        return {name: (target, os.path.abspath(self.db_path))}
+    
+    async def stat_averages(self, stat: Optional[str] = None) -> List[Tuple[str, str, float, int]]:
+        """(village, stat, moyenne, joueurs) calculés par SQLite, pour une stat ou toutes"""
+        where = 'WHERE s.stat = ?' if stat is not None else ''
+        with STORAGE_LATENCY.time('sqlite', 'stat_averages'):
+            async with self._reader() as db:
+                async with db.execute(
+                    f'''SELECT p.village, s.stat, AVG(s.value), COUNT(*)
+                        FROM player_stats AS s JOIN players AS p ON p.user_id = s.user_id
+                        {where}
+                        GROUP BY p.village, s.stat ORDER BY p.village, s.stat''',
+                    () if stat is None else (stat,)
+                ) as cursor:
+                    return await cursor.fetchall()
+    
+    async def top_stat(self, stat: str, limit: int = 10) -> List[Tuple[int, int]]:
+        """(user_id, valeur) des meilleurs joueurs pour une stat (index stat, value)"""
+        with STORAGE_LATENCY.time('sqlite', 'top_stat'):
+            async with self._reader() as db:
+                async with db.execute(
+                    'SELECT user_id, value FROM player_stats WHERE stat = ? ORDER BY value DESC LIMIT ?',
+                    (stat, limit)
+                ) as cursor:
+                    return await cursor.fetchall()
+    
+    async def players_with_jutsu(self, jutsu: str) -> List[int]:
+        """Identifiants des joueurs qui connaissent un jutsu"""
+        with STORAGE_LATENCY.time('sqlite', 'players_with_jutsu'):
+            async with self._reader() as db:
+                async with db.execute(
+                    'SELECT DISTINCT user_id FROM player_jutsu WHERE jutsu = ? ORDER BY user_id', (jutsu,)
+                ) as cursor:
+                    return [user_id for user_id, in await cursor.fetchall()]
+    
+    async def jutsu_counts(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """(jutsu, joueurs qui le connaissent) des jutsu les plus répandus"""
+        with STORAGE_LATENCY.time('sqlite', 'jutsu_counts'):
+            async with self._reader() as db:
+                async with db.execute(
+                    '''SELECT jutsu, COUNT(DISTINCT user_id) AS players FROM player_jutsu
+                       GROUP BY jutsu ORDER BY players DESC, jutsu LIMIT ?''',
+                    (limit,)
+                ) as cursor:
+                    return await cursor.fetchall()
@@ -0,0 +1,443 @@
+import asyncio
+import functools
+import itertools
+import json
+import marshal
+import operator
+import os
+import secrets
+import shutil
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable, Iterator, Tuple
+
+from database.records import (
+    Player, PLAYER_FIELDS, SNAPSHOT_VERSION, decode_player, plain_column, plain_value, share_column, share_strings
+)
+from utils.metrics import STORAGE_BYTES, STORAGE_LATENCY
+
+_WHITESPACE = ' \t\r\n'
+
+# Snapshot binaire: en-tête (magie, version du format, version de marshal,
+# identifiant du snapshot JSON correspondant, taille et CRC32 des données)
+# puis des blocs marshal préfixés par leur taille: la liste des champs, puis
+# (clés, colonnes) par paquets de BINARY_CHUNK joueurs.
+BINARY_MAGIC = b'NJBS'
+BINARY_VERSION = 1
+BINARY_CHUNK = 65536
+_BINARY_HEADER = struct.Struct('<4sHH16sQI')
+_BLOCK_SIZE = struct.Struct('<I')
+
+
+class JsonStreamReader:
+    """Lecteur JSON incrémental pour parcourir un gros objet clé par clé"""
+    
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+    
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+    
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+    
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"JSON invalide: '{char}' attendu à la position {self.pos}")
+        self.pos += 1
+    
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # Un nombre en fin de tampon peut être incomplet: relire plus loin
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+    
+    def iter_keys(self) -> Iterator[str]:
+        """Parcourir les clés de l'objet courant
+        
+        Après chaque clé, l'appelant doit consommer la valeur (value() ou
+        un iter_keys()/iter_items() imbriqué) avant de demander la suivante.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+    
+    def iter_items(self) -> Iterator[Tuple[str, Any]]:
+        """Parcourir les paires clé/valeur de l'objet courant"""
+        for key in self.iter_keys():
+            yield key, self.value()
+
+
+# Base de données simple (JSON)
+class Database:
+    """Snapshot JSON des joueurs, avec journal des modifications en option
+    
+    En mode journalisé, chaque sauvegarde ajoute uniquement les joueurs
+    modifiés à la fin du journal. Le journal est régulièrement compacté dans
+    un nouveau snapshot, remplacé de façon atomique (fichier temporaire +
+    rename). Au chargement, le snapshot est relu puis le journal rejoué.
+    """
+    
+    def __init__(self, players_file: str = 'players.json', journaled: bool = False,
+                 journal_file: Optional[str] = None, compact_threshold: int = 4 * 1024 * 1024,
+                 binary: bool = False):
+        self.players_file = players_file
+        self.clans_file = 'clans.json'
+        self.journaled = journaled
+        self.journal_file = journal_file or players_file + '.journal'
+        self.compact_threshold = compact_threshold  # Taille du journal (octets) déclenchant une compaction
+        self.journal_size = 0
+        # Copie binaire de chaque snapshot, relue au démarrage à la place du JSON
+        self.binary = binary
+        self.binary_file = players_file + '.bin'
+        self.load_report: Dict[str, Any] = {}  # Détail du dernier chargement
+    
+    def iter_snapshot(self) -> Iterator[Tuple[str, Player]]:
+        """Lire le snapshot joueur par joueur, quelle que soit sa version
+        
+        La lecture en flux garde la mémoire bornée et relâche le GIL entre
+        deux joueurs: la boucle asyncio continue de tourner pendant un
+        chargement en thread.
+        """
+        try:
+            f = open(self.players_file, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            reader = JsonStreamReader(f)
+            columns = None
+            for key in reader.iter_keys():
+                if key in ('version', 'snapshot'):
+                    reader.value()
+                elif key == 'fields':
+                    columns = reader.value()
+                elif key == 'players' and columns is not None:
+                    for user_id in reader.iter_keys():
+                        yield user_id, decode_player(reader.value(), user_id, columns)
+                else:
+                    # Versions 0 et 1: l'objet racine est directement {id: joueur}
+                    yield key, decode_player(reader.value(), key)
+    
+    def load_players(self) -> Dict[str, Player]:
+        with STORAGE_LATENCY.time('json', 'load'):
+            started = time.perf_counter()
+            players = self.load_binary() if self.binary else None
+            source = 'binaire'
+            if players is None:
+                players = dict(self.iter_snapshot())
+                source = 'json'
+            loaded = time.perf_counter()
+            if self.journaled:
+                self._replay_journal(players)
+        self.load_report = {
+            'source': source,
+            'snapshot_s': loaded - started,
+            'journal_s': time.perf_counter() - loaded,
+            'players': len(players),
+        }
+        return players
+    
+    def snapshot_id(self) -> Optional[str]:
+        """Identifiant du snapshot JSON, lu dans son en-tête (None avant la version 3)"""
+        try:
+            f = open(self.players_file, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        with f:
+            reader = JsonStreamReader(f)
+            for key in reader.iter_keys():
+                if key == 'snapshot':
+                    return reader.value()
+                if key not in ('version', 'fields'):
+                    return None
+                reader.value()
+        return None
+    
+    def load_binary(self) -> Optional[Dict[str, Player]]:
+        """Relire le snapshot binaire, None s'il manque, est corrompu ou plus ancien que le JSON"""
+        try:
+            with open(self.binary_file, 'rb') as f:
+                header = f.read(_BINARY_HEADER.size)
+                if len(header) < _BINARY_HEADER.size:
+                    return None
+                magic, version, marshal_version, snapshot, size, checksum = _BINARY_HEADER.unpack(header)
+                if (magic, version, marshal_version) != (BINARY_MAGIC, BINARY_VERSION, marshal.version):
+                    return None
+                payload = f.read(size)
+        except FileNotFoundError:
+            return None
+        if len(payload) != size or zlib.crc32(payload) != checksum:
+            print(f"⚠️ {self.binary_file} corrompu, lecture du JSON")
+            return None
+        # Un arrêt entre l'écriture du JSON et celle du binaire laisse un binaire périmé
+        json_snapshot = self.snapshot_id()
+        if os.path.exists(self.players_file) and json_snapshot != snapshot.decode('ascii'):
+            return None
+        
+        try:
+            return self._decode_binary(memoryview(payload))
+        except (ValueError, TypeError, EOFError, struct.error) as e:
+            print(f"⚠️ {self.binary_file} illisible ({e}), lecture du JSON")
+            return None
+    
+    def _decode_binary(self, view: memoryview) -> Dict[str, Player]:
+        blocks = []
+        pos = 0
+        while pos < len(view):
+            (length,) = _BLOCK_SIZE.unpack_from(view, pos)
+            pos += _BLOCK_SIZE.size
+            blocks.append(view[pos:pos + length])
+            pos += length
+        
+        columns = tuple(marshal.loads(blocks[0]))
+        players = {}
+        for block in blocks[1:]:
+            keys, values = marshal.loads(block)
+            if columns == PLAYER_FIELDS:
+                values = [share_column(name, column) for name, column in zip(columns, values)]
+                players.update(zip(keys, map(Player, *values)))
+            else:
+                players.update(
+                    (key, share_strings(Player.from_row(row, columns))) for key, row in zip(keys, zip(*values))
+                )
+        return players
+    
+    def _save_binary(self, players: Dict[str, Player], snapshot: str) -> int:
+        """Écrire la copie binaire du snapshot, renvoie sa taille
+        
+        Un bloc par paquet de joueurs: chaque marshal.dumps reste court et
+        laisse la boucle asyncio tourner entre deux blocs. marshal n'écrit
+        qu'une fois un objet déjà vu dans le bloc: les chaînes et les stats
+        partagées en mémoire (records.share_strings) le restent à la relecture.
+        """
+        getters = [(name, operator.attrgetter(name)) for name in PLAYER_FIELDS]
+        items = list(players.items())
+        tmp_file = self.binary_file + '.tmp'
+        size = 0
+        checksum = 0
+        blocks = itertools.chain(
+            [PLAYER_FIELDS],
+            (
+                ([key for key, _ in chunk],
+                 [plain_column(name, list(map(get, [player for _, player in chunk]))) for name, get in getters])
+                for chunk in (items[start:start + BINARY_CHUNK] for start in range(0, len(items), BINARY_CHUNK))
+            ),
+        )
+        with open(tmp_file, 'wb') as f:
+            f.write(b'\0' * _BINARY_HEADER.size)
+            for data in blocks:
+                block = marshal.dumps(data)
+                block = _BLOCK_SIZE.pack(len(block)) + block
+                checksum = zlib.crc32(block, checksum)
+                size += len(block)
+                f.write(block)
+            f.seek(0)
+            f.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, marshal.version,
+                                        snapshot.encode('ascii'), size, checksum))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.binary_file)
+        return _BINARY_HEADER.size + size
+    
+    def iter_journal(self) -> Iterator[Tuple[str, Optional[Player]]]:
+        """Lire les entrées valides du journal (None = joueur supprimé)"""
+        for user_id, player, _ in self._read_journal():
+            yield user_id, player
+    
+    def _read_journal(self) -> Iterator[Tuple[str, Optional[Player], int]]:
+        """Entrées valides du journal avec la taille de leur ligne, jusqu'à la première illisible"""
+        try:
+            f = open(self.journal_file, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal: on l'ignore
+                    return
+                data = entry['data']
+                yield entry['id'], (decode_player(data, entry['id']) if data is not None else None), len(line)
+    
+    def _replay_journal(self, players: Dict[str, Player]):
+        """Rejouer le journal par-dessus le snapshot"""
+        valid_size = 0
+        for user_id, player, size in self._read_journal():
+            if player is None:
+                players.pop(user_id, None)
+            else:
+                players[user_id] = player
+            valid_size += size
+        
+        # Couper une éventuelle fin corrompue pour que les ajouts suivants restent lisibles
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) != valid_size:
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_size)
+        self.journal_size = valid_size
+    
+    def append_changes(self, changes: Dict[str, Optional[Player]]) -> int:
+        """Ajouter les joueurs modifiés au journal (None = joueur supprimé)
+        
+        Les fiches sont écrites comme les lignes du snapshot, dans l'ordre de
+        PLAYER_FIELDS: les nouveaux champs doivent être ajoutés en fin de Player.
+        """
+        started = time.perf_counter()
+        lines = [
+            json.dumps(
+                {"id": user_id, "data": player.to_row() if player is not None else None},
+                ensure_ascii=False, separators=(',', ':'), default=plain_value
+            ) + '\n'
+            for user_id, player in changes.items()
+        ]
+        payload = ''.join(lines).encode('utf-8')
+        with open(self.journal_file, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_size += len(payload)
+        STORAGE_LATENCY.observe(time.perf_counter() - started, 'json', 'journal')
+        STORAGE_BYTES.observe(len(payload), 'json', 'journal')
+        return len(payload)
+    
+    def needs_compaction(self) -> bool:
+        return self.journaled and self.journal_size >= self.compact_threshold
+    
+    def save_players(self, players: Dict[str, Player]):
+        """Écrire un snapshot complet de façon atomique puis vider le journal"""
+        started = time.perf_counter()
+        snapshot = secrets.token_hex(8)
+        tmp_file = self.players_file + '.tmp'
+        dumps = functools.partial(json.dumps, ensure_ascii=False, separators=(',', ':'), default=plain_value)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            # "players" en dernier pour pouvoir relire le fichier en flux
+            f.write(f'{{"version":{SNAPSHOT_VERSION},"fields":{dumps(PLAYER_FIELDS)},'
+                    f'"snapshot":"{snapshot}","players":{{')
+            for index, (user_id, player) in enumerate(players.items()):
+                f.write(f'{"," if index else ""}\n{dumps(user_id)}:{dumps(player.to_row())}')
+            f.write('\n}}')
+            f.flush()
+            os.fsync(f.fileno())
+        size = os.path.getsize(tmp_file)
+        os.replace(tmp_file, self.players_file)
+        if self.binary:
+            # Après le JSON: le binaire n'est jamais plus récent que le snapshot qu'il double
+            size += self._save_binary(players, snapshot)
+        
+        # Le snapshot contient tout: le journal peut repartir de zéro.
+        # Un arrêt entre les deux étapes est sans risque, rejouer le journal est idempotent.
+        if self.journaled:
+            with open(self.journal_file, 'wb') as f:
+                os.fsync(f.fileno())
+            self.journal_size = 0
+        STORAGE_LATENCY.observe(time.perf_counter() - started, 'json', 'save')
+        STORAGE_BYTES.observe(size, 'json', 'save')
+    
+    
+    def backup_files(self, staging: str) -> Dict[str, Tuple[str, str]]:
+        """Copier snapshot et journal dans `staging` pour database.backup
+        
+        À appeler sur le thread de stockage, entre deux écritures. Le snapshot
+        n'est jamais modifié en place (remplacé par rename): un lien dur suffit
+        quand `staging` est sur le même disque. Le journal, lui, est vidé en
+        place à chaque compaction et doit être copié.
+        """
+        snapshot = os.path.join(staging, os.path.basename(self.players_file))
+        try:
+            os.link(self.players_file, snapshot)
+        except OSError:
+            # Autre disque (ou pas de liens durs): copie
+            shutil.copyfile(self.players_file, snapshot)
+        files = {os.path.basename(self.players_file): (snapshot, os.path.abspath(self.players_file))}
+        if self.journaled:
+            # Toujours présent, même vide: restaurer un snapshot efface le journal plus récent
+            journal = os.path.join(staging, os.path.basename(self.journal_file))
+            if os.path.exists(self.journal_file):
+                shutil.copyfile(self.journal_file, journal)
+            else:
+                open(journal, 'wb').close()
+            files[os.path.basename(self.journal_file)] = (journal, os.path.abspath(self.journal_file))
+        return files
+
+
+class AsyncDatabase:
+    """Version asynchrone de Database: E/S et (dé)sérialisation hors de la boucle
+    
+    Tout passe par un unique thread dédié, ce qui garde les écritures dans
+    l'ordre. Au plus max_pending opérations peuvent être en file: au-delà,
+    l'appelant attend au lieu d'empiler du travail sans limite.
+    """
+    
+    def __init__(self, database: Database, max_pending: int = 4):
+        self.database = database
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        self._slots = asyncio.Semaphore(max_pending)
+    
+    @property
+    def journaled(self) -> bool:
+        return self.database.journaled
+    
+    @property
+    def journal_size(self) -> int:
+        return self.database.journal_size
+    
+    def needs_compaction(self) -> bool:
+        return self.database.needs_compaction()
+    
+    async def run(self, func: Callable, *args):
+        """Exécuter func(*args) sur le thread de stockage"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+    
+    async def load_players(self) -> Dict[str, Player]:
+        return await self.run(self.database.load_players)
+    
+    async def save_players(self, players: Dict[str, Player]):
+        await self.run(self.database.save_players, players)
+    
+    async def append_changes(self, changes: Dict[str, Optional[Player]]) -> int:
+        return await self.run(self.database.append_changes, changes)
+    
+    async def backup_files(self, staging: str) -> Dict[str, Tuple[str, str]]:
+        return await self.run(self.database.backup_files, staging)
+    
+    def close(self):
+        self._executor.shutdown(wait=True)
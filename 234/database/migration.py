@@ -0,0 +1,70 @@
+"""Migration de players.json (et de son journal) vers la base SQLite
+
+Le fichier est lu en flux: seuls le joueur en cours et le lot à insérer
+sont gardés en mémoire, même pour un players.json de plusieurs Go:
+    python -m database.migration [players.json] [naruto_game.db] [--batch 500]
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from database.db_manager import DatabaseManager
+from database.json_db import Database
+
+
+async def migrate_json_to_sqlite(json_path: str, db: DatabaseManager, batch_size: int = 500,
+                                 journal_path: Optional[str] = None) -> int:
+    """Copier tous les joueurs du JSON dans la table players par lots transactionnels
+    
+    Toutes les versions de snapshot sont acceptées (voir records.SNAPSHOT_VERSION).
+    """
+    source = Database(json_path, journal_file=journal_path)
+    await db.init_db()
+    batch = []
+    count = 0
+    
+    async def flush():
+        nonlocal count
+        if batch:
+            await db.upsert_players(batch)
+            count += len(batch)
+            batch.clear()
+    
+    for _, player in source.iter_snapshot():
+        batch.append(player)
+        if len(batch) >= batch_size:
+            await flush()
+    
+    # Rejouer la fin du journal dans l'ordre (les suppressions coupent le lot)
+    for user_id, player in source.iter_journal():
+        if player is None:
+            await flush()
+            await db.delete_player(int(user_id))
+        else:
+            batch.append(player)
+            if len(batch) >= batch_size:
+                await flush()
+    
+    await flush()
+    return count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrer players.json vers SQLite")
+    parser.add_argument('json_path', nargs='?', default='players.json')
+    parser.add_argument('db_path', nargs='?', default='naruto_game.db')
+    parser.add_argument('--batch', type=int, default=500, help="Joueurs par transaction")
+    args = parser.parse_args()
+    
+    # Bot arrêté: pas de ligne player_changes par joueur importé (relancé en
+    # cluster, chaque processus recrée les triggers au démarrage)
+    db = DatabaseManager(args.db_path, track_changes=False)
+    try:
+        count = await migrate_json_to_sqlite(args.json_path, db, args.batch)
+    finally:
+        await db.close()
+    print(f"✅ {count} joueurs migrés vers {args.db_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de verrous entre processus
+    fcntl = None
+
+
+class FileStripeLocks:
+    """Verrous entre processus: un octet d'un fichier partagé par groupe de joueurs
+    
+    Chaque joueur tombe dans l'une des `stripes` plages d'un fichier de
+    verrous (fcntl.lockf). Les verrous POSIX appartiennent au processus:
+    un compteur par plage garde le verrou tant qu'au moins une tâche du
+    processus l'utilise. L'attente se fait sans bloquer la boucle, par
+    essais successifs.
+    """
+    
+    def __init__(self, path: str, stripes: int = 4096):
+        if fcntl is None:
+            raise RuntimeError("Les verrous entre processus demandent fcntl (Linux, macOS)")
+        self.path = path
+        self.stripes = stripes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._holders: Dict[int, int] = {}
+        self._acquiring: Dict[int, asyncio.Future] = {}
+    
+    def stripe(self, user_id: int) -> int:
+        return int(user_id) % self.stripes
+    
+    async def acquire(self, user_id: int):
+        stripe = self.stripe(user_id)
+        while True:
+            if self._holders.get(stripe):
+                self._holders[stripe] += 1
+                return
+            pending = self._acquiring.get(stripe)
+            if pending is None:
+                break
+            # Une autre tâche du processus attend déjà cette plage
+            await asyncio.shield(pending)
+        
+        self._acquiring[stripe] = asyncio.get_running_loop().create_future()
+        try:
+            delay = 0.001
+            while True:
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, stripe)
+                    break
+                except (BlockingIOError, PermissionError):
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.05)
+            self._holders[stripe] = 1
+        finally:
+            self._acquiring.pop(stripe).set_result(None)
+    
+    def release(self, user_id: int):
+        stripe = self.stripe(user_id)
+        remaining = self._holders[stripe] - 1
+        if remaining:
+            self._holders[stripe] = remaining
+        else:
+            del self._holders[stripe]
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+    
+    def close(self):
+        os.close(self._fd)
+
+
+class PlayerLocks:
+    """Un verrou asyncio par joueur
+    
+    Les commandes d'un même joueur sont exécutées l'une après l'autre
+    (lecture → modification → écriture sans perte), celles de joueurs
+    différents restent parallèles. Les verrous sont créés à la demande et
+    supprimés dès que plus personne ne les utilise.
+    """
+    
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}  # Tâches qui tiennent ou attendent chaque verrou
+        self.shared: Optional[FileStripeLocks] = None
+    
+    def share_between_processes(self, path: str, stripes: int = 4096):
+        """Prendre aussi un verrou de fichier: plusieurs processus servent les mêmes joueurs"""
+        self.shared = FileStripeLocks(path, stripes)
+    
+    def __len__(self) -> int:
+        return len(self._locks)
+    
+    @asynccontextmanager
+    async def hold(self, user_id):
+        key = int(user_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                if self.shared is None:
+                    yield
+                else:
+                    await self.shared.acquire(key)
+                    try:
+                        yield
+                    finally:
+                        self.shared.release(key)
+        finally:
+            remaining = self._users[key] - 1
+            if remaining:
+                self._users[key] = remaining
+            else:
+                del self._users[key]
+                del self._locks[key]
+
+
+# Instance partagée par main.py et les cogs
+player_locks = PlayerLocks()
+
+
+def player_lock(callback):
+    """Décorateur de commande: exécuter la commande sous le verrou de son auteur"""
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        # Commande de cog: (self, ctx, ...), commande du bot: (ctx, ...)
+        ctx = args[0] if hasattr(args[0], 'author') else args[1]
+        async with player_locks.hold(ctx.author.id):
+            return await callback(*args, **kwargs)
+    return wrapper
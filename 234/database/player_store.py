@@ -0,0 +1,189 @@
+import asyncio
+import dataclasses
+import gc
+import os
+from typing import Optional, Dict, Any, Set, List, Tuple, Callable
+
+from database.json_db import AsyncDatabase
+from database.records import Player, TIMER_FIELDS
+
+
+class PlayerStore:
+    """Cache mémoire des joueurs avec écriture différée sur disque
+    
+    Expose la même API asynchrone que DatabaseManager (get_player,
+    create_player, update_player) pour servir de backend JSON aux commandes.
+    Les joueurs sont gardés en Player (slots) et ne sont jamais modifiés en
+    place: update_player remplace l'entrée par une nouvelle fiche, ce qui
+    permet de sérialiser une copie superficielle de self.players sur le
+    thread de stockage pendant que les commandes continuent.
+    
+    Les écouteurs (add_listener) reçoivent (user_id, champs écrits) après
+    chaque écriture, None pour une suppression.
+    """
+    
+    def __init__(self, database: AsyncDatabase, flush_interval: float = 30.0):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.players: Dict[str, Player] = {}
+        self.dirty: Set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[int, Optional[Dict[str, Any]]], None]] = []
+    
+    def add_listener(self, callback: Callable[[int, Optional[Dict[str, Any]]], None]):
+        self._listeners.append(callback)
+    
+    def _notify(self, user_id: int, fields: Optional[Dict[str, Any]]):
+        for callback in self._listeners:
+            callback(int(user_id), fields)
+    
+    async def load(self):
+        """Charger tous les joueurs une seule fois (au démarrage)"""
+        # Sans GC pendant le chargement: les collectes complètes sur des
+        # millions d'objets neufs bloquent la boucle autant qu'un json.load
+        gc.disable()
+        try:
+            # Les anciens formats sont convertis pendant la lecture
+            self.players = await self.database.load_players()
+        finally:
+            gc.enable()
+        # Les joueurs chargés vivent aussi longtemps que le bot: les sortir du GC
+        gc.freeze()
+        self.dirty.clear()
+    
+    def get(self, user_id) -> Optional[Player]:
+        return self.players.get(str(user_id))
+    
+    def __contains__(self, user_id) -> bool:
+        return str(user_id) in self.players
+    
+    def __len__(self) -> int:
+        return len(self.players)
+    
+    def add(self, user_id, player: Player):
+        self.players[str(user_id)] = player
+        self.mark_dirty(user_id)
+    
+    def mark_dirty(self, user_id):
+        """Signaler qu'un joueur a été modifié et doit être sauvegardé"""
+        self.dirty.add(str(user_id))
+    
+    async def flush(self):
+        """Écrire les modifications en attente sur le disque"""
+        async with self._flush_lock:
+            if not self.dirty:
+                return
+            dirty, self.dirty = self.dirty, set()
+            try:
+                if self.database.journaled:
+                    # Seuls les joueurs modifiés sont écrits: coût proportionnel au changement
+                    await self.database.append_changes({user_id: self.players.get(user_id) for user_id in dirty})
+                else:
+                    await self.database.save_players(dict(self.players))
+            except BaseException:
+                self.dirty |= dirty
+                raise
+            
+            if self.database.needs_compaction():
+                await self._compact()
+    
+    async def compact(self):
+        """Réécrire un snapshot complet et repartir d'un journal vide"""
+        async with self._flush_lock:
+            await self._compact()
+    
+    async def _compact(self):
+        dirty, self.dirty = self.dirty, set()
+        try:
+            await self.database.save_players(dict(self.players))
+        except BaseException:
+            self.dirty |= dirty
+            raise
+    
+    @property
+    def load_report(self) -> Dict[str, Any]:
+        """Détail du dernier chargement (voir Database.load_players)"""
+        return self.database.database.load_report
+    
+    async def init_db(self):
+        await self.load()
+        await self.start()
+    
+    async def get_player(self, user_id: int) -> Optional[Dict[str, Any]]:
+        player = self.players.get(str(user_id))
+        return player.to_dict() if player is not None else None
+    
+    async def create_player(self, user_id: int, name: str, village: str, clan: str = None, **fields):
+        player = Player(int(user_id), name, village, clan, **fields)
+        self.add(user_id, player)
+        self._notify(user_id, player.to_dict())
+    
+    async def update_player(self, user_id: int, **kwargs):
+        key = str(user_id)
+        player = self.players.get(key)
+        if player is None:
+            return
+        self.players[key] = dataclasses.replace(player, **kwargs)
+        self.mark_dirty(key)
+        self._notify(user_id, kwargs)
+    
+    async def delete_player(self, user_id: int):
+        if self.players.pop(str(user_id), None) is not None:
+            self.mark_dirty(user_id)
+            self._notify(user_id, None)
+    
+    async def ranking_rows(self) -> List[Tuple[int, str, int, int, int]]:
+        """(user_id, village, level, exp, ryo) de tous les joueurs, pour les classements"""
+        return [(p.user_id, p.village, p.level, p.exp, p.ryo) for p in self.players.values()]
+    
+    async def player_names(self, user_ids: List[int]) -> Dict[int, str]:
+        """Noms d'un lot de joueurs (classements); les absents sont omis"""
+        players = (self.players.get(str(user_id)) for user_id in user_ids)
+        return {player.user_id: player.name for player in players if player is not None}
+    
+    async def pending_timers(self, kind: str) -> List[Tuple[int, float]]:
+        """(user_id, échéance) des minuteurs en attente d'un type"""
+        # Parcours des fiches en mémoire, une seule fois au démarrage
+        column = TIMER_FIELDS[kind]
+        timers = ((p.user_id, getattr(p, column)) for p in self.players.values())
+        return [(user_id, due) for user_id, due in timers if due]
+    
+    async def backup_files(self, staging: str, max_rate: Optional[float] = None) -> Dict[str, Tuple[str, str]]:
+        """Écrire les modifications en attente puis copier snapshot et journal (database.backup)
+        
+        Le snapshot est lié plutôt que copié: `max_rate` ne sert qu'à SQLite.
+        """
+        if os.path.exists(self.database.database.players_file):
+            await self.flush()
+        else:
+            # Journal sans snapshot (premier démarrage): écrire un snapshot complet
+            await self.compact()
+        return await self.database.backup_files(staging)
+    
+    async def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Les joueurs non écrits restent en attente: la prochaine tentative les reprend
+                print(f"❌ Sauvegarde des joueurs échouée: {e!r}")
+    
+    async def close(self):
+        """Arrêter la sauvegarde périodique et tout écrire une dernière fois"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self.database.journaled and self.database.journal_size:
+            await self.compact()
+        self.database.close()
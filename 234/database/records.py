@@ -0,0 +1,237 @@
+import sys
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Union
+
+from game.items import stacks_from_list
+from game.missions import MISSION_CATALOG
+
+# Version du format des snapshots JSON:
+#   0: joueurs de l'ancien main.py (clan et mission copiés en entier dans la fiche)
+#   1: dicts au format de la table players
+#   2: {"version", "fields", "players": {id: [valeurs dans l'ordre de fields]}}
+#   3: comme 2, l'inventaire est en piles {identifiant d'objet: nombre}
+SNAPSHOT_VERSION = 3
+
+# Champs stockés en JSON dans SQLite
+JSON_FIELDS = ('inventory',)
+
+# Champs rangés dans leur propre table SQLite, une ligne par stat ou par jutsu
+# (player_stats, player_jutsu): filtrables et agrégeables en SQL
+TABLE_FIELDS = ('stats', 'jutsu_list')
+
+# Chaînes qui se répètent d'un joueur à l'autre
+SHARED_FIELDS = ('village', 'clan', 'rank', 'current_mission')
+
+
+def default_stats() -> Dict[str, int]:
+    return {
+        "ninjutsu": 10,
+        "genjutsu": 10,
+        "taijutsu": 10,
+        "speed": 10,
+        "strength": 10,
+        "intelligence": 10
+    }
+
+
+def default_jutsu() -> List[str]:
+    return ["Clone no Jutsu", "Kawarimi no Jutsu"]
+
+
+@dataclass(slots=True)
+class Player:
+    """Fiche joueur compacte: le clan et la mission sont des identifiants
+    
+    `clan` est un nom de clan (game.clans.CLANS_BY_NAME) et
+    `current_mission` un identifiant de mission (game.missions.MISSIONS_BY_ID):
+    leur description n'est plus recopiée dans chaque fiche.
+    """
+    user_id: int
+    name: str
+    village: str
+    clan: Optional[str] = None
+    level: int = 1
+    exp: int = 0
+    chakra: int = 100
+    health: int = 100
+    stamina: int = 100
+    stats: Dict[str, int] = field(default_factory=default_stats)
+    jutsu_list: List[str] = field(default_factory=default_jutsu)
+    ryo: int = 500
+    last_daily: Optional[str] = None
+    max_health: int = 100
+    max_chakra: int = 100
+    rank: Optional[str] = "Étudiant de l'Académie"
+    clan_rerolls: int = 3
+    current_mission: Optional[str] = None
+    inventory: Dict[str, int] = field(default_factory=dict)
+    # Échéances (time.time()) des minuteurs, voir utils.scheduler:
+    # fin de la mission en cours, et prochaine récompense quotidienne
+    # (0: disponible et joueur déjà prévenu)
+    mission_ends_at: Optional[float] = None
+    daily_ready_at: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in PLAYER_FIELDS}
+    
+    def to_row(self) -> List[Any]:
+        return [getattr(self, name) for name in PLAYER_FIELDS]
+    
+    @classmethod
+    def from_row(cls, row: List[Any], columns=None) -> 'Player':
+        if columns is None or tuple(columns) == PLAYER_FIELDS:
+            return cls(*row)
+        # Snapshot écrit avec une autre liste de champs: associer par nom
+        return cls(**{name: value for name, value in zip(columns, row) if name in PLAYER_FIELD_SET})
+
+
+# Colonnes de la table players, dans l'ordre du schéma
+PLAYER_FIELDS = tuple(f.name for f in fields(Player))
+PLAYER_FIELD_SET = frozenset(PLAYER_FIELDS)
+
+# Minuteurs reconstruits au démarrage: type → champ de l'échéance
+# (un minuteur est en attente quand le champ est > 0)
+TIMER_FIELDS = {
+    'mission': 'mission_ends_at',
+    'daily': 'daily_ready_at',
+}
+
+
+def new_player_record(user_id: int, name: str, village: str, clan: str = None, **fields) -> Dict[str, Any]:
+    """Construire un joueur avec les valeurs par défaut du schéma"""
+    return Player(int(user_id), name, village, clan, **fields).to_dict()
+
+
+def mission_id(mission) -> Optional[str]:
+    """Identifiant d'une mission stockée en entier par les anciennes versions"""
+    if mission is None or isinstance(mission, str):
+        return mission
+    found = MISSION_CATALOG.find(mission.get('name') or '')
+    return found.id if found is not None else None
+
+
+def is_legacy(data: Dict[str, Any]) -> bool:
+    """Les anciens joueurs de main.py utilisent 'username' et 'experience'"""
+    return 'username' in data or 'experience' in data
+
+
+def from_legacy(data: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Convertir un joueur de l'ancien players.json vers le schéma de la table players"""
+    clan = data.get('clan')
+    return new_player_record(
+        int(data.get('user_id') or user_id),
+        data.get('username'),
+        data.get('village'),
+        clan['name'] if isinstance(clan, dict) else clan,
+        level=data.get('level', 1),
+        exp=data.get('experience', 0),
+        chakra=data.get('chakra', 100),
+        health=data.get('health', 100),
+        stats=data.get('stats') or {},
+        jutsu_list=data.get('jutsu') or [],
+        ryo=data.get('ryo', 1000),
+        max_health=data.get('max_health', 100),
+        max_chakra=data.get('max_chakra', 100),
+        rank=data.get('rank'),
+        clan_rerolls=data.get('clan_rerolls', 0),
+        current_mission=mission_id(data.get('last_mission')),
+        inventory=data.get('inventory') or {},
+    )
+
+
+def upgrade_record(data: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Mettre un joueur des formats 0 et 1 au format de la table players"""
+    if is_legacy(data):
+        return from_legacy(data, user_id)
+    if isinstance(data.get('current_mission'), dict):
+        return {**data, 'current_mission': mission_id(data['current_mission'])}
+    return data
+
+
+# Jeux de stats déjà vus, partagés entre joueurs. Ils sont en lecture seule
+# (MappingProxyType): player['stats'][stat] += 1 lève une TypeError au lieu
+# de changer les stats de tous les joueurs qui partagent le même jeu. Pour
+# modifier des stats, copier (dict(...)) et passer la copie à update_player.
+_SHARED_STATS: Dict[tuple, Mapping[str, int]] = {}
+_SHARED_STATS_MAX = 4096
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _shared_stats(stats: Mapping[str, int]) -> Mapping[str, int]:
+    key = tuple(stats.items())
+    shared = _SHARED_STATS.get(key)
+    if shared is None:
+        shared = MappingProxyType({_intern(stat): value for stat, value in key})
+        if len(_SHARED_STATS) < _SHARED_STATS_MAX:
+            _SHARED_STATS[key] = shared
+    return shared
+
+
+def share_strings(player: Player) -> Player:
+    """Faire pointer les valeurs répétées (village, clan, rang, jutsu, stats)
+    vers une seule copie en mémoire
+    
+    Chaque fiche est décodée séparément: sans cela, chaque joueur chargé
+    garde ses propres copies de "Konoha" ou de "ninjutsu". Convertit aussi
+    l'ancien inventaire en piles.
+    """
+    for name in SHARED_FIELDS:
+        setattr(player, name, _intern(getattr(player, name)))
+    if player.stats:
+        player.stats = _shared_stats(player.stats)
+    if player.jutsu_list:
+        player.jutsu_list = [_intern(jutsu) for jutsu in player.jutsu_list]
+    if isinstance(player.inventory, list):
+        # Versions 0 à 2: liste de noms d'objets
+        player.inventory = stacks_from_list(player.inventory)
+    if player.inventory:
+        player.inventory = {_intern(item): count for item, count in player.inventory.items()}
+    return player
+
+
+def share_column(name: str, values: List[Any]) -> List[Any]:
+    """share_strings appliqué à toute une colonne de joueurs (snapshot binaire)"""
+    if name in SHARED_FIELDS:
+        return list(map(_intern, values))
+    if name == 'stats':
+        return [_shared_stats(stats) if stats else stats for stats in values]
+    return values
+
+
+def plain_value(value: Any) -> Dict[str, Any]:
+    """json.dumps(default=...): les stats partagées sont écrites comme un dict"""
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def plain_column(name: str, values: List[Any]) -> List[Any]:
+    """Inverse de share_column avant marshal.dumps, qui refuse les MappingProxyType
+    
+    Une seule copie par jeu de stats partagé: marshal l'écrit une fois et
+    share_column le partage de nouveau à la relecture.
+    """
+    if name != 'stats':
+        return values
+    copies: Dict[int, Dict[str, int]] = {}
+    plain = []
+    for stats in values:
+        if isinstance(stats, MappingProxyType):
+            copy = copies.get(id(stats))
+            if copy is None:
+                copy = copies[id(stats)] = dict(stats)
+            stats = copy
+        plain.append(stats)
+    return plain
+
+
+def decode_player(data: Union[List[Any], Dict[str, Any]], user_id: Optional[str] = None,
+                  columns=None) -> Player:
+    """Lire une fiche de n'importe quelle version de snapshot ou de journal"""
+    if isinstance(data, list):
+        return share_strings(Player.from_row(data, columns))
+    return share_strings(Player(**upgrade_record(data, user_id)))
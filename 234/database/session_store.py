@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+class SessionStore:
+    """Petit fichier JSON des sessions interactives en cours (inscriptions)
+    
+    Les sessions sont peu nombreuses et courtes: le fichier est réécrit en
+    entier (fichier temporaire + replace) au plus toutes les
+    `flush_interval` secondes quand une session a changé, puis une dernière
+    fois à l'arrêt. Un redémarrage reprend les sessions là où elles étaient.
+    """
+    
+    def __init__(self, path: str, flush_interval: float = 2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+    
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.sessions = json.load(f)
+        except FileNotFoundError:
+            self.sessions = {}
+        except ValueError as e:
+            print(f"⚠️ Sessions illisibles dans {self.path}, ignorées: {e}")
+            self.sessions = {}
+        return self.sessions
+    
+    def put(self, key: str, state: Dict[str, Any]):
+        self.sessions[key] = state
+        self._dirty = True
+    
+    def delete(self, key: str):
+        if self.sessions.pop(key, None) is not None:
+            self._dirty = True
+    
+    def flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        tmp_file = self.path + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.sessions, f, ensure_ascii=False)
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            self._dirty = True
+            print(f"⚠️ Impossible d'écrire les sessions dans {self.path}: {e}")
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
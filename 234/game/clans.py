@@ -0,0 +1,105 @@
+import random
+
+
+class Clan:
+    def __init__(self, name, description, stat_bonus, special_jutsu, rarity="commun"):
+        self.name = name
+        self.description = description
+        self.stat_bonus = stat_bonus  # Dict des bonus de stats
+        self.special_jutsu = special_jutsu
+        self.rarity = rarity
+
+# Clans disponibles
+CLANS = [
+    # Clans légendaires (rares)
+    Clan("Uchiha", "Clan du Sharingan", {"ninjutsu": 15, "intelligence": 10}, ["Katon: Goukakyuu no Jutsu", "Sharingan"], "légendaire"),
+    Clan("Hyuga", "Clan du Byakugan", {"taijutsu": 15, "vitesse": 10}, ["Juken", "Byakugan"], "légendaire"),
+    Clan("Senju", "Clan de la Volonté du Feu", {"force": 15, "ninjutsu": 10}, ["Mokuton: Jukai Kotan"], "légendaire"),
+    
+    # Clans rares
+    Clan("Nara", "Clan des ombres", {"intelligence": 20, "genjutsu": 5}, ["Kagemane no Jutsu"], "rare"),
+    Clan("Akimichi", "Clan de l'expansion", {"force": 20, "taijutsu": 5}, ["Baika no Jutsu"], "rare"),
+    Clan("Yamanaka", "Clan de l'esprit", {"intelligence": 15, "genjutsu": 10}, ["Shintenshin no Jutsu"], "rare"),
+    Clan("Inuzuka", "Clan des chiens", {"vitesse": 15, "taijutsu": 10}, ["Gatsuga"], "rare"),
+    Clan("Aburame", "Clan des insectes", {"intelligence": 15, "ninjutsu": 10}, ["Kikaichū no Jutsu"], "rare"),
+    
+    # Clans communs
+    Clan("Sarutobi", "Clan du Hokage", {"ninjutsu": 10, "intelligence": 5}, ["Katon: Endan"], "commun"),
+    Clan("Hatake", "Clan du chien argenté", {"vitesse": 10, "taijutsu": 5}, ["Chidori"], "commun"),
+    Clan("Shimura", "Clan de la racine", {"intelligence": 8, "ninjutsu": 7}, ["Futon: Shinkuugyoku"], "commun"),
+    Clan("Mitarashi", "Clan du serpent", {"vitesse": 8, "genjutsu": 7}, ["Sen'eijashu"], "commun"),
+    Clan("Morino", "Clan de l'interrogation", {"intelligence": 10, "genjutsu": 5}, ["Kanashibari no Jutsu"], "commun"),
+    
+    # Clan sans bloodline
+    Clan("Sans Clan", "Ninja civil", {}, [], "commun"),
+]
+
+# Poids de chaque clan selon sa rareté
+RARITY_WEIGHTS = {
+    "légendaire": 5,
+    "rare": 15,
+    "commun": 80,
+}
+
+# Économie de !reroll_clan
+FREE_REROLLS = 3
+REROLL_COST = 500
+
+class ClanSampler:
+    """Tirage pondéré des clans en O(1) (méthode des alias de Vose)
+    
+    Les tables sont construites une seule fois. Chaque case i contient le
+    clan i avec la probabilité prob[i], sinon le clan alias[i]: un tirage
+    coûte un seul nombre aléatoire, quel que soit le nombre de clans.
+    prob et alias sont publics pour les tirages vectorisés (tools/gacha_sim.py).
+    """
+    
+    def __init__(self, clans, weights):
+        self.clans = list(clans)
+        total = sum(weights)
+        self.probabilities = [weight / total for weight in weights]
+        
+        size = len(self.clans)
+        scaled = [p * size for p in self.probabilities]
+        self.prob = [1.0] * size
+        self.alias = list(range(size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.prob[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Les cases restantes valent 1 aux erreurs d'arrondi près
+    
+    def draw_index(self, rand=random.random):
+        u = rand() * len(self.prob)
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+    
+    def draw(self, rand=random.random):
+        return self.clans[self.draw_index(rand)]
+    
+    def draws(self, count, rand=random.random):
+        """Tirer plusieurs clans d'un coup"""
+        clans, prob, alias, size = self.clans, self.prob, self.alias, len(self.prob)
+        result = []
+        for _ in range(count):
+            u = rand() * size
+            i = int(u)
+            result.append(clans[i] if u - i < prob[i] else clans[alias[i]])
+        return result
+    
+    def rarity_probability(self, rarity):
+        return sum(p for clan, p in zip(self.clans, self.probabilities) if clan.rarity == rarity)
+
+CLAN_SAMPLER = ClanSampler(CLANS, [RARITY_WEIGHTS.get(clan.rarity, RARITY_WEIGHTS["commun"]) for clan in CLANS])
+
+def get_random_clan():
+    """Obtenir un clan aléatoire selon les probabilités de rareté"""
+    return CLAN_SAMPLER.draw()
+
+# Le nom du clan sert d'identifiant dans les fiches joueurs
+CLANS_BY_NAME = {clan.name: clan for clan in CLANS}
+
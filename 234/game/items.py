@@ -0,0 +1,108 @@
+import random
+
+from game.progression import grant_xp
+from game.text import fold
+
+# Achat maximum en une commande (!acheter 10 potion de soin)
+MAX_QUANTITY = 99
+
+# Jutsu que peut apprendre un scroll de jutsu
+SCROLL_JUTSU = ["Katon: Goukakyuu", "Suiton: Mizurappa", "Doton: Doryuuheki", "Fuuton: Daitoppa", "Raiton: Chidori"]
+
+class Item:
+    def __init__(self, id, name, price, effect, amount, description, article="un"):
+        self.id = id  # Identifiant stable, clé des piles de l'inventaire
+        self.name = name
+        self.price = price
+        self.effect = effect  # Nom du gestionnaire dans ItemRegistry.effects
+        self.amount = amount
+        self.description = description
+        self.article = article
+    
+    def label(self, quantity=1):
+        return f"{self.article} **{self.name}**" if quantity == 1 else f"**{quantity} × {self.name}**"
+
+# Objets de la boutique
+ITEMS = [
+    Item("potion_soin", "Potion de soin", 50, "heal", 50, "Restaure 50 PV", "une"),
+    Item("potion_chakra", "Potion de chakra", 50, "chakra", 50, "Restaure 50 Chakra", "une"),
+    Item("elixir_sagesse", "Élixir de sagesse", 100, "xp", 10, "Donne 10 XP"),
+    Item("scroll_jutsu", "Scroll de jutsu", 150, "jutsu", 1, "Apprend un jutsu aléatoire"),
+]
+
+class ItemRegistry:
+    """Catalogue des objets et table des effets
+    
+    Un effet est une fonction (joueur, objet, quantité) -> (champs modifiés,
+    message): toute la quantité achetée est appliquée en une seule fois,
+    avec le même résultat que `quantité` achats successifs.
+    """
+    
+    def __init__(self, items):
+        self.items = tuple(items)
+        self.by_id = {item.id: item for item in self.items}
+        self.by_name = {fold(item.name): item for item in self.items}
+        self.effects = {}
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def find(self, name):
+        """Objet par nom (sans casse ni accents) ou par identifiant"""
+        return self.by_name.get(fold(name)) or self.by_id.get(name)
+    
+    def register_effect(self, name):
+        def decorator(handler):
+            self.effects[name] = handler
+            return handler
+        return decorator
+    
+    def apply(self, player, item, quantity=1):
+        return self.effects[item.effect](player, item, quantity)
+
+ITEM_REGISTRY = ItemRegistry(ITEMS)
+
+@ITEM_REGISTRY.register_effect("heal")
+def heal_effect(player, item, quantity):
+    health = min(player['max_health'], player['health'] + item.amount * quantity)
+    return {'health': health}, f"Vos PV sont maintenant à {health}/{player['max_health']}."
+
+@ITEM_REGISTRY.register_effect("chakra")
+def chakra_effect(player, item, quantity):
+    chakra = min(player['max_chakra'], player['chakra'] + item.amount * quantity)
+    return {'chakra': chakra}, f"Votre Chakra est maintenant à {chakra}/{player['max_chakra']}."
+
+@ITEM_REGISTRY.register_effect("xp")
+def xp_effect(player, item, quantity):
+    amount = item.amount * quantity
+    gain = grant_xp(player, amount)
+    message = f"Vous avez gagné {amount} XP."
+    if gain.leveled_up:
+        message += f" 🎉 Vous êtes maintenant niveau {gain.level}!"
+    return gain.fields(), message
+
+@ITEM_REGISTRY.register_effect("jutsu")
+def jutsu_effect(player, item, quantity):
+    jutsu_list = player['jutsu_list']
+    learned = []
+    for _ in range(item.amount * quantity):
+        new_jutsu = random.choice(SCROLL_JUTSU)
+        if new_jutsu not in jutsu_list:
+            jutsu_list = jutsu_list + [new_jutsu]
+            learned.append(new_jutsu)
+    if not learned:
+        return {}, "Vous connaissiez déjà le jutsu!"
+    return {'jutsu_list': jutsu_list}, f"Vous avez appris: **{', '.join(learned)}**!"
+
+def stacks_from_list(items):
+    """Convertir l'ancien inventaire (liste de noms) en piles {identifiant: nombre}
+    
+    Seules les migrations écrivent l'inventaire: les achats appliquent leur
+    effet tout de suite, aucune commande ne range d'objet.
+    """
+    stacks = {}
+    for name in items:
+        item = ITEM_REGISTRY.find(name)
+        key = item.id if item is not None else name
+        stacks[key] = stacks.get(key, 0) + 1
+    return stacks
@@ -0,0 +1,212 @@
+from bisect import bisect_left, insort
+
+from game.progression import total_xp_for_level
+
+# Classements disponibles: nom → (titre, clé de tri d'un joueur)
+# Les clés sont croissantes: le meilleur joueur a la plus petite.
+METRICS = {
+    'niveau': ("Niveau", lambda uid, level, exp, ryo: (-level, -exp, uid)),
+    'ryo': ("Ryō", lambda uid, level, exp, ryo: (-ryo, uid)),
+    'xp': ("Expérience", lambda uid, level, exp, ryo: (-(total_xp_for_level(level) + exp), uid)),
+}
+
+# Champs du joueur qui influencent un classement
+RANKED_FIELDS = frozenset(('village', 'level', 'exp', 'ryo'))
+
+class RankIndex:
+    """Liste triée découpée en blocs, avec rang en O(log n)
+    
+    Les clés sont rangées dans des blocs triés d'au plus 2 * LOAD éléments.
+    Un arbre de Fenwick sur la taille des blocs donne le nombre de clés
+    avant un bloc: rank() = recherche du bloc + somme préfixe + bisect dans
+    le bloc. Insérer ou retirer ne déplace que les éléments d'un bloc.
+    """
+    
+    LOAD = 512
+    
+    def __init__(self, keys=()):
+        self._build(sorted(keys))
+    
+    def _build(self, keys):
+        self._chunks = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(keys)
+        self._rebuild_tree()
+    
+    def _rebuild_tree(self):
+        size = len(self._chunks)
+        tree = [0] * (size + 1)
+        for i, chunk in enumerate(self._chunks, start=1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+    
+    def _add(self, pos, delta):
+        i = pos + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+    
+    def _before(self, pos):
+        """Nombre de clés dans les blocs [0, pos)"""
+        total = 0
+        while pos > 0:
+            total += self._tree[pos]
+            pos -= pos & -pos
+        return total
+    
+    def __len__(self):
+        return self._len
+    
+    def insert(self, key):
+        if not self._chunks:
+            self._build([key])
+            return
+        pos = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        chunk = self._chunks[pos]
+        insort(chunk, key)
+        self._maxes[pos] = chunk[-1]
+        self._len += 1
+        if len(chunk) > 2 * self.LOAD:
+            self._chunks[pos:pos + 1] = [chunk[:self.LOAD], chunk[self.LOAD:]]
+            self._maxes[pos:pos + 1] = [chunk[self.LOAD - 1], chunk[-1]]
+            self._rebuild_tree()
+        else:
+            self._add(pos, 1)
+    
+    def remove(self, key):
+        pos = bisect_left(self._maxes, key)
+        chunk = self._chunks[pos] if pos < len(self._chunks) else []
+        i = bisect_left(chunk, key)
+        if i == len(chunk) or chunk[i] != key:
+            raise KeyError(key)
+        del chunk[i]
+        self._len -= 1
+        if chunk:
+            self._maxes[pos] = chunk[-1]
+            self._add(pos, -1)
+        else:
+            del self._chunks[pos]
+            del self._maxes[pos]
+            self._rebuild_tree()
+    
+    def rank(self, key):
+        """Nombre de clés strictement avant `key` (0 pour la première)"""
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return self._len
+        return self._before(pos) + bisect_left(self._chunks[pos], key)
+    
+    def top(self, count):
+        result = []
+        for chunk in self._chunks:
+            result.extend(chunk[:count - len(result)])
+            if len(result) >= count:
+                break
+        return result
+
+class Leaderboards:
+    """Classements par niveau, Ryō et XP, globaux et par village
+    
+    Reconstruits en bloc depuis le stockage au démarrage (rebuild), puis
+    tenus à jour à chaque écriture d'un champ classé (observe, branché sur
+    le stockage avec add_listener).
+    """
+    
+    def __init__(self):
+        self._players = {}  # user_id → (village, level, exp, ryo)
+        self._global = {metric: RankIndex() for metric in METRICS}
+        self._villages = {}
+    
+    def __len__(self):
+        return len(self._players)
+    
+    def _boards(self, village):
+        boards = self._villages.get(village)
+        if boards is None:
+            boards = self._villages[village] = {metric: RankIndex() for metric in METRICS}
+        return boards
+    
+    def rebuild(self, rows):
+        """Reconstruire tous les classements depuis (user_id, village, level, exp, ryo)"""
+        players = self._players = {int(uid): (village, level or 1, exp or 0, ryo or 0)
+                                   for uid, village, level, exp, ryo in rows}
+        self._global = {}
+        self._villages = {}
+        for metric, (_, key) in METRICS.items():
+            ranked = sorted(key(uid, *entry[1:]) for uid, entry in players.items())
+            self._global[metric] = RankIndex(ranked)
+            # Les classements de village sont des sous-suites déjà triées du global
+            by_village = {}
+            for player_key in ranked:
+                by_village.setdefault(players[player_key[-1]][0], []).append(player_key)
+            for village, keys in by_village.items():
+                self._boards(village)[metric] = RankIndex(keys)
+    
+    def _move(self, uid, old, new):
+        """Déplacer le joueur dans les classements où sa clé change"""
+        for metric, (_, key) in METRICS.items():
+            old_key = key(uid, *old[1:]) if old is not None else None
+            new_key = key(uid, *new[1:]) if new is not None else None
+            same_village = old is not None and new is not None and old[0] == new[0]
+            if old_key == new_key and same_village:
+                continue
+            if old_key is not None:
+                self._global[metric].remove(old_key)
+                self._villages[old[0]][metric].remove(old_key)
+            if new_key is not None:
+                self._global[metric].insert(new_key)
+                self._boards(new[0])[metric].insert(new_key)
+    
+    def observe(self, user_id, fields):
+        """Écouteur du stockage: champs écrits pour un joueur (None = supprimé)"""
+        uid = int(user_id)
+        old = self._players.get(uid)
+        if fields is None:
+            if old is not None:
+                self._move(uid, old, None)
+                del self._players[uid]
+            return
+        if RANKED_FIELDS.isdisjoint(fields):
+            return
+        
+        village, level, exp, ryo = old if old is not None else (None, 1, 0, 0)
+        new = (
+            fields.get('village', village),
+            fields.get('level', level),
+            fields.get('exp', exp),
+            fields.get('ryo', ryo),
+        )
+        if new == old:
+            return
+        self._move(uid, old, new)
+        self._players[uid] = new
+    
+    def _board(self, metric, village=None):
+        if village is None:
+            return self._global[metric]
+        boards = self._villages.get(village)
+        return boards[metric] if boards is not None else None
+    
+    def rank(self, metric, user_id, village=None):
+        """Position du joueur (1 = premier), None s'il n'est pas classé"""
+        uid = int(user_id)
+        entry = self._players.get(uid)
+        board = self._board(metric, village)
+        if entry is None or board is None or (village is not None and entry[0] != village):
+            return None
+        _, level, exp, ryo = entry
+        return board.rank(METRICS[metric][1](uid, level, exp, ryo)) + 1
+    
+    def size(self, metric, village=None):
+        board = self._board(metric, village)
+        return len(board) if board is not None else 0
+    
+    def top(self, metric, count=10, village=None):
+        """Meilleurs joueurs: [(user_id, village, level, exp, ryo)]"""
+        board = self._board(metric, village)
+        if board is None:
+            return []
+        return [(key[-1], *self._players[key[-1]]) for key in board.top(count)]
@@ -0,0 +1,144 @@
+import difflib
+from bisect import bisect_right
+
+from game.text import fold
+
+class Mission:
+    def __init__(self, id, name, rank, description, reward_exp, reward_ryo, required_level=1, duration=600):
+        self.id = id  # Identifiant stable, stocké dans la fiche du joueur
+        self.name = name
+        self.rank = rank
+        self.description = description
+        self.reward_exp = reward_exp
+        self.reward_ryo = reward_ryo
+        self.required_level = required_level
+        self.duration = duration  # Secondes avant la résolution automatique
+    
+    @property
+    def duration_text(self):
+        minutes = self.duration // 60
+        if minutes < 60:
+            return f"{minutes} min"
+        return f"{minutes // 60} h" + (f" {minutes % 60:02d}" if minutes % 60 else "")
+
+# Missions disponibles
+MISSIONS = [
+    # Rang D
+    Mission("chat_tora", "Retrouver Tora", "D", "Retrouver le chat fugueur de la femme du daimyo", 20, 100, 1, 5 * 60),
+    Mission("desherbage", "Désherbage", "D", "Désherber le potager d'un villageois", 15, 80, 1, 5 * 60),
+    
+    # Rang C
+    Mission("patrouille", "Patrouille à la frontière", "C", "Surveiller la frontière du village", 50, 250, 2, 20 * 60),
+    Mission("escorte_tazuna", "Escorte de Tazuna", "C", "Escorter un charpentier jusqu'au Pays des Vagues", 60, 300, 3, 30 * 60),
+    
+    # Rang B
+    Mission("parchemin_vole", "Le parchemin volé", "B", "Récupérer un parchemin interdit dérobé par des déserteurs", 120, 600, 5, 60 * 60),
+    
+    # Rang A
+    Mission("garde_daimyo", "Garde du daimyo", "A", "Protéger le daimyo pendant un voyage diplomatique", 250, 1200, 10, 2 * 60 * 60),
+    
+    # Rang S
+    Mission("traque_akatsuki", "Traque de l'Akatsuki", "S", "Affronter un membre de l'Akatsuki", 500, 3000, 20, 4 * 60 * 60),
+]
+
+class MissionCatalog:
+    """Missions indexées une fois pour toutes
+    
+    - by_id et by_name: identifiant et nom replié (fold) → mission
+    - un trie des débuts de mots: « tora » ou « retr » trouvent « Retrouver Tora »
+    - des paliers de required_level: available(niveau) est une recherche
+      dichotomique, sans parcourir le catalogue
+    Le catalogue est immuable: pour le modifier, en construire un nouveau.
+    """
+    
+    def __init__(self, missions):
+        self.missions = tuple(missions)
+        self.by_id = {mission.id: mission for mission in self.missions}
+        self.by_name = {fold(mission.name): mission for mission in self.missions}
+        
+        # Chaque nœud du trie: {caractère: nœud, None: missions sous ce préfixe}
+        self._trie = {None: []}
+        for mission in self.missions:
+            words = fold(mission.name).split()
+            for start in range(len(words)):
+                self._insert(" ".join(words[start:]), mission)
+        
+        # Paliers de niveau triés, et pour chacun les missions accessibles
+        self.by_level = {}
+        for mission in sorted(self.missions, key=lambda m: m.required_level):
+            self.by_level.setdefault(mission.required_level, []).append(mission)
+        self._levels = sorted(self.by_level)
+        self._available = []
+        unlocked = []
+        for level in self._levels:
+            unlocked += self.by_level[level]
+            self._available.append(tuple(unlocked))
+    
+    def _insert(self, key, mission):
+        node = self._trie
+        for char in key:
+            node = node.setdefault(char, {None: []})
+            if mission not in node[None]:
+                node[None].append(mission)
+    
+    def __iter__(self):
+        return iter(self.missions)
+    
+    def __len__(self):
+        return len(self.missions)
+    
+    def get(self, mission_id):
+        return self.by_id.get(mission_id)
+    
+    def find(self, name):
+        """Mission au nom exact, sans tenir compte de la casse ni des accents"""
+        return self.by_name.get(fold(name))
+    
+    def complete(self, prefix, limit=10):
+        """Missions dont un mot du nom commence par `prefix`"""
+        node = self._trie
+        for char in fold(prefix):
+            node = node.get(char)
+            if node is None:
+                return []
+        return node[None][:limit]
+    
+    def search(self, query):
+        """Nom exact, identifiant, préfixe sans ambiguïté, sinon nom approchant"""
+        mission = self.find(query) or self.by_id.get(query)
+        if mission is not None:
+            return mission
+        matches = self.complete(query, limit=2)
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            close = self.close_matches(query, limit=1)
+            if close:
+                return close[0]
+        return None
+    
+    def close_matches(self, query, limit=3, cutoff=0.75):
+        """Missions au nom proche (fautes de frappe); ne sert qu'en cas d'échec"""
+        names = difflib.get_close_matches(fold(query), self.by_name, n=limit, cutoff=cutoff)
+        return [self.by_name[name] for name in names]
+    
+    def suggest(self, query, limit=3):
+        return self.complete(query, limit) or self.close_matches(query, limit)
+    
+    def available(self, level):
+        """Missions accessibles à ce niveau (required_level <= level)"""
+        index = bisect_right(self._levels, level)
+        return self._available[index - 1] if index else ()
+    
+    def tier(self, level):
+        """Palier atteint à ce niveau: plus grand required_level <= level (None si aucun)"""
+        index = bisect_right(self._levels, level)
+        return self._levels[index - 1] if index else None
+    
+    def next_tier(self, level):
+        """Prochain palier à débloquer au-delà de ce niveau (None si tout est débloqué)"""
+        index = bisect_right(self._levels, level)
+        return self._levels[index] if index < len(self._levels) else None
+
+MISSION_CATALOG = MissionCatalog(MISSIONS)
+MISSIONS_BY_ID = MISSION_CATALOG.by_id
@@ -0,0 +1,132 @@
+import time
+
+# Villages proposés par !start (réaction → village) et leurs clans
+VILLAGE_EMOJIS = {
+    "🍃": "Konoha",
+    "💨": "Suna",
+    "💧": "Kiri",
+    "⚡": "Kumo",
+    "🗻": "Iwa",
+}
+
+VILLAGE_CLANS = {
+    "Konoha": ["Uchiha", "Hyuga", "Nara", "Akimichi", "Inuzuka"],
+    "Suna": ["Sabaku", "Pakura", "Chikamatsu"],
+    "Kiri": ["Hozuki", "Yuki", "Kaguya"],
+    "Kumo": ["Yotsuki", "Darui"],
+    "Iwa": ["Kamizuru", "Explosion Corps"],
+}
+
+# Délai de réponse à chaque étape (secondes)
+SESSION_TIMEOUT = 60.0
+
+# Étapes dans l'ordre: réaction sur le message du village, numéro du clan, nom
+STEPS = ('village', 'clan', 'name')
+
+# Type des minuteurs d'expiration (utils.scheduler)
+TIMER_KIND = 'onboarding'
+
+
+class OnboardingSession:
+    """Inscription en cours d'un joueur dans un salon"""
+    
+    __slots__ = ('channel_id', 'user_id', 'step', 'message_id', 'village', 'clan', 'expires_at')
+    
+    def __init__(self, channel_id, user_id, message_id=None, step='village', village=None, clan=None,
+                 expires_at=None):
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.message_id = message_id  # Message dont les réactions choisissent le village
+        self.step = step
+        self.village = village
+        self.clan = clan
+        self.expires_at = expires_at
+    
+    @property
+    def key(self):
+        return (self.channel_id, self.user_id)
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _store_key(key):
+    return f"{key[0]}:{key[1]}"
+
+
+class OnboardingSessions:
+    """Inscriptions en cours, indexées par (salon, joueur)
+    
+    Remplace les bot.wait_for enchaînés de !start: discord.py évalue le
+    check de chaque wait_for en attente à chaque message et réaction reçus,
+    soit O(inscriptions en cours) par évènement. Ici, un évènement est
+    routé vers sa session par une recherche dans un dict, chaque session
+    expire avec un minuteur du TimerScheduler du bot, et l'avancement est
+    gardé dans un SessionStore pour survivre à un redémarrage.
+    """
+    
+    def __init__(self, store, timers, timeout=SESSION_TIMEOUT):
+        self.store = store
+        self.timers = timers
+        self.timeout = timeout
+        self.sessions = {}
+        self.started = 0
+        self.completed = 0
+        self.expired = 0
+    
+    def __len__(self):
+        return len(self.sessions)
+    
+    def load(self):
+        """Reprendre les sessions sauvegardées et reprogrammer leur expiration"""
+        for state in self.store.load().values():
+            session = OnboardingSession(**state)
+            self.sessions[session.key] = session
+        self.timers.load(TIMER_KIND, ((key, session.expires_at) for key, session in self.sessions.items()))
+        return len(self.sessions)
+    
+    def get(self, channel_id, user_id):
+        return self.sessions.get((channel_id, user_id))
+    
+    def begin(self, channel_id, user_id, message_id):
+        session = OnboardingSession(channel_id, user_id, message_id)
+        self.sessions[session.key] = session
+        self.started += 1
+        self._touch(session)
+        return session
+    
+    def advance(self, session, step, **fields):
+        """Passer à l'étape suivante: le délai de réponse repart de zéro"""
+        session.step = step
+        for name, value in fields.items():
+            setattr(session, name, value)
+        self._touch(session)
+    
+    def _touch(self, session):
+        session.expires_at = time.time() + self.timeout
+        self.timers.schedule(TIMER_KIND, session.key, session.expires_at)
+        self.store.put(_store_key(session.key), session.to_dict())
+    
+    def end(self, session, completed=True):
+        if self.sessions.get(session.key) is session:
+            del self.sessions[session.key]
+            self.timers.cancel(TIMER_KIND, session.key)
+            self.store.delete(_store_key(session.key))
+            if completed:
+                self.completed += 1
+    
+    def pop_expired(self, keys):
+        """Sessions échues parmi `keys` (minuteurs), retirées du gestionnaire"""
+        now = time.time()
+        expired = []
+        for key in keys:
+            session = self.sessions.get(tuple(key))
+            if session is not None and session.expires_at <= now:
+                self.end(session, completed=False)
+                self.expired += 1
+                expired.append(session)
+        return expired
+    
+    def summary(self):
+        return (f"{len(self)} en cours, {self.started} commencées, "
+                f"{self.completed} terminées, {self.expired} expirées")
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from math import isqrt
+
+# Passer du niveau L au niveau L+1 demande L * XP_PER_LEVEL XP
+XP_PER_LEVEL = 100
+HEALTH_PER_LEVEL = 10
+CHAKRA_PER_LEVEL = 10
+
+def xp_to_next(level):
+    """XP à accumuler pendant le niveau `level` pour passer au suivant"""
+    return level * XP_PER_LEVEL
+
+def total_xp_for_level(level):
+    """XP cumulée depuis le niveau 1 pour atteindre `level`: 100 * L(L-1)/2"""
+    return XP_PER_LEVEL * level * (level - 1) // 2
+
+def level_for_total_xp(total):
+    """Plus grand niveau L tel que total_xp_for_level(L) <= total, en O(1)
+    
+    L(L-1) <= k avec k = total // 50  ⇔  (2L-1)² <= 4k+1
+    """
+    if total <= 0:
+        return 1
+    k = total // (XP_PER_LEVEL // 2)
+    return (isqrt(4 * k + 1) + 1) // 2
+
+@dataclass(frozen=True)
+class XpGain:
+    """Résultat d'un gain d'XP, prêt à être passé à update_player"""
+    old_level: int
+    level: int
+    exp: int
+    max_health: int
+    max_chakra: int
+    health: int
+    chakra: int
+    
+    @property
+    def levels_gained(self):
+        return self.level - self.old_level
+    
+    @property
+    def leveled_up(self):
+        return self.level > self.old_level
+    
+    def fields(self):
+        """Champs du joueur modifiés par le gain"""
+        if not self.leveled_up:
+            return {'exp': self.exp}
+        return {
+            'exp': self.exp,
+            'level': self.level,
+            'max_health': self.max_health,
+            'max_chakra': self.max_chakra,
+            'health': self.health,
+            'chakra': self.chakra,
+        }
+
+def grant_xp(player, amount):
+    """Ajouter de l'XP à un joueur et résoudre toutes ses montées de niveau d'un coup
+    
+    Équivalent à la boucle « tant que exp >= niveau * 100 » (PV et chakra
+    max +10 par niveau, PV et chakra restaurés en cas de montée), sans
+    itérer sur les niveaux gagnés. Le niveau ne baisse jamais.
+    """
+    old_level = player['level']
+    total = total_xp_for_level(old_level) + player['exp'] + amount
+    level = max(old_level, level_for_total_xp(total))
+    exp = total - total_xp_for_level(level)
+    
+    gained = level - old_level
+    if not gained:
+        return XpGain(old_level, level, exp, player['max_health'], player['max_chakra'],
+                      player['health'], player['chakra'])
+    
+    max_health = player['max_health'] + gained * HEALTH_PER_LEVEL
+    max_chakra = player['max_chakra'] + gained * CHAKRA_PER_LEVEL
+    return XpGain(old_level, level, exp, max_health, max_chakra, max_health, max_chakra)
@@ -0,0 +1,7 @@
+import re
+import unicodedata
+
+def fold(text):
+    """Forme de recherche d'un nom: sans casse, sans accents ni ponctuation"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return " ".join(re.findall(r"\w+", "".join(c for c in decomposed if not unicodedata.combining(c))))
@@ -1,11 +1,44 @@
+# Début du démarrage, pris avant les imports (rapport de démarrage)
+import time
+STARTED_AT = time.perf_counter()
+
 import discord
 from discord.ext import commands
 import json
 import asyncio
+import itertools
+import math
 import random
+import traceback
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+from database.backup import DEFAULT_MAX_RATE, HotBackup
+from database.json_db import Database, AsyncDatabase
+from database.player_store import PlayerStore
+from database.db_manager import DatabaseManager
+from database.player_locks import player_lock, player_locks
+from database.records import Player, TIMER_FIELDS
+from game.clans import CLANS, CLANS_BY_NAME, FREE_REROLLS, REROLL_COST, get_random_clan
+from game.leaderboards import Leaderboards, METRICS
+from game.items import ITEM_REGISTRY, MAX_QUANTITY
+from game.missions import MISSION_CATALOG, MISSIONS_BY_ID
+from game.progression import grant_xp, total_xp_for_level
+from utils.embed_cache import EmbedCache
+from utils.health import ShardHealth
+from utils.loop_monitor import LoopLagMonitor
+from utils.metrics import (
+    REGISTRY, COMMAND_LATENCY, COMMAND_ERRORS, STORAGE_LATENCY, STORAGE_BYTES,
+    DISCORD_SEND_LATENCY, LOOP_LAG, TextfileWriter
+)
+from utils.outbound import OutboundDispatcher
+from utils.rate_limit import Limit, RateLimited, RateLimiter
+from utils.scheduler import TimerScheduler
+from utils.startup import StartupReport
+from utils.trace import TraceRecorder, trace_salt
+
+startup_report = StartupReport(STARTED_AT)
+startup_report.mark('imports')
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -13,124 +46,299 @@ load_dotenv()
 # Configuration du bot
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
 
-# Base de données simple (JSON)
-class Database:
-    def __init__(self):
-        self.players_file = 'players.json'
-        self.clans_file = 'clans.json'
+# Identifiant Discord de l'administrateur (!xp, !stats, !sauvegarde)
+ADMIN_ID = int(os.getenv('ADMIN_ID', '1395142435981492324'))
+
+# Limiteur de débit: budget → (limite, commandes qui le partagent; None = toutes)
+# Surcharge sans redéploiement: RATE_LIMITS="boutique=5/30,guilde=120/10"
+RATE_LIMITS = {
+    'commandes': (Limit(8, 10.0), None),
+    'guilde': (Limit(120, 10.0, 'guild'), None),
+    'boutique': (Limit(6, 30.0), ('acheter', 'heal')),
+    'reroll': (Limit(3, 30.0), ('reroll_clan',)),
+    'missions': (Limit(6, 30.0), ('mission', 'terminer_mission', 'quitter_mission')),
+}
+
+class InstrumentedContext(commands.Context):
+    """Contexte dont les réponses passent par la file sortante du bot
     
-    def load_players(self):
-        try:
-            with open(self.players_file, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-    
-    def save_players(self, data):
-        with open(self.players_file, 'w') as f:
-            json.dump(data, f, indent=2)
-
-db = Database()
-
-# Classes de base
-class Player:
-    def __init__(self, user_id, username):
-        self.user_id = user_id
-        self.username = username
-        self.level = 1
-        self.experience = 0
-        self.chakra = 100
-        self.health = 100
-        self.max_health = 100
-        self.max_chakra = 100
-        self.village = None
-        self.clan = None
-        self.stats = {
-            "ninjutsu": 10,
-            "taijutsu": 10,
-            "genjutsu": 10,
-            "intelligence": 10,
-            "force": 10,
-            "vitesse": 10
-        }
-        self.ryo = 1000
-        self.rank = "Étudiant de l'Académie"
-        self.last_mission = None
-        self.inventory = []
-        self.jutsu = []
-        self.clan_rerolls = 3  # Nombre de rerolls gratuits
-
-class Clan:
-    def __init__(self, name, description, stat_bonus, special_jutsu, rarity="commun"):
-        self.name = name
-        self.description = description
-        self.stat_bonus = stat_bonus  # Dict des bonus de stats
-        self.special_jutsu = special_jutsu
-        self.rarity = rarity
-
-# Clans disponibles
-CLANS = [
-    # Clans légendaires (rares)
-    Clan("Uchiha", "Clan du Sharingan", {"ninjutsu": 15, "intelligence": 10}, ["Katon: Goukakyuu no Jutsu", "Sharingan"], "légendaire"),
-    Clan("Hyuga", "Clan du Byakugan", {"taijutsu": 15, "vitesse": 10}, ["Juken", "Byakugan"], "légendaire"),
-    Clan("Senju", "Clan de la Volonté du Feu", {"force": 15, "ninjutsu": 10}, ["Mokuton: Jukai Kotan"], "légendaire"),
-    
-    # Clans rares
-    Clan("Nara", "Clan des ombres", {"intelligence": 20, "genjutsu": 5}, ["Kagemane no Jutsu"], "rare"),
-    Clan("Akimichi", "Clan de l'expansion", {"force": 20, "taijutsu": 5}, ["Baika no Jutsu"], "rare"),
-    Clan("Yamanaka", "Clan de l'esprit", {"intelligence": 15, "genjutsu": 10}, ["Shintenshin no Jutsu"], "rare"),
-    Clan("Inuzuka", "Clan des chiens", {"vitesse": 15, "taijutsu": 10}, ["Gatsuga"], "rare"),
-    Clan("Aburame", "Clan des insectes", {"intelligence": 15, "ninjutsu": 10}, ["Kikaichū no Jutsu"], "rare"),
-    
-    # Clans communs
-    Clan("Sarutobi", "Clan du Hokage", {"ninjutsu": 10, "intelligence": 5}, ["Katon: Endan"], "commun"),
-    Clan("Hatake", "Clan du chien argenté", {"vitesse": 10, "taijutsu": 5}, ["Chidori"], "commun"),
-    Clan("Shimura", "Clan de la racine", {"intelligence": 8, "ninjutsu": 7}, ["Futon: Shinkuugyoku"], "commun"),
-    Clan("Mitarashi", "Clan du serpent", {"vitesse": 8, "genjutsu": 7}, ["Sen'eijashu"], "commun"),
-    Clan("Morino", "Clan de l'interrogation", {"intelligence": 10, "genjutsu": 5}, ["Kanashibari no Jutsu"], "commun"),
-    
-    # Clan sans bloodline
-    Clan("Sans Clan", "Ninja civil", {}, [], "commun"),
-]
-
-def get_random_clan():
-    """Obtenir un clan aléatoire selon les probabilités de rareté"""
-    weights = []
-    for clan in CLANS:
-        if clan.rarity == "légendaire":
-            weights.append(5)  # 5% de chance
-        elif clan.rarity == "rare":
-            weights.append(15)  # 15% de chance
-        else:
-            weights.append(80)  # 80% de chance pour commun
+    `await ctx.send(...)` rend la main dès la réponse déposée et renvoie un
+    futur: la commande libère ses verrous sans attendre Discord. send_now
+    attend l'envoi (chronométré) et renvoie le Message.
+    """
+    
+    async def send(self, *args, **kwargs):
+        return await self.bot.outbound.submit('messages', self.channel.id, lambda: self.send_now(*args, **kwargs))
+    
+    async def send_now(self, *args, **kwargs):
+        with DISCORD_SEND_LATENCY.time():
+            return await super().send(*args, **kwargs)
+
+class NinjaBot(commands.AutoShardedBot):
+    def __init__(self, db, metrics_file=None, metrics_interval=15.0, trace_recorder=None,
+                 cluster_id=None, health_file=None, health_interval=10.0, ranking_sync_interval=None,
+                 startup=None, rate_limiter=None, onboarding_file='onboarding.json', backups=None, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self.startup = startup or StartupReport()
+        # Inscriptions !start en cours (cogs/player.py), sauvegardées ici
+        self.onboarding_file = onboarding_file
+        # Refuse les appels en excès avant toute lecture du stockage
+        self.rate_limiter = rate_limiter
+        if rate_limiter is not None:
+            self.check_once(rate_limiter.check)
+        self.loop_monitor = LoopLagMonitor()
+        self.embed_cache = EmbedCache()
+        self.leaderboards = Leaderboards()
+        # Fins de mission et récompenses quotidiennes, rechargées depuis le stockage
+        self.timers = TimerScheduler()
+        # Envois et réactions, servis hors des commandes dans les rate limits de Discord
+        self.outbound = OutboundDispatcher()
+        db.add_listener(self.leaderboards.observe)
+        # Textfile Prometheus (collecteur textfile de node_exporter), désactivé par défaut
+        self.metrics_writer = TextfileWriter(REGISTRY, metrics_file, metrics_interval) if metrics_file else None
+        # Trace des commandes pour tools/replay_trace.py, désactivée par défaut
+        self.trace_recorder = trace_recorder
+        if trace_recorder is not None:
+            self.before_invoke(trace_recorder.record)
+        # Cluster (cluster.py): état des shards et classements suivis entre processus
+        self.cluster_id = cluster_id
+        self.health = ShardHealth(self, health_file, health_interval, cluster_id) if health_file else None
+        self.ranking_sync_interval = ranking_sync_interval
+        self._ranking_sync_task = None
+        # Sauvegardes à chaud du stockage (database/backup.py), désactivées par défaut
+        self.backups = backups
+    
+    async def get_context(self, origin, *, cls=InstrumentedContext):
+        return await super().get_context(origin, cls=cls)
+    
+    async def setup_hook(self):
+        # discord.py appelle setup_hook après le login HTTP
+        self.startup.mark('login')
+        self.loop_monitor.start()
+        self.outbound.start()
+        await self.db.init_db()
+        if self.ranking_sync_interval:
+            # Numéro lu avant les classements: rien n'est manqué entre les deux
+            since = await self.db.latest_change()
+            self._ranking_sync_task = asyncio.create_task(self._follow_ranking_changes(since))
+        self.startup.mark('stockage', self.storage_detail())
+        self.leaderboards.rebuild(await self.db.ranking_rows())
+        self.startup.mark('classements', f"{self.leaderboards.size('niveau')} joueurs")
+        for kind in TIMER_FIELDS:
+            self.timers.load(kind, await self.db.pending_timers(kind))
+        self.startup.mark('minuteurs', f"{len(self.timers)} en attente")
+        await self.load_extension('cogs.player')
+        self.startup.mark('cogs', f"{len(self.cogs)} cog(s), {len(self.commands)} commandes")
+        # Après les cogs: chaque type de minuteur a sa fonction
+        self.timers.start()
+        if self.metrics_writer is not None:
+            self.metrics_writer.start()
+        if self.health is not None:
+            self.health.start()
+        if self.backups is not None:
+            self.backups.start()
+    
+    async def notify(self, user_id, **kwargs):
+        """Message privé à un joueur, hors de toute commande (minuteurs)
+        
+        Déposé dans la file sortante: le futur renvoyé donne False si le joueur
+        est introuvable ou refuse les messages privés.
+        """
+        return await self.outbound.submit('dm', user_id, lambda: self._send_dm(user_id, **kwargs))
     
-    return random.choices(CLANS, weights=weights)[0]
+    async def _send_dm(self, user_id, **kwargs):
+        try:
+            user = self.get_user(user_id) or await self.fetch_user(user_id)
+            with DISCORD_SEND_LATENCY.time():
+                await user.send(**kwargs)
+        except discord.HTTPException:
+            return False
+        return True
+    
+    def storage_detail(self):
+        report = getattr(self.db, 'load_report', None)
+        if not report:
+            return type(self.db).__name__
+        return (f"{report['source']}, snapshot {report['snapshot_s']:.2f}s, "
+                f"journal {report['journal_s']:.2f}s, {report['players']} joueurs")
+    
+    async def _follow_ranking_changes(self, since):
+        """Appliquer aux classements les écritures des autres processus du cluster"""
+        while True:
+            await asyncio.sleep(self.ranking_sync_interval)
+            try:
+                since, changes = await self.db.ranking_changes(since)
+                if changes is None:
+                    # Trop en retard: les changements manqués ont été purgés
+                    since = await self.db.latest_change()
+                    self.leaderboards.rebuild(await self.db.ranking_rows())
+                    continue
+                for user_id, fields in changes:
+                    self.leaderboards.observe(user_id, fields)
+            except Exception as e:
+                print(f"⚠️ Synchronisation des classements impossible: {e}")
+    
+    async def close(self):
+        # Avant la fermeture de la session HTTP: les réponses en file partent encore
+        await self.outbound.stop()
+        await super().close()
+        if self._ranking_sync_task is not None:
+            self._ranking_sync_task.cancel()
+        await self.timers.stop()
+        if self.backups is not None:
+            # Avant db.close: une sauvegarde en cours lit encore le stockage
+            await self.backups.stop()
+        await self.db.close()
+        await self.loop_monitor.stop()
+        if self.metrics_writer is not None:
+            await self.metrics_writer.stop()
+        if self.trace_recorder is not None:
+            self.trace_recorder.close()
+        if self.health is not None:
+            await self.health.stop()
+
+# Shards de ce processus quand il est lancé par cluster.py (SHARD_IDS=0,1,2)
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard]
+CLUSTER_ID = int(os.getenv('CLUSTER_ID')) if os.getenv('CLUSTER_ID') else None
+
+# Stockage des joueurs: SQLite par défaut, ou players.json gardé en mémoire
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+if STORAGE_BACKEND == 'json' and SHARD_IDS:
+    # Chaque processus aurait sa propre copie en mémoire de players.json
+    raise SystemExit("❌ Le mode cluster demande STORAGE_BACKEND=sqlite")
+if STORAGE_BACKEND == 'json':
+    db = PlayerStore(
+        AsyncDatabase(Database(
+            os.getenv('PLAYERS_FILE', 'players.json'),
+            journaled=os.getenv('PLAYERS_JOURNAL', '1') == '1',
+            # Copie binaire de players.json, lue en priorité au démarrage
+            binary=os.getenv('PLAYERS_BINARY', '1') == '1'
+        )),
+        flush_interval=float(os.getenv('PLAYERS_FLUSH_INTERVAL', '30'))
+    )
+else:
+    # player_changes n'est relu que par les autres processus d'un cluster
+    db = DatabaseManager(os.getenv('DATABASE_PATH', 'naruto_game.db'), track_changes=bool(SHARD_IDS))
+
+if SHARD_IDS:
+    # Les joueurs ne dépendent pas des guildes: un même joueur peut jouer
+    # sur des shards servis par des processus différents
+    player_locks.share_between_processes(os.getenv('PLAYER_LOCK_FILE', db.db_path + '.locks'))
+    REGISTRY.const_labels['cluster'] = str(CLUSTER_ID)
+
+TRACE_FILE = os.getenv('TRACE_FILE')
+
+# Sauvegardes à chaud: un seul processus du cluster s'en charge
+BACKUP_DIR = os.getenv('BACKUP_DIR') if CLUSTER_ID in (None, 0) else None
+backups = HotBackup(
+    db, STORAGE_BACKEND, BACKUP_DIR,
+    interval=float(os.getenv('BACKUP_INTERVAL', '3600')),
+    keep=int(os.getenv('BACKUP_KEEP', '24')),
+    max_rate=float(os.getenv('BACKUP_MAX_RATE', str(DEFAULT_MAX_RATE / 1e6))) * 1e6
+) if BACKUP_DIR else None
+
+rate_limiter = RateLimiter()
+for name, (limit, names) in RATE_LIMITS.items():
+    rate_limiter.add(name, limit, names)
+rate_limiter.configure(os.getenv('RATE_LIMITS', ''))
+
+bot = NinjaBot(
+    db,
+    metrics_file=os.getenv('METRICS_TEXTFILE'),
+    metrics_interval=float(os.getenv('METRICS_INTERVAL', '15')),
+    trace_recorder=TraceRecorder(TRACE_FILE, trace_salt()) if TRACE_FILE else None,
+    cluster_id=CLUSTER_ID,
+    health_file=os.getenv('HEALTH_FILE'),
+    health_interval=float(os.getenv('HEALTH_INTERVAL', '10')),
+    ranking_sync_interval=float(os.getenv('RANKING_SYNC_INTERVAL', '2')) if SHARD_IDS else None,
+    shard_ids=SHARD_IDS or None,
+    shard_count=int(os.getenv('SHARD_COUNT')) if SHARD_IDS else None,
+    startup=startup_report,
+    rate_limiter=rate_limiter,
+    onboarding_file=os.getenv('ONBOARDING_FILE', 'onboarding.json'),
+    backups=backups,
+    command_prefix='!', intents=intents, help_command=None
+)
 
 def apply_clan_bonus(player_data, clan):
-    """Appliquer les bonus de clan aux stats du joueur"""
+    """Appliquer les bonus de clan aux stats du joueur (renvoie les champs modifiés)"""
+    stats = dict(player_data['stats'])
+    jutsu_list = list(player_data['jutsu_list'])
+    
     if clan and clan.stat_bonus:
         for stat, bonus in clan.stat_bonus.items():
-            player_data['stats'][stat] += bonus
+            stats[stat] = stats.get(stat, 0) + bonus
     
     if clan and clan.special_jutsu:
         for jutsu in clan.special_jutsu:
-            if jutsu not in player_data['jutsu']:
-                player_data['jutsu'].append(jutsu)
+            if jutsu not in jutsu_list:
+                jutsu_list.append(jutsu)
+    
+    return {'stats': stats, 'jutsu_list': jutsu_list}
+
+def remove_clan_bonus(player_data, clan):
+    """Retirer les bonus d'un ancien clan (renvoie les champs modifiés)"""
+    stats = dict(player_data['stats'])
+    jutsu_list = list(player_data['jutsu_list'])
+    
+    if clan and clan.stat_bonus:
+        for stat, bonus in clan.stat_bonus.items():
+            stats[stat] = stats.get(stat, 0) - bonus
+    
+    if clan and clan.special_jutsu:
+        for jutsu in clan.special_jutsu:
+            if jutsu in jutsu_list:
+                jutsu_list.remove(jutsu)
+    
+    return {'stats': stats, 'jutsu_list': jutsu_list}
 
 # Événements
 @bot.event
 async def on_ready():
     print(f'{bot.user} est connecté!')
+    # Premier on_ready seulement: les suivants sont des reconnexions
+    if bot.startup.finish('gateway', f"{len(bot.shards)} shard(s), {len(bot.guilds)} guildes"):
+        print("🚀 Démarrage:\n" + bot.startup.summary())
+
+@bot.event
+async def on_command(ctx):
+    ctx.started_at = time.perf_counter()
+
+def observe_command(ctx):
+    started = getattr(ctx, 'started_at', None)
+    if started is not None:
+        COMMAND_LATENCY.observe(time.perf_counter() - started, ctx.command.qualified_name)
+
+@bot.event
+async def on_command_completion(ctx):
+    observe_command(ctx)
+
+@bot.event
+async def on_command_error(ctx, error):
+    if ctx.command is None:
+        # Commande inconnue: rien à mesurer
+        return
+    if isinstance(error, RateLimited):
+        # Refusé avant la commande: ni latence ni erreur, un seul avertissement par fenêtre
+        if error.warn:
+            await ctx.send(f"⏳ Doucement! Réessayez dans {math.ceil(error.retry_after)}s.")
+        return
+    observe_command(ctx)
+    cause = getattr(error, 'original', error)
+    COMMAND_ERRORS.inc(ctx.command.qualified_name, type(cause).__name__)
+    # Même trace que le gestionnaire par défaut de discord.py, remplacé ici
+    print(f"Ignoring exception in command {ctx.command}:")
+    traceback.print_exception(type(error), error, error.__traceback__)
 
 @bot.command(name='creer')
+@player_lock
 async def create_character(ctx, village=None):
     """Créer un nouveau personnage"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
     
-    if user_id in players:
+    if await db.get_player(user_id) is not None:
         await ctx.send("❌ Vous avez déjà un personnage!")
         return
     
@@ -144,19 +352,31 @@ async def create_character(ctx, village=None):
         await ctx.send(embed=embed)
         return
     
-    player = Player(user_id, ctx.author.display_name)
-    player.village = village
-    
     # Assigner un clan aléatoire
     clan = get_random_clan()
-    player.clan = clan.__dict__
+    
+    player = Player(
+        user_id,
+        ctx.author.display_name,
+        village,
+        clan.name,
+        stats={
+            "ninjutsu": 10,
+            "taijutsu": 10,
+            "genjutsu": 10,
+            "intelligence": 10,
+            "force": 10,
+            "vitesse": 10
+        },
+        ryo=1000,
+        jutsu_list=[]
+    )
     
     # Convertir en dict et appliquer les bonus
-    player_dict = player.__dict__
-    apply_clan_bonus(player_dict, clan)
+    player_dict = player.to_dict()
+    player_dict.update(apply_clan_bonus(player_dict, clan))
     
-    players[user_id] = player_dict
-    db.save_players(players)
+    await db.create_player(**player_dict)
     
     embed = discord.Embed(
         title="✅ Personnage créé!",
@@ -175,20 +395,19 @@ async def create_character(ctx, village=None):
     await ctx.send(embed=embed)
 
 @bot.command(name='reroll_clan')
+@player_lock
 async def reroll_clan(ctx):
     """Reroll son clan"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage!")
         return
     
-    player = players[user_id]
-    
     # Vérifier si le joueur a des rerolls
     if player.get('clan_rerolls', 0) <= 0:
-        cost = 500
+        cost = REROLL_COST
         if player['ryo'] < cost:
             await ctx.send(f"❌ Plus de rerolls gratuits! Coût: {cost} Ryō (vous avez {player['ryo']} Ryō)")
             return
@@ -199,27 +418,26 @@ async def reroll_clan(ctx):
         embed_title = f"🎲 Clan rerollé! ({player['clan_rerolls']} rerolls gratuits restants)"
     
     # Sauvegarder l'ancien clan
-    old_clan_name = player['clan']['name'] if player['clan'] else "Aucun"
+    old_clan_name = player['clan'] or "Aucun"
     
-    # Retirer les anciens bonus de clan
-    if player['clan'] and player['clan']['stat_bonus']:
-        for stat, bonus in player['clan']['stat_bonus'].items():
-            player['stats'][stat] -= bonus
-    
-    # Retirer les anciens jutsu de clan
-    if player['clan'] and player['clan']['special_jutsu']:
-        for jutsu in player['clan']['special_jutsu']:
-            if jutsu in player['jutsu']:
-                player['jutsu'].remove(jutsu)
+    # Retirer les anciens bonus et jutsu de clan
+    player.update(remove_clan_bonus(player, CLANS_BY_NAME.get(player['clan'])))
     
     # Nouveau clan
     new_clan = get_random_clan()
-    player['clan'] = new_clan.__dict__
+    player['clan'] = new_clan.name
     
     # Appliquer les nouveaux bonus
-    apply_clan_bonus(player, new_clan)
-    
-    db.save_players(players)
+    player.update(apply_clan_bonus(player, new_clan))
+    
+    await db.update_player(
+        user_id,
+        ryo=player['ryo'],
+        clan_rerolls=player['clan_rerolls'],
+        clan=player['clan'],
+        stats=player['stats'],
+        jutsu_list=player['jutsu_list']
+    )
     
     embed = discord.Embed(
         title=embed_title,
@@ -238,80 +456,125 @@ async def reroll_clan(ctx):
     
     await ctx.send(embed=embed)
 
-@bot.command(name='clans')
-async def clans_list(ctx):
-    """Afficher la liste des clans disponibles"""
+@bot.embed_cache.builder('clans')
+def build_clans_embed():
     embed = discord.Embed(
         title="🏮 Clans disponibles",
         description="Voici tous les clans que vous pouvez obtenir:",
         color=0x9932CC
     )
     
-    # Grouper par rareté
-    legendaires = [c for c in CLANS if c.rarity == "légendaire"]
-    rares = [c for c in CLANS if c.rarity == "rare"]
-    communs = [c for c in CLANS if c.rarity == "commun"]
-    
-    if legendaires:
-        leg_text = "\n".join([f"**{c.name}** - {c.description}" for c in legendaires])
-        embed.add_field(name="🌟 Légendaires (5%)", value=leg_text, inline=False)
-    
-    if rares:
-        rare_text = "\n".join([f"**{c.name}** - {c.description}" for c in rares])
-        embed.add_field(name="💎 Rares (15%)", value=rare_text, inline=False)
-    
-    if communs:
-        common_text = "\n".join([f"**{c.name}** - {c.description}" for c in communs])
-        embed.add_field(name="⚪ Communs (80%)", value=common_text, inline=False)
+    # Grouper par rareté en un seul passage
+    by_rarity = {}
+    for clan in CLANS:
+        by_rarity.setdefault(clan.rarity, []).append(clan)
     
-    embed.add_field(name="💰 Reroll", value="3 rerolls gratuits, puis 500 Ryō par reroll", inline=False)
+    for rarity, title in (("légendaire", "🌟 Légendaires (5%)"), ("rare", "💎 Rares (15%)"), ("commun", "⚪ Communs (80%)")):
+        if by_rarity.get(rarity):
+            text = "\n".join([f"**{c.name}** - {c.description}" for c in by_rarity[rarity]])
+            embed.add_field(name=title, value=text, inline=False)
     
-    await ctx.send(embed=embed)
+    embed.add_field(name="💰 Reroll", value=f"{FREE_REROLLS} rerolls gratuits, puis {REROLL_COST} Ryō par reroll", inline=False)
+    return embed
 
-@bot.command(name='missions')
-async def missions(ctx):
-    """Afficher les missions disponibles"""
+@bot.command(name='clans')
+async def clans_list(ctx):
+    """Afficher la liste des clans disponibles"""
+    await ctx.send(embed=bot.embed_cache.get('clans'))
+
+# Un embed est limité à 25 champs et 1024 caractères par champ: les missions
+# sont groupées par palier de niveau, 5 par champ et 15 par page
+MISSIONS_PER_FIELD = 5
+MISSIONS_PER_PAGE = 15
+
+def mission_pages(tier):
+    """Missions débloquées au palier `tier`, paliers les plus hauts en premier, découpées en pages"""
+    unlocked = sorted(MISSION_CATALOG.available(tier), key=lambda m: -m.required_level)
+    return [unlocked[i:i + MISSIONS_PER_PAGE] for i in range(0, len(unlocked), MISSIONS_PER_PAGE)]
+
+@bot.embed_cache.builder('missions')
+def build_missions_embed(tier, page):
+    pages = mission_pages(tier)
     embed = discord.Embed(
         title="📝 Missions disponibles",
         color=0xffcc00
     )
     
-    for mission in MISSIONS:
-        embed.add_field(
-            name=f"{mission.name} ({mission.rank})",
-            value=f"**Description:** {mission.description}\n**Récompense:** {mission.reward_exp} XP, {mission.reward_ryo} Ryō\n**Niveau requis:** {mission.required_level}",
-            inline=False
-        )
-    
-    await ctx.send(embed=embed)
+    for level, group in itertools.groupby(pages[page - 1], key=lambda m: m.required_level):
+        group = list(group)
+        for start in range(0, len(group), MISSIONS_PER_FIELD):
+            embed.add_field(
+                name=f"Niveau {level}+" + (" (suite)" if start else ""),
+                value="\n".join(
+                    f"**{mission.name}** ({mission.rank}, {mission.duration_text}): {mission.reward_exp} XP, {mission.reward_ryo} Ryō\n{mission.description}"
+                    for mission in group[start:start + MISSIONS_PER_FIELD]
+                )[:1024],
+                inline=False
+            )
+    
+    footer = f"Page {page}/{len(pages)}"
+    if page < len(pages):
+        footer += f", suite avec !missions {page + 1}"
+    next_tier = MISSION_CATALOG.next_tier(tier)
+    if next_tier is not None:
+        footer += f" · Nouvelles missions au niveau {next_tier}"
+    embed.set_footer(text=footer)
+    return embed
+
+@bot.command(name='missions')
+async def missions(ctx, page: int = 1):
+    """Afficher les missions accessibles à votre niveau"""
+    player = await db.get_player(ctx.author.id)
+    tier = MISSION_CATALOG.tier(player['level'] if player is not None else 1)
+    if tier is None:
+        await ctx.send("❌ Aucune mission accessible pour l'instant.")
+        return
+    pages = math.ceil(len(MISSION_CATALOG.available(tier)) / MISSIONS_PER_PAGE)
+    if not 1 <= page <= pages:
+        await ctx.send(f"❌ Page invalide: choisissez entre 1 et {pages}.")
+        return
+    await ctx.send(embed=bot.embed_cache.get('missions', tier, page))
 
 @bot.command(name='mission')
+@player_lock
 async def join_mission(ctx, *, mission_name: str):
     """Rejoindre une mission"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage! Créez-en un avec `!creer <village>`.")
         return
     
-    player = players[user_id]
-    
-    if player['last_mission'] is not None:
+    if player['current_mission'] is not None:
         await ctx.send("❌ Vous avez déjà une mission en cours! Terminez-la avec `!terminer_mission` ou quittez-la avec `!quitter_mission`.")
         return
     
-    mission = next((m for m in MISSIONS if m.name.lower() == mission_name.lower()), None)
+    mission = MISSION_CATALOG.search(mission_name)
     if mission is None:
-        await ctx.send("❌ Mission non trouvée! Utilisez `!missions` pour voir la liste.")
+        suggestions = MISSION_CATALOG.suggest(mission_name)
+        if suggestions:
+            names = ", ".join(f"**{m.name}**" for m in suggestions)
+            await ctx.send(f"❌ Mission non trouvée! Vouliez-vous dire: {names}?")
+        else:
+            await ctx.send("❌ Mission non trouvée! Utilisez `!missions` pour voir la liste.")
         return
     
     if player['level'] < mission.required_level:
-        await ctx.send(f"❌ Vous devez être au moins niveau {mission.required_level} pour cette mission.")
+        available = MISSION_CATALOG.available(player['level'])
+        message = f"❌ Vous devez être au moins niveau {mission.required_level} pour cette mission."
+        if available:
+            # Les 5 missions des paliers les plus hauts: la liste complète est dans !missions
+            names = ', '.join(m.name for m in reversed(available[-5:]))
+            hidden = len(available) - 5
+            more = f" et {hidden} autre{'s' if hidden > 1 else ''}, voir `!missions`" if hidden > 0 else ""
+            message += f"\nMissions accessibles: {names}{more}"
+        await ctx.send(message)
         return
     
-    player['last_mission'] = mission.__dict__
-    db.save_players(players)
+    ends_at = time.time() + mission.duration
+    await db.update_player(user_id, current_mission=mission.id, mission_ends_at=ends_at)
+    bot.timers.schedule('mission', user_id, ends_at)
     
     embed = discord.Embed(
         title="✅ Mission acceptée!",
@@ -319,209 +582,308 @@ async def join_mission(ctx, *, mission_name: str):
         color=0x00ff00
     )
     embed.add_field(name="Récompense", value=f"{mission.reward_exp} XP, {mission.reward_ryo} Ryō", inline=False)
+    embed.add_field(name="Fin", value=f"<t:{int(ends_at)}:R> ({mission.duration_text}), résultat en message privé", inline=False)
     await ctx.send(embed=embed)
 
-@bot.command(name='terminer_mission')
-async def complete_mission(ctx):
-    """Terminer la mission en cours"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
-    
-    if user_id not in players:
-        await ctx.send("❌ Vous n'avez pas de personnage!")
-        return
-    
-    player = players[user_id]
-    
-    if player['last_mission'] is None:
-        await ctx.send("❌ Vous n'avez pas de mission en cours.")
-        return
-    
-    mission = player['last_mission']
-    
+async def finish_mission(user_id, player, mission):
+    """Résoudre la mission en cours du joueur (sous son verrou), renvoie l'embed du résultat"""
     # Simulation de réussite (70% de chance)
     success = random.random() > 0.3
     
     if success:
-        player['experience'] += mission['reward_exp']
-        player['ryo'] += mission['reward_ryo']
-        
-        # Vérifier montée de niveau
-        level_up = False
-        while player['experience'] >= (player['level'] * 100):
-            player['experience'] -= (player['level'] * 100)
-            player['level'] += 1
-            player['max_health'] += 10
-            player['max_chakra'] += 10
-            player['health'] = player['max_health']
-            player['chakra'] = player['max_chakra']
-            level_up = True
+        gain = grant_xp(player, mission.reward_exp)
+        player.update(gain.fields())
+        player['ryo'] += mission.reward_ryo
         
         embed = discord.Embed(
             title="🎉 Mission réussie!",
-            description=f"Vous avez terminé: **{mission['name']}**",
+            description=f"Vous avez terminé: **{mission.name}**",
             color=0x00ff00
         )
-        embed.add_field(name="Récompenses", value=f"+{mission['reward_exp']} XP\n+{mission['reward_ryo']} Ryō", inline=False)
+        embed.add_field(name="Récompenses", value=f"+{mission.reward_exp} XP\n+{mission.reward_ryo} Ryō", inline=False)
         
-        if level_up:
+        if gain.leveled_up:
             embed.add_field(name="🆙 Niveau supérieur!", value=f"Vous êtes maintenant niveau {player['level']}!", inline=False)
     else:
         embed = discord.Embed(
             title="❌ Mission échouée!",
-            description=f"Vous avez échoué: **{mission['name']}**",
+            description=f"Vous avez échoué: **{mission.name}**",
             color=0xff0000
         )
         embed.add_field(name="Conséquences", value="Aucune récompense reçue.", inline=False)
     
-    player['last_mission'] = None
-    db.save_players(players)
-    await ctx.send(embed=embed)
+    await db.update_player(
+        user_id,
+        exp=player['exp'],
+        ryo=player['ryo'],
+        level=player['level'],
+        max_health=player['max_health'],
+        max_chakra=player['max_chakra'],
+        health=player['health'],
+        chakra=player['chakra'],
+        current_mission=None,
+        mission_ends_at=None
+    )
+    bot.timers.cancel('mission', user_id)
+    return embed
+
+async def resolve_due_mission(user_id):
+    async with player_locks.hold(user_id):
+        player = await db.get_player(user_id)
+        if player is None or player['current_mission'] is None:
+            return
+        ends_at = player['mission_ends_at']
+        if not ends_at or ends_at > time.time():
+            # Terminée, quittée ou relancée entre-temps (éventuellement par un autre processus)
+            return
+        mission = MISSIONS_BY_ID.get(player['current_mission'])
+        if mission is None:
+            await db.update_player(user_id, current_mission=None, mission_ends_at=None)
+            return
+        embed = await finish_mission(user_id, player, mission)
+    await bot.notify(user_id, embed=embed)
+
+@bot.timers.handler('mission')
+async def resolve_due_missions(user_ids):
+    """Minuteurs de mission échus: un lot est résolu en parallèle, les écritures
+    sont regroupées par le stockage"""
+    await asyncio.gather(*(resolve_due_mission(user_id) for user_id in user_ids))
+
+@bot.command(name='terminer_mission')
+@player_lock
+async def complete_mission(ctx):
+    """Terminer la mission en cours, une fois sa durée écoulée"""
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
+    
+    if player is None:
+        await ctx.send("❌ Vous n'avez pas de personnage!")
+        return
+    
+    if player['current_mission'] is None:
+        await ctx.send("❌ Vous n'avez pas de mission en cours.")
+        return
+    
+    mission = MISSIONS_BY_ID.get(player['current_mission'])
+    if mission is None:
+        # Mission retirée du jeu depuis qu'elle a été acceptée
+        await db.update_player(user_id, current_mission=None, mission_ends_at=None)
+        bot.timers.cancel('mission', user_id)
+        await ctx.send("❌ Cette mission n'existe plus, elle a été annulée.")
+        return
+    
+    # Sans échéance: mission acceptée avant l'ajout des durées, terminée tout de suite
+    ends_at = player['mission_ends_at']
+    if ends_at and ends_at > time.time():
+        await ctx.send(f"⏳ **{mission.name}** se termine <t:{int(ends_at)}:R>. Le résultat vous sera envoyé en message privé.")
+        return
+    
+    await ctx.send(embed=await finish_mission(user_id, player, mission))
 
 @bot.command(name='quitter_mission')
+@player_lock
 async def leave_mission(ctx):
     """Quitter la mission en cours"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage!")
         return
     
-    player = players[user_id]
-    
-    if player['last_mission'] is None:
+    if player['current_mission'] is None:
         await ctx.send("❌ Vous n'avez pas de mission en cours.")
         return
     
-    mission_name = player['last_mission']['name']
-    player['last_mission'] = None
-    db.save_players(players)
+    mission = MISSIONS_BY_ID.get(player['current_mission'])
+    mission_name = mission.name if mission is not None else player['current_mission']
+    await db.update_player(user_id, current_mission=None, mission_ends_at=None)
+    bot.timers.cancel('mission', user_id)
     
     await ctx.send(f"✅ Vous avez quitté la mission: **{mission_name}**")
 
 @bot.command(name='xp')
+@player_lock
 async def add_xp(ctx, amount: int):
     """Ajouter de l'XP à un joueur (admin seulement)"""
-    # Remplacez par votre ID Discord
-    if ctx.author.id != 1395142435981492324:  
+    if ctx.author.id != ADMIN_ID:
         await ctx.send("❌ Vous n'avez pas la permission d'utiliser cette commande.")
         return
     
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage!")
         return
     
-    player = players[user_id]
-    player['experience'] += amount
-    
-    # Vérifier montée de niveau
-    level_up = False
-    while player['experience'] >= (player['level'] * 100):
-        player['experience'] -= (player['level'] * 100)
-        player['level'] += 1
-        player['max_health'] += 10
-        player['max_chakra'] += 10
-        player['health'] = player['max_health']
-        player['chakra'] = player['max_chakra']
-        level_up = True
+    gain = grant_xp(player, amount)
+    await db.update_player(user_id, **gain.fields())
     
-    db.save_players(players)
-    
-    if level_up:
-        await ctx.send(f"✅ {amount} XP ajouté. 🎉 Vous êtes maintenant niveau {player['level']}!")
+    if gain.leveled_up:
+        await ctx.send(f"✅ {amount} XP ajouté. 🎉 Vous êtes maintenant niveau {gain.level}!")
     else:
         await ctx.send(f"✅ {amount} XP ajouté.")
 
-@bot.command(name='shop')
-async def shop(ctx):
-    """Afficher les objets disponibles à l'achat"""
-    items = [
-        {"name": "Potion de soin", "price": 50, "effect": "Restaure 50 PV"},
-        {"name": "Potion de chakra", "price": 50, "effect": "Restaure 50 Chakra"},
-        {"name": "Élixir de sagesse", "price": 100, "effect": "Donne 10 XP"},
-        {"name": "Scroll de jutsu", "price": 150, "effect": "Apprend un jutsu aléatoire"},
+@bot.command(name='sauvegarde')
+async def backup_now(ctx):
+    """Sauvegarder les joueurs maintenant, sans arrêter le bot (admin seulement)"""
+    if ctx.author.id != ADMIN_ID:
+        await ctx.send("❌ Vous n'avez pas la permission d'utiliser cette commande.")
+        return
+    
+    if bot.backups is None:
+        await ctx.send("❌ Sauvegardes désactivées (BACKUP_DIR).")
+        return
+    
+    await ctx.send("🗄️ Sauvegarde en cours...")
+    try:
+        manifest = await bot.backups.backup()
+    except Exception as e:
+        await ctx.send(f"❌ Sauvegarde échouée: {e}")
+        return
+    await ctx.send(f"✅ Snapshot `{manifest['id']}`: {manifest['size'] / 1e6:.1f} Mo, "
+                   f"{manifest['stored'] / 1e6:.2f} Mo nouveaux en {manifest['elapsed']:.1f}s")
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f} ms" if seconds is not None else "—"
+
+def histogram_summary(histogram, limit=8, label=None):
+    """Une ligne par série: nombre, p50, p95 et temps total, les plus coûteuses d'abord"""
+    series = sorted(histogram.labels(), key=lambda labels: histogram.total(*labels), reverse=True)
+    lines = []
+    for labels in series[:limit]:
+        name = label(labels) if label else "/".join(labels) or "total"
+        lines.append(
+            f"`{name}` ×{histogram.count(*labels)} — p50 {format_ms(histogram.quantile(0.5, *labels))}, "
+            f"p95 {format_ms(histogram.quantile(0.95, *labels))}, total {histogram.total(*labels):.2f}s"
+        )
+    # Limite de Discord pour la valeur d'un champ
+    return "\n".join(lines)[:1024]
+
+@bot.command(name='stats')
+async def stats(ctx):
+    """Afficher les métriques du bot (admin seulement)"""
+    if ctx.author.id != ADMIN_ID:
+        await ctx.send("❌ Vous n'avez pas la permission d'utiliser cette commande.")
+        return
+    
+    embed = discord.Embed(title="📊 Statistiques du bot", color=0x3498DB)
+    
+    commands_text = histogram_summary(COMMAND_LATENCY, label=lambda labels: f"!{labels[0]}")
+    embed.add_field(name="⏱️ Commandes", value=commands_text or "Aucune commande", inline=False)
+    
+    errors = COMMAND_ERRORS.series()
+    if errors:
+        errors_text = "\n".join(f"`!{command}` {error}: {int(count)}" for (command, error), count in errors[:10])
+        embed.add_field(name="❌ Erreurs", value=errors_text, inline=False)
+    
+    storage_text = histogram_summary(STORAGE_LATENCY)
+    embed.add_field(name="💾 Stockage", value=storage_text or "Aucune opération", inline=False)
+    
+    written = [
+        f"`{'/'.join(labels)}` {STORAGE_BYTES.total(*labels) / 1024:.0f} Ko en {STORAGE_BYTES.count(*labels)} écritures"
+        for labels in STORAGE_BYTES.labels()
     ]
+    if written:
+        embed.add_field(name="📦 Octets écrits", value="\n".join(written), inline=False)
+    
+    embed.add_field(name="📨 Envois Discord", value=histogram_summary(DISCORD_SEND_LATENCY) or "Aucun envoi", inline=False)
+    embed.add_field(name="📤 File sortante", value=bot.outbound.summary()[:1024], inline=False)
+    embed.add_field(
+        name="🔄 Boucle asyncio",
+        value=f"{bot.loop_monitor.summary()}\np95 {format_ms(LOOP_LAG.quantile(0.95))}",
+        inline=False
+    )
+    embed.add_field(name="🚀 Démarrage", value=bot.startup.summary()[:1024], inline=False)
+    embed.add_field(name="🚦 Limiteur de débit", value=bot.rate_limiter.summary()[:1024], inline=False)
+    player_cog = bot.get_cog('PlayerCog')
+    if player_cog is not None:
+        embed.add_field(name="📝 Inscriptions", value=player_cog.onboarding.summary(), inline=False)
+    embed.add_field(name="⏰ Minuteurs", value=bot.timers.summary(), inline=False)
+    if bot.backups is not None:
+        embed.add_field(name="🗄️ Sauvegardes", value=bot.backups.summary(), inline=False)
+    embed.add_field(name="🖼️ Cache d'embeds", value=bot.embed_cache.summary()[:1024], inline=False)
+    
+    write_stats = getattr(db, 'write_stats', None)
+    if write_stats is not None:
+        embed.add_field(
+            name="🧺 Lots d'écriture SQLite",
+            value=f"{write_stats.batches} lots, {write_stats.avg_batch_size:.1f} écritures en moyenne "
+                  f"({write_stats.merged} fusionnées, {write_stats.failed} échecs), "
+                  f"commit max {format_ms(write_stats.flush_time_max)}",
+            inline=False
+        )
     
+    await ctx.send(embed=embed)
+
+@bot.embed_cache.builder('shop')
+def build_shop_embed():
     embed = discord.Embed(
         title="🛒 Boutique",
         color=0x00ff00
     )
     
-    for item in items:
+    for item in ITEM_REGISTRY:
         embed.add_field(
-            name=item["name"],
-            value=f"**Prix:** {item['price']} Ryō\n**Effet:** {item['effect']}",
+            name=item.name,
+            value=f"**Prix:** {item.price} Ryō\n**Effet:** {item.description}",
             inline=False
         )
-    
-    await ctx.send(embed=embed)
+    return embed
+
+@bot.command(name='shop')
+async def shop(ctx):
+    """Afficher les objets disponibles à l'achat"""
+    await ctx.send(embed=bot.embed_cache.get('shop'))
 
 @bot.command(name='acheter')
+@player_lock
 async def buy(ctx, *, item_name: str):
     """Acheter un objet"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage!")
         return
     
-    player = players[user_id]
-    
-    items = {
-        "potion de soin": {"price": 50, "effect": "heal", "amount": 50},
-        "potion de chakra": {"price": 50, "effect": "chakra", "amount": 50},
-        "élixir de sagesse": {"price": 100, "effect": "xp", "amount": 10},
-        "scroll de jutsu": {"price": 150, "effect": "jutsu", "amount": 1},
-    }
+    # Quantité optionnelle: !acheter 10 potion de soin
+    quantity = 1
+    parts = item_name.split(maxsplit=1)
+    if len(parts) == 2 and parts[0].isdigit():
+        quantity = int(parts[0])
+        item_name = parts[1]
+    if not 1 <= quantity <= MAX_QUANTITY:
+        await ctx.send(f"❌ Vous pouvez acheter entre 1 et {MAX_QUANTITY} objets à la fois.")
+        return
     
-    item = items.get(item_name.lower())
+    item = ITEM_REGISTRY.find(item_name)
     if item is None:
         await ctx.send("❌ Objet non trouvé! Utilisez `!shop` pour voir les objets disponibles.")
         return
     
-    if player['ryo'] < item["price"]:
-        await ctx.send(f"❌ Vous n'avez pas assez de Ryō! Coût: {item['price']} Ryō")
+    price = item.price * quantity
+    if player['ryo'] < price:
+        await ctx.send(f"❌ Vous n'avez pas assez de Ryō! Coût: {price} Ryō")
         return
     
-    player['ryo'] -= item["price"]
-    
-    if item["effect"] == "heal":
-        player['health'] = min(player['max_health'], player['health'] + item["amount"])
-        await ctx.send(f"✅ Vous avez acheté une **{item_name}**. Vos PV sont maintenant à {player['health']}/{player['max_health']}.")
-    elif item["effect"] == "chakra":
-        player['chakra'] = min(player['max_chakra'], player['chakra'] + item["amount"])
-        await ctx.send(f"✅ Vous avez acheté une **{item_name}**. Votre Chakra est maintenant à {player['chakra']}/{player['max_chakra']}.")
-    elif item["effect"] == "xp":
-        player['experience'] += item["amount"]
-        await ctx.send(f"✅ Vous avez acheté un **{item_name}**. Vous avez gagné {item['amount']} XP.")
-    elif item["effect"] == "jutsu":
-        jutsu_list = ["Katon: Goukakyuu", "Suiton: Mizurappa", "Doton: Doryuuheki", "Fuuton: Daitoppa", "Raiton: Chidori"]
-        new_jutsu = random.choice(jutsu_list)
-        if new_jutsu not in player['jutsu']:
-            player['jutsu'].append(new_jutsu)
-            await ctx.send(f"✅ Vous avez acheté un **{item_name}**. Vous avez appris: **{new_jutsu}**!")
-        else:
-            await ctx.send(f"✅ Vous avez acheté un **{item_name}**, mais vous connaissiez déjà le jutsu!")
-    
-    db.save_players(players)
+    # Toute la quantité est appliquée en une seule mise à jour
+    changes, message = ITEM_REGISTRY.apply(player, item, quantity)
+    await db.update_player(user_id, ryo=player['ryo'] - price, **changes)
+    await ctx.send(f"✅ Vous avez acheté {item.label(quantity)}. {message}")
 
 @bot.command(name='heal')
+@player_lock
 async def heal(ctx):
     """Se soigner"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage!")
         return
     
-    player = players[user_id]
-    
     heal_cost = 10
     
     if player['chakra'] < heal_cost:
@@ -534,23 +896,21 @@ async def heal(ctx):
     
     player['chakra'] -= heal_cost
     player['health'] = min(player['max_health'], player['health'] + 20)
-    db.save_players(players)
+    await db.update_player(user_id, chakra=player['chakra'], health=player['health'])
     
     await ctx.send(f"✅ Vous vous êtes soigné. Vos PV sont maintenant à {player['health']}/{player['max_health']}.")
 
 @bot.command(name='jutsu')
 async def jutsu_list(ctx):
     """Afficher vos jutsu"""
-    players = db.load_players()
-    user_id = str(ctx.author.id)
+    user_id = ctx.author.id
+    player = await db.get_player(user_id)
     
-    if user_id not in players:
+    if player is None:
         await ctx.send("❌ Vous n'avez pas de personnage!")
         return
     
-    player = players[user_id]
-    
-    if not player['jutsu']:
+    if not player['jutsu_list']:
         await ctx.send("❌ Vous ne connaissez aucun jutsu! Achetez un scroll de jutsu dans la boutique.")
         return
     
@@ -559,14 +919,64 @@ async def jutsu_list(ctx):
         color=0x9932CC
     )
     
-    jutsu_text = "\n".join([f"• {jutsu}" for jutsu in player['jutsu']])
+    jutsu_text = "\n".join([f"• {jutsu}" for jutsu in player['jutsu_list']])
     embed.add_field(name="Techniques connues", value=jutsu_text, inline=False)
     
     await ctx.send(embed=embed)
 
-@bot.command(name='help')
-async def help_command(ctx):
-    """Afficher l'aide"""
+# Noms acceptés par !classement
+LEADERBOARD_ALIASES = {
+    "niveau": "niveau", "level": "niveau", "lvl": "niveau",
+    "ryo": "ryo", "ryō": "ryo", "argent": "ryo",
+    "xp": "xp", "exp": "xp", "experience": "xp", "expérience": "xp",
+}
+
+@bot.command(name='classement')
+async def leaderboard(ctx, category: str = "niveau", *, village: str = None):
+    """Afficher le classement global ou d'un village"""
+    metric = LEADERBOARD_ALIASES.get(category.lower())
+    if metric is None:
+        await ctx.send("❌ Classement inconnu! Choisissez `niveau`, `ryo` ou `xp`.")
+        return
+    
+    player = await db.get_player(ctx.author.id)
+    if village is not None and village.lower() == "village":
+        if player is None:
+            await ctx.send("❌ Vous n'avez pas de personnage!")
+            return
+        village = player['village']
+    elif village is not None:
+        village = village.capitalize()
+    
+    leaderboards = bot.leaderboards
+    title, _ = METRICS[metric]
+    embed = discord.Embed(
+        title=f"🏆 Classement {title} — {village or 'Global'}",
+        color=0xFFD700
+    )
+    
+    top = leaderboards.top(metric, 10, village)
+    names = await db.player_names([user_id for user_id, *_ in top])
+    lines = []
+    for position, (user_id, _, level, exp, ryo) in enumerate(top, start=1):
+        name = names.get(user_id, str(user_id))
+        if metric == "niveau":
+            score = f"niveau {level}"
+        elif metric == "ryo":
+            score = f"{ryo} Ryō"
+        else:
+            score = f"{total_xp_for_level(level) + exp} XP"
+        lines.append(f"**#{position}** {name} — {score}")
+    embed.description = "\n".join(lines) or "Aucun ninja classé."
+    
+    rank = leaderboards.rank(metric, ctx.author.id, village)
+    if rank is not None:
+        embed.add_field(name="Votre position", value=f"#{rank} sur {leaderboards.size(metric, village)}", inline=False)
+    
+    await ctx.send(embed=embed)
+
+@bot.embed_cache.builder('help')
+def build_help_embed():
     embed = discord.Embed(
         title="🆘 Aide des commandes",
         description="Voici toutes les commandes disponibles:",
@@ -578,6 +988,7 @@ async def help_command(ctx):
     embed.add_field(name="`!creer <village>`", value="Créer un nouveau personnage", inline=False)
     embed.add_field(name="`!profil [@membre]`", value="Afficher le profil d'un joueur", inline=False)
     embed.add_field(name="`!jutsu`", value="Afficher vos jutsu", inline=False)
+    embed.add_field(name="`!classement [niveau|ryo|xp] [village]`", value="Afficher les meilleurs ninjas", inline=False)
     
     # Clans
     embed.add_field(name="**Système de clans**", value="", inline=False)
@@ -588,16 +999,20 @@ async def help_command(ctx):
     embed.add_field(name="**Missions**", value="", inline=False)
     embed.add_field(name="`!missions`", value="Afficher les missions disponibles", inline=False)
     embed.add_field(name="`!mission <nom>`", value="Rejoindre une mission", inline=False)
-    embed.add_field(name="`!terminer_mission`", value="Terminer la mission en cours", inline=False)
+    embed.add_field(name="`!terminer_mission`", value="Voir la fin de la mission en cours (résolue automatiquement)", inline=False)
     embed.add_field(name="`!quitter_mission`", value="Quitter la mission en cours", inline=False)
     
     # Boutique
     embed.add_field(name="**Boutique & Soins**", value="", inline=False)
     embed.add_field(name="`!shop`", value="Afficher la boutique", inline=False)
-    embed.add_field(name="`!acheter <objet>`", value="Acheter un objet", inline=False)
+    embed.add_field(name="`!acheter [quantité] <objet>`", value="Acheter un ou plusieurs objets", inline=False)
     embed.add_field(name="`!heal`", value="Se soigner (coûte du chakra)", inline=False)
-    
-    await ctx.send(embed=embed)
+    return embed
+
+@bot.command(name='help')
+async def help_command(ctx):
+    """Afficher l'aide"""
+    await ctx.send(embed=bot.embed_cache.get('help'))
 
 # Démarrage du bot
 if __name__ == "__main__":
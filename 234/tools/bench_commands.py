@@ -0,0 +1,276 @@
+"""Benchmark des commandes sur des populations synthétiques, sans réseau
+
+Appelle les vrais callbacks de main.py et de PlayerCog avec les faux objets
+de tools.fakes, pour chaque backend (JSON en mémoire et SQLite) et chaque
+taille de population, puis écrit les résultats en JSON:
+    
+    python -m tools.bench_commands [--backend sqlite|json|both] [--populations 1000,100000,1000000]
+                                   [--iterations 2000] [--concurrency 16]
+                                   [--output bench.json] [--compare ancien.json]
+
+Chaque configuration tourne dans son propre processus (main.py choisit son
+backend à l'import et le pic de RSS doit être mesuré séparément). Par
+commande: latences p50/p95/p99, débit et pic de RSS du processus.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+VILLAGES = ["Konoha", "Suna", "Kiri", "Kumo", "Iwa"]
+
+# Identifiants Discord synthétiques: user_id = BASE_ID + index
+BASE_ID = 10 ** 17
+
+# Commandes mesurées, dans l'ordre: (nom, arguments positionnels, arguments nommés)
+# Les commandes de mission se suivent pour que terminer_mission trouve une mission en cours.
+COMMANDS = [
+    ('help', (), {}),
+    ('clans', (), {}),
+    ('shop', (), {}),
+    ('missions', (), {}),
+    ('profil', (), {}),
+    ('jutsu', (), {}),
+    ('classement', ('ryo',), {}),
+    ('acheter', (), {'item_name': '3 potion de soin'}),
+    ('heal', (), {}),
+    ('daily', (), {}),
+    ('reroll_clan', (), {}),
+    ('mission', (), {'mission_name': 'retrouver tora'}),
+    ('terminer_mission', (), {}),
+    ('creer', ('Konoha',), {}),
+]
+
+
+def synthetic_players(count: int, seed: int = 0):
+    """Joueurs au format de records.Player, répartis sur les villages et les clans"""
+    from database.records import Player
+    from game.clans import CLANS
+    
+    rng = random.Random(seed)
+    for i in range(count):
+        level = rng.randint(1, 30)
+        yield Player(
+            BASE_ID + i,
+            f"ninja{i}",
+            rng.choice(VILLAGES),
+            rng.choice(CLANS).name,
+            level=level,
+            exp=rng.randrange(level * 100),
+            ryo=rng.randint(0, 50000),
+            health=rng.randint(1, 100),
+        )
+
+
+async def populate(backend: str, count: int):
+    """Écrire la population directement dans le stockage, avant le démarrage du bot"""
+    if backend == 'json':
+        from database.json_db import Database
+        Database(os.environ['PLAYERS_FILE']).save_players(
+            {str(player.user_id): player for player in synthetic_players(count)}
+        )
+        return
+    
+    from database.db_manager import DatabaseManager
+    db = DatabaseManager(os.environ['DATABASE_PATH'])
+    await db.init_db()
+    batch = []
+    for player in synthetic_players(count):
+        batch.append(player)
+        if len(batch) >= 5000:
+            await db.upsert_players(batch)
+            batch.clear()
+    if batch:
+        await db.upsert_players(batch)
+    await db.close()
+
+
+def rss_mb():
+    """RSS actuel (Linux), None ailleurs"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def bench_command(bot, name, args, kwargs, user_ids, concurrency):
+    from tools.fakes import FakeContext, FakeUser, invoke
+    
+    latencies = []
+    queue = list(user_ids)
+    
+    async def worker():
+        while queue:
+            ctx = FakeContext(bot, FakeUser(queue.pop()))
+            started = time.perf_counter()
+            await invoke(bot, name, ctx, *args, **kwargs)
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'throughput_per_s': len(latencies) / elapsed if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+async def run_worker(args):
+    """Une configuration (backend, population) dans le processus courant"""
+    started = time.perf_counter()
+    await populate(args.backend, args.players)
+    populate_s = time.perf_counter() - started
+    
+    import main
+    bot = main.bot
+    started = time.perf_counter()
+    await bot.setup_hook()
+    startup_s = time.perf_counter() - started
+    startup_rss = rss_mb()
+    
+    rng = random.Random(1)
+    sample = [BASE_ID + i for i in rng.sample(range(args.players), min(args.iterations, args.players))]
+    new_users = [BASE_ID + args.players + i for i in range(len(sample))]
+    
+    commands = {}
+    try:
+        for name, command_args, kwargs in COMMANDS:
+            users = new_users if name == 'creer' else sample
+            commands[name] = await bench_command(bot, name, command_args, kwargs,
+                                                 reversed(users), args.concurrency)
+    finally:
+        await bot.db.close()
+        await bot.loop_monitor.stop()
+    
+    return {
+        'backend': args.backend,
+        'players': args.players,
+        'iterations': len(sample),
+        'concurrency': args.concurrency,
+        'populate_s': populate_s,
+        'startup_s': startup_s,
+        'startup_rss_mb': startup_rss,
+        'loop_max_lag_ms': bot.loop_monitor.max_lag * 1000,
+        'commands': commands,
+    }
+
+
+def run_configuration(backend, players, args):
+    """Lancer un processus de mesure et relire son résultat JSON"""
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND=backend,
+        DATABASE_PATH=os.path.join(workdir, 'bench.db'),
+        PLAYERS_FILE=os.path.join(workdir, 'players.json'),
+        PLAYERS_FLUSH_INTERVAL='3600',
+    )
+    result_path = os.path.join(workdir, 'result.json')
+    subprocess.run(
+        [sys.executable, '-m', 'tools.bench_commands', '--worker',
+         '--backend', backend, '--players', str(players),
+         '--iterations', str(args.iterations), '--concurrency', str(args.concurrency),
+         '--output', result_path],
+        env=env, check=True,
+    )
+    with open(result_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, previous_path, threshold=1.2):
+    """Afficher les commandes dont le p95 a augmenté de plus de `threshold`"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(run['backend'], run['players']): run for run in json.load(f)['runs']}
+    regressions = 0
+    for run in results['runs']:
+        before = previous.get((run['backend'], run['players']))
+        if before is None:
+            continue
+        for name, stats in run['commands'].items():
+            old = before['commands'].get(name)
+            if old and old['p95_ms'] and stats['p95_ms'] / old['p95_ms'] > threshold:
+                regressions += 1
+                print(f"⚠️ {run['backend']}/{run['players']} {name}: p95 "
+                      f"{old['p95_ms']:.2f} ms → {stats['p95_ms']:.2f} ms")
+    print(f"{regressions} régression(s) au-delà de ×{threshold}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des commandes du bot")
+    parser.add_argument('--backend', choices=['sqlite', 'json', 'both'], default='both')
+    parser.add_argument('--populations', default='1000,100000,1000000',
+                        help="Tailles de population séparées par des virgules")
+    parser.add_argument('--players', type=int, default=1000, help=argparse.SUPPRESS)
+    parser.add_argument('--iterations', type=int, default=2000, help="Appels par commande")
+    parser.add_argument('--concurrency', type=int, default=16, help="Appels simultanés")
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare', help="Résultats précédents à comparer (p95)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        result = asyncio.run(run_worker(args))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+    
+    backends = ['json', 'sqlite'] if args.backend == 'both' else [args.backend]
+    populations = [int(size) for size in args.populations.split(',')]
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+        },
+        'runs': [],
+    }
+    for players in populations:
+        for backend in backends:
+            print(f"⏱️ {backend}, {players} joueurs...")
+            run = run_configuration(backend, players, args)
+            results['runs'].append(run)
+            slowest = max(run['commands'].items(), key=lambda item: item[1]['p95_ms'])
+            print(f"   démarrage {run['startup_s']:.2f}s, RSS {run['startup_rss_mb']:.0f} Mo, "
+                  f"p95 max {slowest[1]['p95_ms']:.2f} ms ({slowest[0]})")
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Résultats écrits dans {args.output}")
+    
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare) else 0)
+
+
+if __name__ == "__main__":
+    main()
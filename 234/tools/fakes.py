@@ -0,0 +1,62 @@
+"""Faux objets Discord pour appeler les commandes sans réseau (outils, benchmarks)"""
+import asyncio
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str = None):
+        self.id = user_id
+        self.name = name or f"ninja{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+    
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+    
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMessage:
+    def __init__(self, channel, content: str = "", embed=None):
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.reactions = []
+    
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(0)
+        self.reactions.append(emoji)
+
+
+class FakeContext:
+    """Contexte minimal: auteur, salon et send() qui garde les réponses en mémoire"""
+    
+    def __init__(self, bot, author: FakeUser, keep_messages: bool = False):
+        self.bot = bot
+        self.author = author
+        self.channel = self
+        self.guild = None
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.sent = 0
+    
+    async def send(self, content=None, *, embed=None, **kwargs):
+        # Rendre la main à la boucle comme un vrai envoi réseau
+        await asyncio.sleep(0)
+        self.sent += 1
+        message = FakeMessage(self, content, embed)
+        if self.keep_messages:
+            self.messages.append(message)
+        return message
+    
+    # Envoi attendu (InstrumentedContext.send_now): ici identique à send()
+    send_now = send
+
+
+async def invoke(bot, name: str, ctx: FakeContext, *args, **kwargs):
+    """Appeler directement le callback d'une commande (sans parsing du message)"""
+    command = bot.get_command(name)
+    if command.cog is not None:
+        return await command.callback(command.cog, ctx, *args, **kwargs)
+    return await command.callback(ctx, *args, **kwargs)
@@ -0,0 +1,102 @@
+"""Simulateur de l'économie des rerolls de clan
+
+Simule des millions de joueurs qui relancent `!reroll_clan` jusqu'à obtenir
+un clan d'une rareté donnée, avec les tables d'alias de game.clans et des
+tirages NumPy par lots (un lot par tour de reroll, seuls les joueurs encore
+en recherche sont tirés):
+    
+    python -m tools.gacha_sim [--rarity légendaire] [--players 1000000] [--max-rerolls N]
+
+Répond par exemple à: combien de Ryō un joueur dépense-t-il en moyenne
+pour obtenir un clan légendaire? NumPy n'est nécessaire que pour cet outil.
+"""
+import argparse
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from game.clans import CLAN_SAMPLER, FREE_REROLLS, REROLL_COST, RARITY_WEIGHTS
+
+
+def draw_indices(rng, prob, alias, size):
+    """Tirer `size` indices de clan d'un coup avec la table d'alias"""
+    u = rng.random(size) * len(prob)
+    i = u.astype(np.intp)
+    return np.where(u - i < prob[i], i, alias[i])
+
+
+def simulate(rarity, players, free_rerolls=FREE_REROLLS, cost=REROLL_COST,
+             max_rerolls=None, seed=None, sampler=CLAN_SAMPLER):
+    """Nombre de rerolls de chaque joueur avant d'obtenir la rareté visée
+    
+    Le premier tirage est celui de la création du personnage. Renvoie
+    (rerolls, ryo_depenses, chanceux) où chanceux indique les joueurs qui ont
+    obtenu la rareté avant max_rerolls.
+    """
+    rng = np.random.default_rng(seed)
+    prob = np.asarray(sampler.prob)
+    alias = np.asarray(sampler.alias, dtype=np.intp)
+    wanted = np.array([clan.rarity == rarity for clan in sampler.clans])
+    
+    rerolls = np.zeros(players, dtype=np.int64)
+    searching = np.flatnonzero(~wanted[draw_indices(rng, prob, alias, players)])
+    turn = 0
+    while searching.size and (max_rerolls is None or turn < max_rerolls):
+        turn += 1
+        rerolls[searching] = turn
+        found = wanted[draw_indices(rng, prob, alias, searching.size)]
+        searching = searching[~found]
+    
+    lucky = np.ones(players, dtype=bool)
+    lucky[searching] = False
+    spent = np.maximum(rerolls - free_rerolls, 0) * cost
+    return rerolls, spent, lucky
+
+
+def expected_cost(p, free_rerolls=FREE_REROLLS, cost=REROLL_COST):
+    """Espérance exacte des Ryō dépensés (sans limite de rerolls)
+    
+    Avec q = 1 - p, P(rerolls > k) = q^(k+1), donc
+    E[max(rerolls - gratuits, 0)] = somme des q^(k+1) pour k >= gratuits = q^(gratuits+1) / p.
+    """
+    q = 1.0 - p
+    return cost * q ** (free_rerolls + 1) / p
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simuler le coût des rerolls de clan")
+    parser.add_argument('--rarity', choices=list(RARITY_WEIGHTS), default='légendaire')
+    parser.add_argument('--players', type=int, default=1_000_000)
+    parser.add_argument('--free', type=int, default=FREE_REROLLS, help="Rerolls gratuits")
+    parser.add_argument('--cost', type=int, default=REROLL_COST, help="Prix d'un reroll payant")
+    parser.add_argument('--max-rerolls', type=int, default=None, help="Abandon après N rerolls")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    
+    if np is None:
+        print("❌ NumPy est nécessaire pour ce simulateur: pip install numpy")
+        sys.exit(1)
+    
+    start = time.perf_counter()
+    rerolls, spent, lucky = simulate(args.rarity, args.players, args.free, args.cost,
+                                     args.max_rerolls, args.seed)
+    elapsed = time.perf_counter() - start
+    
+    p = CLAN_SAMPLER.rarity_probability(args.rarity)
+    p50, p90, p99 = np.percentile(spent, [50, 90, 99])
+    print(f"🎲 {args.players} joueurs simulés en {elapsed:.2f}s (rareté {args.rarity}, p = {p:.4f} par tirage)")
+    print(f"Rerolls: moyenne {rerolls.mean():.2f}, max {rerolls.max()}")
+    print(f"Ryō dépensés: moyenne {spent.mean():.0f}, p50 {p50:.0f}, p90 {p90:.0f}, p99 {p99:.0f}")
+    print(f"Sans rien payer: {np.mean(spent == 0):.2%}")
+    if args.max_rerolls is None:
+        print(f"Espérance théorique: {expected_cost(p, args.free, args.cost):.0f} Ryō")
+    else:
+        print(f"Rareté obtenue en {args.max_rerolls} rerolls ou moins: {lucky.mean():.2%}")
+
+
+if __name__ == "__main__":
+    main()
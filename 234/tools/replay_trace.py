@@ -0,0 +1,306 @@
+"""Rejouer une trace de commandes de production sur une copie du stockage
+
+La trace est enregistrée par le bot lui-même (TRACE_FILE=trace.jsonl.gz,
+TRACE_SALT=... dans .env, voir utils.trace), puis rejouée hors ligne avec
+les faux objets de tools.fakes:
+    
+    python -m tools.replay_trace trace.jsonl.gz [--source players.json|naruto_game.db]
+                                 [--salt SEL] [--backend sqlite|json|both]
+                                 [--speed 1] [--sequential] [--seed 0] [--output replay.json]
+
+--source est copié (jamais modifié) avec les identifiants anonymisés par le
+même sel que la trace. --speed 1 respecte le rythme d'origine, 2 va deux
+fois plus vite et 0 enchaîne les commandes au plus vite. Les commandes d'un
+même joueur restent dans l'ordre; celles de joueurs différents se
+chevauchent comme en production. Avec --sequential une seule commande
+tourne à la fois: les tirages aléatoires (graine --seed) sont alors les
+mêmes d'un backend à l'autre et l'état final des joueurs doit être
+identique. Avec --backend both, les deux états finaux sont comparés.
+"""
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from database.records import plain_value
+from tools.bench_commands import peak_rss_mb, percentile
+from utils.trace import anonymize, read_trace
+
+# Commandes qui attendent des réactions ou des messages: impossibles à rejouer
+INTERACTIVE_COMMANDS = {'start'}
+
+# Champs qui dépendent de l'heure du rejeu, ignorés dans la comparaison
+VOLATILE_FIELDS = ('last_daily', 'mission_ends_at', 'daily_ready_at')
+
+
+async def load_players(path: str):
+    """{user_id: Player} d'un players.json (journal compris) ou d'une base SQLite, sans les modifier"""
+    if path.endswith('.json'):
+        from database.json_db import Database
+        source = Database(path)
+        players = {int(user_id): player for user_id, player in source.iter_snapshot()}
+        for user_id, player in source.iter_journal():
+            if player is None:
+                players.pop(int(user_id), None)
+            else:
+                players[int(user_id)] = player
+        return players
+    
+    # Copie cohérente (WAL compris) avant que init_db applique les migrations
+    from database.db_manager import DatabaseManager
+    copy_path = os.path.join(tempfile.mkdtemp(prefix='replay_'), 'source.db')
+    with sqlite3.connect(f'file:{path}?mode=ro', uri=True) as source, sqlite3.connect(copy_path) as copy:
+        source.backup(copy)
+    db = DatabaseManager(copy_path)
+    await db.init_db()
+    try:
+        return {player.user_id: player async for player in db.iter_players()}
+    finally:
+        await db.close()
+
+
+async def copy_storage(backend: str, source: str, salt: bytes):
+    """Écrire les joueurs de `source`, renumérotés comme la trace, dans le stockage du rejeu"""
+    players = [
+        dataclasses.replace(player, user_id=anonymize(user_id, salt))
+        for user_id, player in (await load_players(source)).items()
+    ]
+    if backend == 'json':
+        from database.json_db import Database
+        Database(os.environ['PLAYERS_FILE']).save_players({str(p.user_id): p for p in players})
+        return len(players)
+    
+    from database.db_manager import DatabaseManager
+    db = DatabaseManager(os.environ['DATABASE_PATH'])
+    await db.init_db()
+    for i in range(0, len(players), 5000):
+        await db.upsert_players(players[i:i + 5000])
+    await db.close()
+    return len(players)
+
+
+def decode_value(value):
+    from tools.fakes import FakeUser
+    if isinstance(value, dict) and "@" in value:
+        return FakeUser(value["@"])
+    return value
+
+
+async def replay(bot, events, speed: float, sequential: bool):
+    """Exécuter les commandes de la trace, renvoie les mesures du rejeu"""
+    from tools.fakes import FakeContext, FakeUser, invoke
+    
+    latencies = defaultdict(list)
+    errors = Counter()
+    skipped = Counter()
+    lateness = []
+    previous = {}  # joueur → tâche de sa dernière commande
+    
+    async def run(event, before):
+        if before is not None:
+            await before
+        ctx = FakeContext(bot, FakeUser(event['u']))
+        args = [decode_value(value) for value in event.get('a', ())]
+        kwargs = {name: decode_value(value) for name, value in event.get('k', {}).items()}
+        started = time.perf_counter()
+        try:
+            await invoke(bot, event['c'], ctx, *args, **kwargs)
+        except Exception as e:
+            errors[f"{event['c']}: {type(e).__name__}"] += 1
+        latencies[event['c']].append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    for event in events:
+        if bot.get_command(event['c']) is None or event['c'] in INTERACTIVE_COMMANDS:
+            skipped[event['c']] += 1
+            continue
+        if speed:
+            delay = event['t'] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lateness.append(-delay)
+        if sequential:
+            await run(event, None)
+        else:
+            previous[event['u']] = asyncio.create_task(run(event, previous.get(event['u'])))
+    await asyncio.gather(*previous.values())
+    elapsed = time.perf_counter() - started
+    
+    commands = {}
+    for name, values in latencies.items():
+        values.sort()
+        commands[name] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        }
+    lateness.sort()
+    return {
+        'replayed': sum(len(values) for values in latencies.values()),
+        'elapsed_s': elapsed,
+        'throughput_per_s': sum(len(values) for values in latencies.values()) / elapsed if elapsed else None,
+        # Retard sur l'horaire d'origine: le rejeu ne suit plus le rythme de la trace
+        'late_p95_ms': percentile(lateness, 0.95) * 1000 if lateness else 0.0,
+        'late_max_ms': lateness[-1] * 1000 if lateness else 0.0,
+        'errors': dict(errors),
+        'skipped': dict(skipped),
+        'commands': commands,
+    }
+
+
+def player_state(players):
+    """État comparable des joueurs: {user_id: champs}, sans les champs volatils"""
+    state = {}
+    for user_id, player in sorted(players.items()):
+        fields = player.to_dict()
+        for name in VOLATILE_FIELDS:
+            fields.pop(name, None)
+        state[str(user_id)] = fields
+    return state
+
+
+async def run_worker(args):
+    salt = args.salt.encode()
+    copied = await copy_storage(args.backend, args.source, salt) if args.source else 0
+    
+    import main
+    bot = main.bot
+    await bot.setup_hook()
+    # Les minuteurs (fins de mission) dépendent de l'heure: pas de tirages hors des commandes
+    await bot.timers.stop()
+    random.seed(args.seed)
+    try:
+        result = await replay(bot, read_trace(args.trace), args.speed, args.sequential)
+    finally:
+        await bot.db.close()
+        await bot.loop_monitor.stop()
+    
+    target = os.environ['PLAYERS_FILE'] if args.backend == 'json' else os.environ['DATABASE_PATH']
+    state = player_state(await load_players(target))
+    with open(args.output + '.state.json', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, default=plain_value)
+    
+    digest = hashlib.sha256(
+        json.dumps(state, sort_keys=True, ensure_ascii=False, default=plain_value).encode()
+    ).hexdigest()
+    return dict(
+        result,
+        backend=args.backend,
+        copied_players=copied,
+        final_players=len(state),
+        state_sha256=digest,
+        loop_max_lag_ms=bot.loop_monitor.max_lag * 1000,
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def run_backend(backend, args):
+    """Rejouer dans un processus dédié (main.py choisit son backend à l'import)"""
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND=backend,
+        DATABASE_PATH=os.path.join(workdir, 'replay.db'),
+        PLAYERS_FILE=os.path.join(workdir, 'players.json'),
+    )
+    # Ne pas enregistrer une trace du rejeu lui-même
+    env.pop('TRACE_FILE', None)
+    env.pop('METRICS_TEXTFILE', None)
+    result_path = os.path.join(workdir, 'result.json')
+    command = [sys.executable, '-m', 'tools.replay_trace', args.trace, '--worker',
+               '--backend', backend, '--salt', args.salt, '--speed', str(args.speed),
+               '--seed', str(args.seed), '--output', result_path]
+    if args.source:
+        command += ['--source', os.path.abspath(args.source)]
+    if args.sequential:
+        command.append('--sequential')
+    subprocess.run(command, env=env, check=True)
+    with open(result_path, encoding='utf-8') as f:
+        result = json.load(f)
+    with open(result_path + '.state.json', encoding='utf-8') as f:
+        return result, json.load(f)
+
+
+def compare_states(left, right, limit=10):
+    """Différences entre deux états finaux: [(user_id, champ, valeur gauche, valeur droite)]"""
+    differences = []
+    for user_id in sorted(set(left) | set(right)):
+        a, b = left.get(user_id), right.get(user_id)
+        if a is None or b is None:
+            differences.append((user_id, '(joueur)', a is not None, b is not None))
+            continue
+        for name in a:
+            if a[name] != b.get(name):
+                differences.append((user_id, name, a[name], b.get(name)))
+    for user_id, name, a, b in differences[:limit]:
+        print(f"   ≠ {user_id} {name}: {a!r} / {b!r}")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejouer une trace de commandes")
+    parser.add_argument('trace', help="Trace enregistrée avec TRACE_FILE")
+    parser.add_argument('--source', help="players.json ou base SQLite à copier avant le rejeu")
+    parser.add_argument('--salt', default=os.getenv('TRACE_SALT', ''),
+                        help="Sel d'anonymisation de la trace (TRACE_SALT)")
+    parser.add_argument('--backend', choices=['sqlite', 'json', 'both'], default='both')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Facteur de vitesse (1 = rythme d'origine, 0 = au plus vite)")
+    parser.add_argument('--sequential', action='store_true', help="Une commande à la fois (rejeu déterministe)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='replay.json')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.source and not args.salt:
+        parser.error("--source demande le sel de la trace (--salt ou TRACE_SALT)")
+    
+    if args.worker:
+        result = asyncio.run(run_worker(args))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+    
+    backends = ['json', 'sqlite'] if args.backend == 'both' else [args.backend]
+    results = {}
+    states = {}
+    for backend in backends:
+        print(f"▶️ Rejeu sur {backend}...")
+        results[backend], states[backend] = run_backend(backend, args)
+        run = results[backend]
+        slowest = max(run['commands'].items(), key=lambda item: item[1]['p95_ms'], default=None)
+        print(f"   {run['replayed']} commandes en {run['elapsed_s']:.2f}s "
+              f"({run['throughput_per_s'] or 0:.0f}/s), retard max {run['late_max_ms']:.0f} ms, "
+              f"{sum(run['errors'].values())} erreurs, {run['final_players']} joueurs"
+              + (f", p95 max {slowest[1]['p95_ms']:.2f} ms ({slowest[0]})" if slowest else ""))
+    
+    mismatches = 0
+    if len(backends) == 2:
+        differences = compare_states(states['json'], states['sqlite'])
+        mismatches = len(differences)
+        if mismatches:
+            note = "" if args.sequential else " (sans --sequential, les tirages aléatoires diffèrent)"
+            print(f"❌ États finaux différents: {mismatches} écart(s){note}")
+        else:
+            print("✅ États finaux identiques sur les deux backends")
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'trace': args.trace, 'speed': args.speed, 'sequential': args.sequential,
+                   'seed': args.seed, 'mismatches': mismatches, 'runs': results}, f, indent=2)
+    print(f"✅ Résultats écrits dans {args.output}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
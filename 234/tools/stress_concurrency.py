@@ -0,0 +1,147 @@
+"""Test de charge: aucune mise à jour perdue sous commandes concurrentes
+
+Lance en parallèle des milliers de `!acheter élixir de sagesse` (100 Ryō
+chacun) répartis sur quelques joueurs, puis vérifie que le Ryō final de
+chaque joueur correspond exactement au nombre d'achats réussis.
+    
+    python -m tools.stress_concurrency [--backend sqlite|json] [--players 20] [--commands 5000]
+                                       [--processes 1]
+
+Avec --processes N (SQLite), les achats sont répartis sur N processus qui
+partagent la base et le fichier de verrous, comme les processus de cluster.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def create_players(args):
+    import main
+    from tools.fakes import FakeContext, FakeUser, invoke
+    
+    users = [FakeUser(1000 + i) for i in range(args.players)]
+    for user in users:
+        await invoke(main.bot, 'creer', FakeContext(main.bot, user), 'Konoha')
+        await main.db.update_player(user.id, ryo=100 * args.commands)
+    return users
+
+
+async def buy_concurrently(users, count):
+    """Lancer `count` achats simultanés, renvoie les achats réussis par joueur"""
+    import main
+    from tools.fakes import FakeContext, invoke
+    
+    purchases = {user.id: 0 for user in users}
+    
+    async def buy(user):
+        ctx = FakeContext(main.bot, user, keep_messages=True)
+        await invoke(main.bot, 'acheter', ctx, item_name='élixir de sagesse')
+        if ctx.messages and ctx.messages[0].content.startswith('✅'):
+            purchases[user.id] += 1
+    
+    await asyncio.gather(*[buy(random.choice(users)) for _ in range(count)])
+    return purchases
+
+
+def run_processes(args):
+    """Répartir les achats sur args.processes processus, renvoie les achats réussis"""
+    workdir = os.path.dirname(os.environ['DATABASE_PATH'])
+    env = dict(os.environ, PLAYER_LOCK_FILE=os.path.join(workdir, 'players.locks'))
+    workers = []
+    for i in range(args.processes):
+        output = os.path.join(workdir, f'worker{i}.json')
+        count = args.commands // args.processes + (1 if i < args.commands % args.processes else 0)
+        command = [sys.executable, '-m', 'tools.stress_concurrency', '--worker', '--output', output,
+                   '--players', str(args.players), '--commands', str(count)]
+        workers.append((subprocess.Popen(command, env=env), output))
+    
+    purchases = {}
+    for process, output in workers:
+        if process.wait() != 0:
+            raise RuntimeError(f"Processus {process.pid} terminé avec le code {process.returncode}")
+        with open(output, encoding='utf-8') as f:
+            for user_id, count in json.load(f).items():
+                purchases[int(user_id)] = purchases.get(int(user_id), 0) + count
+    return purchases
+
+
+async def run_worker(args):
+    """Un processus parmi --processes: achats sur les joueurs déjà créés"""
+    import main
+    from database.player_locks import player_locks
+    from tools.fakes import FakeUser
+    
+    player_locks.share_between_processes(os.environ['PLAYER_LOCK_FILE'])
+    await main.db.init_db()
+    try:
+        purchases = await buy_concurrently([FakeUser(1000 + i) for i in range(args.players)], args.commands)
+    finally:
+        await main.db.close()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(purchases, f)
+
+
+async def run(args) -> bool:
+    import main
+    
+    db = main.db
+    await db.init_db()
+    await main.bot.load_extension('cogs.player')
+    # Joueurs, nombre total d'achats: chacun peut acheter jusqu'à `commands` élixirs
+    users = await create_players(args)
+    
+    started = time.perf_counter()
+    if args.processes > 1:
+        purchases = await asyncio.to_thread(run_processes, args)
+    else:
+        purchases = await buy_concurrently(users, args.commands)
+    elapsed = time.perf_counter() - started
+    
+    lost = 0
+    for user in users:
+        player = await db.get_player(user.id)
+        expected = 100 * args.commands - 100 * purchases.get(user.id, 0)
+        if player['ryo'] != expected:
+            lost += abs(player['ryo'] - expected) // 100
+            print(f"❌ Joueur {user.id}: {player['ryo']} Ryō au lieu de {expected}")
+    
+    await db.close()
+    print(f"{args.commands} commandes sur {args.players} joueurs et {args.processes} processus en {elapsed:.2f}s "
+          f"({args.commands / elapsed:.0f}/s), mises à jour perdues: {lost}")
+    return lost == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge des verrous par joueur")
+    parser.add_argument('--backend', choices=['sqlite', 'json'], default='sqlite')
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--commands', type=int, default=5000)
+    parser.add_argument('--processes', type=int, default=1, help="Processus partageant la base (SQLite)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        asyncio.run(run_worker(args))
+        return
+    if args.processes > 1 and args.backend != 'sqlite':
+        parser.error("--processes demande --backend sqlite")
+    
+    # Stockage jetable, configuré avant l'import de main.py
+    workdir = tempfile.mkdtemp(prefix='stress_')
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'stress.db')
+    os.environ['PLAYERS_FILE'] = os.path.join(workdir, 'players.json')
+    
+    ok = asyncio.run(run(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from collections import Counter
+from typing import Callable, Dict, Hashable, Tuple
+
+import discord
+
+
+class EmbedCache:
+    """Embeds des commandes de catalogue construits une seule fois
+    
+    !help, !clans, !shop et !missions affichent toujours le même contenu:
+    chaque embed est construit au premier appel puis resservi tel quel.
+    Rien n'est jamais invalidé: les catalogues (CLANS, ITEM_REGISTRY,
+    MISSION_CATALOG, commandes) sont fixés au chargement et immuables pendant
+    toute la vie du processus; les changer demande un redémarrage. Les embeds
+    servis sont partagés entre les appels: ne jamais les modifier après get().
+    
+    Un embed peut dépendre de paramètres (palier de niveau, page): get(name,
+    *args) appelle alors le constructeur avec ces arguments et garde un embed
+    par combinaison. Ils doivent donc prendre peu de valeurs différentes.
+    """
+    
+    def __init__(self):
+        self._builders: Dict[str, Callable[..., discord.Embed]] = {}
+        self._embeds: Dict[Tuple[str, Tuple[Hashable, ...]], discord.Embed] = {}
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+    
+    def builder(self, name: str):
+        """Décorateur: enregistrer la fonction qui construit l'embed `name`"""
+        def decorator(build):
+            self._builders[name] = build
+            return build
+        return decorator
+    
+    def get(self, name: str, *args: Hashable) -> discord.Embed:
+        key = (name, args)
+        embed = self._embeds.get(key)
+        if embed is not None:
+            self.hits[name] += 1
+            return embed
+        self.misses[name] += 1
+        embed = self._embeds[key] = self._builders[name](*args)
+        return embed
+    
+    def summary(self) -> str:
+        hits = sum(self.hits.values())
+        total = hits + sum(self.misses.values())
+        ratio = hits / total if total else 0.0
+        details = ", ".join(f"{name} {self.hits[name]}/{self.misses[name]}" for name in self._builders)
+        return f"{hits}/{total} embeds servis depuis le cache ({ratio:.0%}); succès/échecs: {details}"
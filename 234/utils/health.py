@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+
+class ShardHealth:
+    """État de santé des shards d'un processus, écrit dans un fichier JSON
+    
+    Suit les évènements de connexion de chaque shard (connect, ready,
+    resumed, disconnect) et réécrit toutes les `interval` secondes un
+    fichier lu par cluster.py: latence, guildes, dernier évènement par
+    shard, retard de la boucle. Un fichier qui n'est plus mis à jour
+    signale un processus bloqué.
+    """
+    
+    def __init__(self, bot, path: str, interval: float = 10.0, cluster_id: Optional[int] = None):
+        self.bot = bot
+        self.path = path
+        self.interval = interval
+        self.cluster_id = cluster_id
+        self.started_at = time.time()
+        self.shards: Dict[int, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        for event in ('connect', 'ready', 'resumed', 'disconnect'):
+            bot.add_listener(self._listener(event), f'on_shard_{event}')
+    
+    def _listener(self, event: str):
+        async def listener(shard_id):
+            state = self.shards.setdefault(shard_id, {'disconnects': 0})
+            state['status'] = 'disconnected' if event == 'disconnect' else event
+            state['since'] = time.time()
+            if event == 'disconnect':
+                state['disconnects'] += 1
+        return listener
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write(stopping=True)
+    
+    def report(self) -> Dict[str, Any]:
+        bot = self.bot
+        guilds: Dict[int, int] = {}
+        for guild in bot.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        
+        shards = {}
+        for shard_id in bot.shard_ids or sorted(self.shards):
+            shard = bot.get_shard(shard_id)
+            state = self.shards.get(shard_id, {})
+            latency = shard.latency if shard is not None else None
+            shards[str(shard_id)] = {
+                'status': state.get('status', 'starting'),
+                'since': state.get('since'),
+                'disconnects': state.get('disconnects', 0),
+                'latency_ms': latency * 1000 if latency is not None and latency != float('inf') else None,
+                'ratelimited': shard.is_ws_ratelimited() if shard is not None else False,
+                'guilds': guilds.get(shard_id, 0),
+            }
+        return {
+            'cluster_id': self.cluster_id,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'updated_at': time.time(),
+            'ready': bot.is_ready(),
+            'shard_count': bot.shard_count,
+            'shards': shards,
+            'loop_lag_ms': bot.loop_monitor.last_lag * 1000,
+            'loop_max_lag_ms': bot.loop_monitor.max_lag * 1000,
+        }
+    
+    def write(self, stopping: bool = False):
+        report = self.report()
+        report['stopping'] = stopping
+        tmp_file = self.path + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f)
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            print(f"⚠️ Impossible d'écrire l'état de santé dans {self.path}: {e}")
+    
+    async def _run(self):
+        while True:
+            self.write()
+            await asyncio.sleep(self.interval)
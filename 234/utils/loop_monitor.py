@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import Optional
+
+from utils.metrics import LOOP_LAG
+
+
+class LoopLagMonitor:
+    """Mesurer le temps pendant lequel la boucle asyncio est bloquée
+    
+    Une tâche dort `interval` secondes en boucle: tout retard au réveil est
+    du temps où la boucle n'a pas pu tourner (JSON parsé dans un handler,
+    E/S synchrones...). Au-delà de `stall_threshold`, le retard compte comme
+    un blocage: c'est ce qui fait sauter les heartbeats de la gateway.
+    """
+    
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.25):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.samples = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples += 1
+            self.last_lag = lag
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                self.stall_time += lag
+                print(f"⚠️ Boucle bloquée pendant {lag * 1000:.0f} ms")
+    
+    def summary(self) -> str:
+        return (f"retard actuel {self.last_lag * 1000:.1f} ms, max {self.max_lag * 1000:.1f} ms, "
+                f"{self.stalls} blocages ({self.stall_time:.2f}s au total)")
@@ -0,0 +1,288 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bornes (secondes) des histogrammes de durée: de 0,1 ms à 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Bornes (octets) des tailles d'écriture: de 64 o à 64 Mo
+BYTES_BUCKETS = tuple(64 * 4 ** i for i in range(11))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '', const: str = '') -> str:
+    pairs = [const] if const else []
+    pairs += [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Compteur monotone, une série par combinaison d'étiquettes"""
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+    
+    def series(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return sorted(self._values.items())
+    
+    def render(self, const: str = '') -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels, const=const)} {_format_value(value)}'
+                for labels, value in self.series()]
+
+
+class Gauge:
+    """Valeur instantanée (taille d'une file), une série par combinaison d'étiquettes"""
+    
+    kind = 'gauge'
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+    
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+    
+    def render(self, const: str = '') -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels, const=const)} {_format_value(value)}'
+                for labels, value in sorted(self._values.items())]
+
+
+class _Series:
+    __slots__ = ('counts', 'sum', 'count')
+    
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Histogramme à la Prometheus: nombre d'observations par borne, somme et total
+    
+    Les quantiles sont estimés par interpolation linéaire dans le seau qui
+    les contient, comme histogram_quantile() côté Prometheus.
+    """
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+        # Les observations peuvent venir du thread de stockage
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Series(len(self.buckets))
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+    
+    @contextmanager
+    def time(self, *labels: str):
+        """Mesurer la durée du bloc `with`, exceptions comprises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+    
+    def labels(self) -> List[Tuple[str, ...]]:
+        with self._lock:
+            return sorted(self._series)
+    
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series.count if series is not None else 0
+    
+    def total(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series.sum if series is not None else 0.0
+    
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None or not series.count:
+                return None
+            counts = list(series.counts)
+            total = series.count
+        
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                upper = self.buckets[i]
+                lower = self.buckets[i - 1] if i else 0.0
+                if upper == float('inf'):
+                    # Au-delà de la dernière borne: on ne peut rien dire de plus précis
+                    return lower
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-2]
+    
+    def render(self, const: str = '') -> List[str]:
+        lines = []
+        with self._lock:
+            snapshot = [(labels, list(s.counts), s.sum, s.count) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le, const)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels, const=const)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels, const=const)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Ensemble des métriques exportées, au format texte de Prometheus
+    
+    Les étiquettes constantes (const_labels) sont ajoutées à toutes les
+    séries: elles distinguent les processus d'un cluster qui exportent les
+    mêmes métriques.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self.const_labels: Dict[str, str] = {}
+    
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrique déjà enregistrée: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+    
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+    
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+    
+    def render(self) -> str:
+        const = ','.join(f'{name}="{_escape(value)}"' for name, value in self.const_labels.items())
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(const))
+        return '\n'.join(lines) + '\n'
+    
+    def write_textfile(self, path: str):
+        """Écrire les métriques pour le textfile collector de node_exporter
+        
+        Le fichier est remplacé de façon atomique: le collecteur ne lit
+        jamais un fichier à moitié écrit.
+        """
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_file, path)
+
+
+class TextfileWriter:
+    """Réécrire le textfile Prometheus toutes les `interval` secondes"""
+    
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 15.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Arrêter la tâche et écrire une dernière fois les valeurs finales"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._write()
+    
+    def _write(self):
+        try:
+            self.registry.write_textfile(self.path)
+        except OSError as e:
+            print(f"⚠️ Impossible d'écrire les métriques dans {self.path}: {e}")
+    
+    async def _run(self):
+        while True:
+            self._write()
+            await asyncio.sleep(self.interval)
+
+
+# Métriques du bot, partagées par main.py, le stockage et les moniteurs
+REGISTRY = MetricsRegistry()
+
+COMMAND_LATENCY = REGISTRY.histogram(
+    'ninjabot_command_seconds', "Durée d'exécution des commandes", ('command',))
+COMMAND_ERRORS = REGISTRY.counter(
+    'ninjabot_command_errors_total', "Commandes terminées par une erreur", ('command', 'error'))
+STORAGE_LATENCY = REGISTRY.histogram(
+    'ninjabot_storage_seconds', "Durée des opérations de stockage", ('backend', 'op'))
+STORAGE_BYTES = REGISTRY.histogram(
+    'ninjabot_storage_write_bytes', "Taille des écritures de stockage", ('backend', 'op'), BYTES_BUCKETS)
+DISCORD_SEND_LATENCY = REGISTRY.histogram(
+    'ninjabot_discord_send_seconds', "Durée des envois de messages à Discord")
+RATE_LIMITED = REGISTRY.counter(
+    'ninjabot_rate_limited_total', "Commandes refusées par le limiteur de débit", ('command', 'budget'))
+OUTBOUND_QUEUED = REGISTRY.gauge(
+    'ninjabot_outbound_queued', "Envois et réactions en attente dans la file sortante")
+OUTBOUND_WAIT = REGISTRY.histogram(
+    'ninjabot_outbound_queue_seconds', "Attente dans la file sortante avant l'envoi", ('kind',))
+DISCORD_RATE_LIMIT_WAIT = REGISTRY.histogram(
+    'ninjabot_discord_ratelimit_wait_seconds', "Pauses imposées par les réponses 429 de Discord", ('scope',),
+    (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+LOOP_LAG = REGISTRY.histogram(
+    'ninjabot_event_loop_lag_seconds', "Retard de réveil de la boucle asyncio")
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+import discord
+
+from utils.metrics import DISCORD_RATE_LIMIT_WAIT, DISCORD_SEND_LATENCY, OUTBOUND_QUEUED, OUTBOUND_WAIT
+
+# Requêtes simultanées par file: les messages d'un salon partent dans l'ordre,
+# les réactions d'un salon sont envoyées ensemble et discord.py les étale
+# dans le seau de rate limit de la route (il les sert dans l'ordre d'arrivée)
+LANE_CONCURRENCY = {
+    'messages': 1,
+    'dm': 1,
+    'reactions': 5,
+}
+
+Action = Callable[[], Awaitable[Any]]
+
+
+class _Lane:
+    __slots__ = ('pending', 'in_flight', 'concurrency')
+    
+    def __init__(self, concurrency: int):
+        self.pending: Deque[Tuple[Action, asyncio.Future, float]] = deque()
+        self.in_flight = 0
+        self.concurrency = concurrency
+
+
+class RateLimitLogHandler(logging.Handler):
+    """Relever les pauses après une réponse 429, que discord.py ne signale que dans ses logs
+    
+    Les pauses préventives (seau vide avant l'envoi) ne sont pas journalisées
+    par discord.py: elles restent comprises dans la durée des envois.
+    """
+    
+    def emit(self, record: logging.LogRecord):
+        if record.levelno != logging.WARNING or not record.args:
+            return
+        try:
+            if record.msg.startswith('We are being rate limited'):
+                DISCORD_RATE_LIMIT_WAIT.observe(float(record.args[2]), 'route')
+            elif record.msg.startswith('Global rate limit'):
+                DISCORD_RATE_LIMIT_WAIT.observe(float(record.args[0]), 'global')
+        except (AttributeError, IndexError, TypeError, ValueError):
+            pass
+
+
+class OutboundDispatcher:
+    """File des envois et réactions vers Discord, hors des commandes
+    
+    Une commande dépose ses réponses dans la file et se termine aussitôt:
+    verrous et données du joueur sont libérés sans attendre le réseau ni
+    les rate limits de Discord. Chaque route (salon, message privé) a sa
+    file, servie avec LANE_CONCURRENCY requêtes à la fois; les routes
+    avancent en parallèle dans la limite de `max_in_flight` requêtes. Au-delà
+    de `max_queued` requêtes en attente, le dépôt attend qu'une place se
+    libère.
+    
+    Les erreurs d'envoi (salon supprimé, messages privés fermés) sont
+    comptées et journalisées; elles restent lisibles dans le futur renvoyé.
+    """
+    
+    def __init__(self, max_in_flight: int = 50, max_queued: int = 5000):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queued = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._room = asyncio.Event()
+        self._room.set()
+        self._log_handler: Optional[RateLimitLogHandler] = None
+    
+    def __len__(self) -> int:
+        return self.queued
+    
+    def start(self):
+        if self._log_handler is None:
+            self._log_handler = RateLimitLogHandler(logging.WARNING)
+            logging.getLogger('discord.http').addHandler(self._log_handler)
+    
+    async def submit(self, kind: str, route: Hashable, action: Action) -> asyncio.Future:
+        """Déposer `action` (appelée plus tard, une fois servie) dans la file `(kind, route)`"""
+        while self.queued >= self.max_queued:
+            self._room.clear()
+            await self._room.wait()
+        key = (kind, route)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane(LANE_CONCURRENCY.get(kind, 1))
+        future = asyncio.get_running_loop().create_future()
+        lane.pending.append((action, future, time.perf_counter()))
+        self._set_queued(self.queued + 1)
+        self._pump(key, lane)
+        return future
+    
+    async def send(self, channel: discord.abc.Messageable, *args, **kwargs) -> asyncio.Future:
+        """Envoyer un message dans un salon; le futur donne le Message envoyé"""
+        return await self.submit('messages', channel.id, lambda: _timed_send(channel, *args, **kwargs))
+    
+    async def react(self, message: discord.Message, emojis) -> List[asyncio.Future]:
+        """Ajouter des réactions à un message, envoyées ensemble"""
+        return [await self.submit('reactions', message.channel.id, lambda emoji=emoji: message.add_reaction(emoji))
+                for emoji in emojis]
+    
+    def _pump(self, key: Hashable, lane: _Lane):
+        while lane.pending and lane.in_flight < lane.concurrency:
+            action, future, queued_at = lane.pending.popleft()
+            lane.in_flight += 1
+            task = asyncio.create_task(self._run(key, lane, action, future, queued_at))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, key: Tuple[str, Hashable], lane: _Lane, action: Action, future: asyncio.Future,
+                   queued_at: float):
+        try:
+            async with self._slots:
+                self._set_queued(self.queued - 1)
+                OUTBOUND_WAIT.observe(time.perf_counter() - queued_at, key[0])
+                self.in_flight += 1
+                try:
+                    result = await action()
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                        # Lu ici: un futur que personne n'attend ne doit pas avertir
+                        future.exception()
+                    if not isinstance(e, discord.Forbidden):
+                        print(f"⚠️ Envoi {key[0]} vers {key[1]} impossible: {e}")
+                else:
+                    self.sent += 1
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            lane.in_flight -= 1
+            if lane.pending:
+                self._pump(key, lane)
+            elif not lane.in_flight:
+                self._lanes.pop(key, None)
+    
+    def _set_queued(self, queued: int):
+        self.queued = queued
+        OUTBOUND_QUEUED.set(queued)
+        if queued < self.max_queued:
+            self._room.set()
+    
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Attendre la fin des envois en file (arrêt du bot), au plus `timeout` secondes"""
+        deadline = time.monotonic() + timeout
+        while self._tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.wait(set(self._tasks), timeout=remaining)
+        return True
+    
+    async def stop(self, timeout: float = 10.0):
+        if not await self.drain(timeout):
+            print(f"⚠️ {self.queued + self.in_flight} envoi(s) abandonné(s) à l'arrêt")
+            for task in list(self._tasks):
+                task.cancel()
+        if self._log_handler is not None:
+            logging.getLogger('discord.http').removeHandler(self._log_handler)
+            self._log_handler = None
+    
+    def summary(self) -> str:
+        waits = [f"{kind} p95 {OUTBOUND_WAIT.quantile(0.95, kind) * 1000:.1f} ms"
+                 for (kind,) in OUTBOUND_WAIT.labels()]
+        limited = [f"{scope} {DISCORD_RATE_LIMIT_WAIT.count(scope)} fois, {DISCORD_RATE_LIMIT_WAIT.total(scope):.1f}s"
+                   for (scope,) in DISCORD_RATE_LIMIT_WAIT.labels()]
+        return (f"{self.queued} en file, {self.in_flight} en cours sur {len(self._lanes)} routes, "
+                f"{self.sent} envoyés, {self.failed} échecs\n"
+                f"Attente en file: {', '.join(waits) or 'aucune'}\n"
+                f"Rate limits Discord (429): {', '.join(limited) or 'aucun'}")
+
+
+async def _timed_send(channel: discord.abc.Messageable, *args, **kwargs) -> discord.Message:
+    with DISCORD_SEND_LATENCY.time():
+        return await channel.send(*args, **kwargs)
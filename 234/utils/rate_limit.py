@@ -0,0 +1,150 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from discord.ext import commands
+
+from utils.metrics import RATE_LIMITED
+
+SCOPES = ('user', 'guild')
+
+
+@dataclass(frozen=True)
+class Limit:
+    """`rate` appels par période de `per` secondes, par joueur ou par guilde"""
+    rate: int
+    per: float
+    scope: str = 'user'
+    
+    @property
+    def interval(self) -> float:
+        return self.per / self.rate
+
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, budget: str, retry_after: float, warn: bool):
+        super().__init__(f"Budget '{budget}' épuisé, réessayer dans {retry_after:.1f}s")
+        self.budget = budget
+        self.retry_after = retry_after
+        self.warn = warn  # Premier refus de la fenêtre: prévenir le joueur une seule fois
+
+
+class _Budget:
+    def __init__(self, name: str, limit: Limit, commands: Optional[Tuple[str, ...]]):
+        self.name = name
+        self.limit = limit
+        self.commands = commands  # None: toutes les commandes
+        # Un seul flottant par joueur ou guilde (GCRA): l'instant où le seau
+        # sera de nouveau plein. Absent = plein.
+        self.full_at: Dict[int, float] = {}
+        self.warned: Dict[int, float] = {}
+
+
+class RateLimiter:
+    """Seaux à jetons en mémoire, vérifiés avant tout accès au stockage
+    
+    Un budget a une limite (Limit) et s'applique à une liste de commandes
+    (toutes par défaut); plusieurs commandes peuvent partager un budget, et
+    une commande peut dépendre de plusieurs budgets (par joueur et par
+    guilde): l'appel n'est accepté que si tous ont un jeton, et rien n'est
+    consommé s'il est refusé.
+    
+    Chaque seau tient dans un flottant (algorithme GCRA, équivalent à un
+    seau à jetons): l'instant où il sera de nouveau plein. Un seau plein
+    n'apporte rien: il est oublié au nettoyage suivant, ce qui borne la
+    mémoire aux joueurs actifs.
+    """
+    
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self.allowed = 0
+        self.rejected = 0
+        self._budgets: Dict[str, _Budget] = {}
+        self._by_command: Dict[str, List[_Budget]] = {}
+        self._global: List[_Budget] = []
+        self._next_sweep = time.monotonic() + sweep_interval
+    
+    def add(self, name: str, limit: Limit, commands: Optional[Iterable[str]] = None):
+        if limit.scope not in SCOPES:
+            raise ValueError(f"Portée inconnue: {limit.scope}")
+        budget = _Budget(name, limit, tuple(commands) if commands is not None else None)
+        self._budgets[name] = budget
+        self._index()
+    
+    def configure(self, spec: str):
+        """Remplacer des limites: "boutique=5/30,guilde=120/10" (appels/secondes)"""
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            name, _, value = item.partition('=')
+            budget = self._budgets.get(name.strip())
+            if budget is None:
+                raise ValueError(f"Budget inconnu: {name}")
+            rate, _, per = value.partition('/')
+            budget.limit = Limit(int(rate), float(per), budget.limit.scope)
+    
+    def _index(self):
+        self._global = [budget for budget in self._budgets.values() if budget.commands is None]
+        self._by_command = {}
+        for budget in self._budgets.values():
+            for command in budget.commands or ():
+                self._by_command.setdefault(command, []).append(budget)
+    
+    def budgets(self, command: str) -> List[_Budget]:
+        return self._by_command.get(command, []) + self._global
+    
+    def hit(self, command: str, user_id: int, guild_id: Optional[int] = None,
+            now: Optional[float] = None) -> Optional[RateLimited]:
+        """Consommer un jeton de chaque budget de la commande, ou renvoyer le refus"""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.sweep(now)
+        
+        accepted = []
+        for budget in self.budgets(command):
+            key = user_id if budget.limit.scope == 'user' else guild_id
+            if key is None:
+                # Message privé: pas de budget de guilde
+                continue
+            limit = budget.limit
+            full_at = max(budget.full_at.get(key, now), now)
+            # Le seau contient rate jetons: refus si ajouter un appel le ferait déborder
+            if full_at + limit.interval - now > limit.per:
+                retry_after = full_at + limit.interval - now - limit.per
+                self.rejected += 1
+                RATE_LIMITED.inc(command, budget.name)
+                warn = budget.warned.get(key, 0.0) <= now
+                if warn:
+                    budget.warned[key] = now + retry_after
+                return RateLimited(budget.name, retry_after, warn)
+            accepted.append((budget, key, full_at + limit.interval))
+        
+        for budget, key, full_at in accepted:
+            budget.full_at[key] = full_at
+        self.allowed += 1
+        return None
+    
+    def sweep(self, now: Optional[float] = None):
+        """Oublier les seaux pleins et les avertissements expirés"""
+        now = time.monotonic() if now is None else now
+        for budget in self._budgets.values():
+            budget.full_at = {key: full_at for key, full_at in budget.full_at.items() if full_at > now}
+            budget.warned = {key: until for key, until in budget.warned.items() if until > now}
+        self._next_sweep = now + self.sweep_interval
+    
+    def __len__(self) -> int:
+        """Nombre de seaux en mémoire"""
+        return sum(len(budget.full_at) for budget in self._budgets.values())
+    
+    async def check(self, ctx) -> bool:
+        """Check global du bot (bot.check_once): avant la commande et ses lectures"""
+        guild = getattr(ctx, 'guild', None)
+        refusal = self.hit(ctx.command.qualified_name, ctx.author.id, guild.id if guild is not None else None)
+        if refusal is not None:
+            raise refusal
+        return True
+    
+    def summary(self) -> str:
+        total = self.allowed + self.rejected
+        shed = f"{self.rejected} refusés sur {total} ({self.rejected / total:.1%})" if total else "Aucun appel"
+        limits = ", ".join(f"{budget.name} {budget.limit.rate}/{budget.limit.per:g}s ({budget.limit.scope})"
+                           for budget in self._budgets.values())
+        return f"{shed}, {len(self)} seaux en mémoire\n{limits}"
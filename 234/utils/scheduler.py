@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import time
+import traceback
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Fonction appelée avec les clés échues d'un même type
+TimerHandler = Callable[[List[Hashable]], Awaitable[None]]
+
+
+class TimerScheduler:
+    """Minuteurs datés (missions, récompense quotidienne) dans un tas binaire
+    
+    Un minuteur est un couple (type, clé), par exemple ('mission', user_id),
+    avec une échéance en secondes depuis l'epoch (time.time()): la même
+    valeur est stockée dans la fiche du joueur, ce qui permet de reconstruire
+    le tas au démarrage (load). Reprogrammer un minuteur remplace le
+    précédent; annuler ou remplacer ne touche pas au tas: l'ancienne entrée
+    est ignorée quand elle en sort, et le tas est reconstruit quand les
+    entrées mortes dépassent la moitié.
+    
+    Une seule tâche dort jusqu'à la prochaine échéance. Les minuteurs échus
+    sont passés par lots (au plus batch_size clés) à la fonction enregistrée
+    pour leur type, qui doit revérifier l'état du joueur: un minuteur peut
+    sortir après une annulation faite par un autre processus du cluster.
+    """
+    
+    def __init__(self, batch_size: int = 500, max_sleep: float = 60.0):
+        self.batch_size = batch_size
+        # Réveil périodique même sans échéance proche (horloge système modifiée)
+        self.max_sleep = max_sleep
+        self.fired = 0
+        self.batches = 0
+        self._heap: List[Tuple[float, str, Hashable]] = []
+        self._due: Dict[str, Dict[Hashable, float]] = {}
+        self._handlers: Dict[str, TimerHandler] = {}
+        self._stale = 0
+        # Futur sur lequel dort la tâche (asyncio.wait_for peut avaler une annulation)
+        self._wakeup: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def register(self, kind: str, handler: TimerHandler):
+        self._handlers[kind] = handler
+        self._due.setdefault(kind, {})
+    
+    def handler(self, kind: str):
+        """Décorateur: enregistrer la fonction appelée avec les clés échues de `kind`"""
+        def decorator(function: TimerHandler) -> TimerHandler:
+            self.register(kind, function)
+            return function
+        return decorator
+    
+    def __len__(self) -> int:
+        return sum(len(due) for due in self._due.values())
+    
+    def pending(self, kind: str) -> int:
+        return len(self._due.get(kind, ()))
+    
+    def due_at(self, kind: str, key: Hashable) -> Optional[float]:
+        return self._due.get(kind, {}).get(key)
+    
+    def schedule(self, kind: str, key: Hashable, due: float):
+        timers = self._due.setdefault(kind, {})
+        if key in timers:
+            self._stale += 1
+            self._compact()
+        timers[key] = due
+        heapq.heappush(self._heap, (due, kind, key))
+        if self._heap[0][0] == due:
+            # Nouvelle première échéance: la tâche dort peut-être trop longtemps
+            self._wake()
+    
+    def cancel(self, kind: str, key: Hashable):
+        if self._due.get(kind, {}).pop(key, None) is not None:
+            self._stale += 1
+            self._compact()
+    
+    def load(self, kind: str, entries: Iterable[Tuple[Hashable, float]]):
+        """Ajouter en bloc les minuteurs lus dans le stockage (un seul heapify)"""
+        timers = self._due.setdefault(kind, {})
+        for key, due in entries:
+            if key in timers:
+                self._stale += 1
+            timers[key] = due
+            self._heap.append((due, kind, key))
+        heapq.heapify(self._heap)
+        self._wake()
+    
+    def _wake(self):
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+    
+    def _compact(self):
+        if self._stale > 1024 and self._stale > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if self._due[entry[1]].get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
+            self._stale = 0
+    
+    def pop_due(self, now: float) -> Dict[str, List[Hashable]]:
+        """Retirer les minuteurs échus à `now`: {type: [clés]}, au plus batch_size au total"""
+        batch: Dict[str, List[Hashable]] = {}
+        count = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now and count < self.batch_size:
+            due, kind, key = heapq.heappop(heap)
+            timers = self._due[kind]
+            if timers.get(key) != due:
+                # Entrée annulée ou remplacée
+                self._stale -= 1
+                continue
+            del timers[key]
+            batch.setdefault(kind, []).append(key)
+            count += 1
+        return batch
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            batch = self.pop_due(time.time())
+            if batch:
+                self.batches += 1
+                for kind, keys in batch.items():
+                    self.fired += len(keys)
+                    handler = self._handlers.get(kind)
+                    if handler is None:
+                        continue
+                    try:
+                        await handler(keys)
+                    except Exception:
+                        print(f"⚠️ Minuteurs '{kind}' en erreur ({len(keys)} clés):")
+                        traceback.print_exc()
+                continue
+            
+            timeout = self.max_sleep
+            if self._heap:
+                timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+            loop = asyncio.get_running_loop()
+            self._wakeup = loop.create_future()
+            timer = loop.call_later(timeout, self._wake)
+            try:
+                await self._wakeup
+            finally:
+                timer.cancel()
+                self._wakeup = None
+    
+    def summary(self) -> str:
+        pending = ", ".join(f"{kind}: {len(timers)}" for kind, timers in sorted(self._due.items()))
+        next_due = max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+        return (f"En attente: {pending or 'aucun'}\n{self.fired} déclenchés en {self.batches} lots"
+                + (f", prochain dans {next_due:.0f}s" if next_due is not None else ""))
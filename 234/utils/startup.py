@@ -0,0 +1,43 @@
+import time
+from typing import List, Optional, Tuple
+
+
+class StartupReport:
+    """Durée de chaque phase du démarrage du bot
+    
+    Chaque appel à mark() clôt la phase en cours: sa durée court depuis la
+    marque précédente (ou depuis `started`, pris au tout début de main.py
+    pour compter les imports). finish() clôt la dernière phase au premier
+    on_ready; les reconnexions suivantes sont ignorées.
+    """
+    
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: List[Tuple[str, float, str]] = []
+        self.finished = False
+        self._last = self.started
+    
+    def mark(self, phase: str, detail: str = ''):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last, detail))
+        self._last = now
+    
+    def finish(self, phase: str, detail: str = '') -> bool:
+        """Clore la dernière phase, une seule fois (renvoie False ensuite)"""
+        if self.finished:
+            return False
+        self.mark(phase, detail)
+        self.finished = True
+        return True
+    
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+    
+    def summary(self) -> str:
+        lines = [
+            f"{phase}: {duration:.2f}s" + (f" ({detail})" if detail else '')
+            for phase, duration, detail in self.phases
+        ]
+        lines.append(f"total: {self.total:.2f}s" + ('' if self.finished else ' (en cours)'))
+        return "\n".join(lines)
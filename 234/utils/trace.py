@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, Optional
+
+TRACE_VERSION = 1
+
+# Écrire le tampon sur disque au plus tard toutes les FLUSH_INTERVAL secondes
+FLUSH_INTERVAL = 1.0
+
+
+def anonymize(user_id: int, salt: bytes) -> int:
+    """Identifiant stable et anonyme (HMAC-SHA256 tronqué à 56 bits)
+    
+    Le même sel donne toujours le même identifiant: un joueur garde son
+    identité d'une commande à l'autre, et une copie du stockage peut être
+    renumérotée de la même façon pour rejouer la trace.
+    """
+    digest = hmac.new(salt, str(int(user_id)).encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:7], 'big')
+
+
+def encode_value(value: Any, salt: bytes) -> Any:
+    """Argument de commande → JSON (les membres Discord sont anonymisés)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, 'id'):
+        return {"@": anonymize(value.id, salt)}
+    return str(value)
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class TraceRecorder:
+    """Enregistrer chaque commande invoquée dans un fichier de trace
+    
+    Une ligne JSON par commande, après la conversion des arguments:
+    {"t": secondes depuis le début, "u": joueur anonymisé, "c": commande,
+    "a": arguments positionnels, "k": arguments nommés}. La première ligne
+    est un en-tête {"version", "started"}. Un chemin en .gz est compressé.
+    """
+    
+    def __init__(self, path: str, salt: bytes):
+        self.path = path
+        self.salt = salt
+        self.recorded = 0
+        self._file = _open(path, 'w')
+        self._started = time.perf_counter()
+        self._last_flush = self._started
+        self._write({"version": TRACE_VERSION, "started": time.strftime('%Y-%m-%dT%H:%M:%S')})
+    
+    def _write(self, entry: Dict[str, Any]):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+    
+    async def record(self, ctx):
+        """Hook before_invoke du bot: les arguments sont déjà convertis"""
+        if self._file is None:
+            return
+        now = time.perf_counter()
+        # ctx.args commence par le contexte (précédé du cog pour une commande de cog)
+        args = ctx.args[2:] if ctx.command.cog is not None else ctx.args[1:]
+        entry = {
+            "t": round(now - self._started, 4),
+            "u": anonymize(ctx.author.id, self.salt),
+            "c": ctx.command.qualified_name,
+        }
+        if args:
+            entry["a"] = [encode_value(value, self.salt) for value in args]
+        if ctx.kwargs:
+            entry["k"] = {name: encode_value(value, self.salt) for name, value in ctx.kwargs.items()}
+        self._write(entry)
+        self.recorded += 1
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self._file.flush()
+            self._last_flush = now
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """Lire les commandes d'une trace, dans l'ordre (l'en-tête est vérifié puis sauté)"""
+    with _open(path, 'r') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError(f"Trace {path}: version {header.get('version')} non prise en charge")
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Dernière ligne tronquée si le bot a été arrêté brutalement
+                return
+
+
+def trace_salt(value: Optional[str] = None) -> bytes:
+    """Sel d'anonymisation: TRACE_SALT, sinon aléatoire (la trace ne pourra
+    alors pas être rejouée sur une copie du stockage existant)"""
+    value = value if value is not None else os.getenv('TRACE_SALT')
+    if value:
+        return value.encode()
+    print("⚠️ TRACE_SALT non défini: sel aléatoire, les joueurs de la trace ne correspondront pas au stockage")
+    return os.urandom(16)